@@ -0,0 +1,291 @@
+import math
+import os
+import time
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+from dotenv import load_dotenv
+from .authentication import decode_access_token
+from .cache import TTLCache
+
+load_dotenv()
+
+# local keeps the limiter state in the worker process, none turns admission control off
+ADMISSION_BACKEND = os.getenv('ADMISSION_BACKEND', 'local')
+# token bucket of every user, or of every client ip for requests without a valid token: rate per second:burst
+RATE_LIMIT = os.getenv('RATE_LIMIT', '20:40')
+# buckets of their own for some routes, e.g. "POST /users/token=1:10,POST /recipes/create=2:10"
+ROUTE_RATE_LIMITS = os.getenv('ROUTE_RATE_LIMITS', 'POST /users/token=1:10,POST /users/register=1:5')
+# requests in flight per route and worker, e.g. "GET /recipes/list=16"; the ones over it are rejected
+ROUTE_CONCURRENCY_LIMITS = os.getenv(
+    'ROUTE_CONCURRENCY_LIMITS',
+    'POST /users/token=8,POST /users/register=8,GET /recipes/list=16,POST /recipes/create=16,'
+    'POST /recipes/bulk=2,POST /ingredients/bulk=2,POST /ingredients/category/bulk=2'
+)
+# buckets kept per worker, the least recently used ones go first
+RATE_LIMIT_KEYS = int(os.getenv('RATE_LIMIT_KEYS', 100000))
+# requests in flight per worker while the latency is fine, and the floor the shedding never goes under
+MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', 200))
+MIN_CONCURRENT_REQUESTS = int(os.getenv('MIN_CONCURRENT_REQUESTS', 4))
+# p99 latency in seconds the shedding keeps the requests under, 0 disables it
+SHED_LATENCY_TARGET = float(os.getenv('SHED_LATENCY_TARGET', 1.0))
+# seconds of requests the p99 is taken over, a window lasts until it has SHED_MIN_SAMPLES requests
+SHED_WINDOW_SECONDS = float(os.getenv('SHED_WINDOW_SECONDS', 1.0))
+SHED_MIN_SAMPLES = int(os.getenv('SHED_MIN_SAMPLES', 50))
+# weight of the latest window in the smoothed p99 the limit follows
+SHED_SMOOTHING = float(os.getenv('SHED_SMOOTHING', 0.3))
+# path prefixes left alone by admission control
+ADMISSION_EXEMPT_PATHS = tuple(
+    path.strip() for path in os.getenv('ADMISSION_EXEMPT_PATHS', '/monitoring,/metrics,/docs,/openapi.json').split(',')
+    if path.strip())
+# path prefixes of long polls and streams, and of the routes that are slow by design and have a
+# concurrency limit of their own: rate limited but neither shed nor counted in the latency
+SHED_EXEMPT_PATHS = tuple(path.strip() for path in os.getenv(
+    'SHED_EXEMPT_PATHS', '/changes,/export,/users/token,/recipes/bulk,/ingredients/bulk,/ingredients/category/bulk'
+).split(',') if path.strip())
+
+
+def parse_rate(value):
+    rate, _, burst = value.partition(':')
+    return float(rate), int(burst or max(1, math.ceil(float(rate))))
+
+
+def parse_route_limits(value, parse=str):
+    """
+    "METHOD /path=limit,..." into {(METHOD, /path): parse(limit)}
+    """
+    limits = {}
+    for item in value.split(','):
+        if item.strip():
+            route, _, limit = item.partition('=')
+            method, _, path = route.strip().partition(' ')
+            limits[(method.upper(), path.strip())] = parse(limit.strip())
+    return limits
+
+
+class LocalLimiterBackend:
+    """
+    Token buckets and in-flight counters of this worker process
+    """
+
+    def __init__(self, maxsize=RATE_LIMIT_KEYS):
+        # key -> (tokens, monotonic time they were counted); a bucket idle long enough to be full is dropped
+        self.buckets = TTLCache(maxsize=maxsize)
+        self.in_flight = {}
+
+    async def take(self, key, rate, burst):
+        """
+        Takes a token from the bucket `key`. Returns 0, or the seconds until there is one.
+        """
+        now = time.monotonic()
+        tokens, counted_at = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - counted_at) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self.buckets.set(key, (tokens, now), ttl=(burst - tokens) / rate)
+        return wait
+
+    async def acquire(self, key, limit):
+        """
+        Counts a request in flight for `key` unless `limit` of them already are
+        """
+        if self.in_flight.get(key, 0) >= limit:
+            return False
+        self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        return True
+
+    async def release(self, key):
+        self.in_flight[key] -= 1
+
+
+class LatencyShedder:
+    """
+    Adaptive limit of the requests in flight of the worker. Every window of at least `min_samples`
+    requests updates a smoothed p99 latency. While it is above `target` the limit goes down to
+    the most requests the window had in flight, scaled by target / p99 but by a fifth at most;
+    while it is under, the limit grows back by a tenth per window.
+    Requests over the limit are rejected at once, before they queue for the database pool.
+    """
+
+    def __init__(self, target=SHED_LATENCY_TARGET, window=SHED_WINDOW_SECONDS, min_samples=SHED_MIN_SAMPLES,
+                 smoothing=SHED_SMOOTHING, max_limit=MAX_CONCURRENT_REQUESTS, min_limit=MIN_CONCURRENT_REQUESTS):
+        self.target = target
+        self.window = window
+        self.min_samples = min_samples
+        self.smoothing = smoothing
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.latencies = []
+        self.window_started_at = time.monotonic()
+        self.last_p99 = None
+
+    def admit(self):
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return True
+
+    def done(self, seconds):
+        self.in_flight -= 1
+        if not self.target:
+            return
+        self.latencies.append(seconds)
+        now = time.monotonic()
+        if now - self.window_started_at < self.window or len(self.latencies) < self.min_samples:
+            return
+        latencies = sorted(self.latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.last_p99 = p99 if self.last_p99 is None else \
+            self.smoothing * p99 + (1 - self.smoothing) * self.last_p99
+        if self.last_p99 > self.target:
+            self.limit = max(self.min_limit,
+                             min(self.limit, self.peak_in_flight) * max(0.8, self.target / self.last_p99))
+        else:
+            self.limit = min(self.max_limit, self.limit + max(1.0, self.limit * 0.1))
+        self.latencies = []
+        self.peak_in_flight = self.in_flight
+        self.window_started_at = now
+
+
+class AdmissionStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rate_limited = 0
+        self.concurrency_limited = 0
+        self.shed = 0
+
+
+def client_key(scope):
+    """
+    user:<id> for requests with a valid bearer token, ip:<address> for the others
+    """
+    authorization = dict(scope['headers']).get(b'authorization', b'').decode('latin-1')
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        try:
+            token_data = decode_access_token(token)
+        except HTTPException:
+            pass
+        else:
+            return f'user:{token_data.id if token_data.id is not None else token_data.email}'
+    client = scope.get('client')
+    return f'ip:{client[0] if client else "unknown"}'
+
+
+class AdmissionController:
+    """
+    Decides which requests reach the routes: 429 once the token bucket of the user (or client ip)
+    is empty, 503 when the route already has its limit of requests in flight or the worker sheds load
+    because of its latency. Both come with Retry-After.
+    """
+
+    def __init__(self, backend=None, rate_limit=RATE_LIMIT, route_rate_limits=ROUTE_RATE_LIMITS,
+                 route_concurrency_limits=ROUTE_CONCURRENCY_LIMITS, shedder=None):
+        self.backend = backend
+        self.rate_limit = parse_rate(rate_limit)
+        self.route_rate_limits = parse_route_limits(route_rate_limits, parse_rate)
+        self.route_concurrency_limits = parse_route_limits(route_concurrency_limits, int)
+        self.shedder = shedder if shedder is not None else LatencyShedder()
+        self.stats = AdmissionStats()
+        self._routes = None
+
+    def limited_routes(self, app):
+        """
+        The routes having a rate or concurrency limit of their own, resolved on the first request
+        """
+        if self._routes is None:
+            templates = set(self.route_rate_limits) | set(self.route_concurrency_limits)
+            self._routes = [(method, route.path, route) for route in app.routes for method, path in templates
+                            if getattr(route, 'path', None) == path and method in getattr(route, 'methods', ())]
+        return self._routes
+
+    def match(self, scope):
+        for method, path, route in self.limited_routes(scope['app']):
+            if method == scope['method'] and route.matches(scope)[0] == Match.FULL:
+                return method, path
+        return None
+
+    async def reject(self, scope, receive, send, status_code, detail, retry_after):
+        response = JSONResponse({'detail': detail}, status_code=status_code,
+                                headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+        await response(scope, receive, send)
+
+    async def __call__(self, app, scope, receive, send):
+        route = self.match(scope)
+        key = client_key(scope)
+        if route in self.route_rate_limits:
+            wait = await self.backend.take(f'{key}|{" ".join(route)}', *self.route_rate_limits[route])
+        else:
+            wait = await self.backend.take(key, *self.rate_limit)
+        if wait:
+            self.stats.rate_limited += 1
+            await self.reject(scope, receive, send, status.HTTP_429_TOO_MANY_REQUESTS, 'Too many requests', wait)
+            return
+        slot = None
+        if route in self.route_concurrency_limits:
+            slot = ' '.join(route)
+            if not await self.backend.acquire(slot, self.route_concurrency_limits[route]):
+                self.stats.concurrency_limited += 1
+                await self.reject(scope, receive, send, status.HTTP_503_SERVICE_UNAVAILABLE, 'Server is busy', 1)
+                return
+        shed = not scope['path'].startswith(SHED_EXEMPT_PATHS)
+        if shed and not self.shedder.admit():
+            if slot is not None:
+                await self.backend.release(slot)
+            self.stats.shed += 1
+            await self.reject(scope, receive, send, status.HTTP_503_SERVICE_UNAVAILABLE, 'Server is overloaded',
+                              self.shedder.window)
+            return
+        self.stats.admitted += 1
+        started_at = time.perf_counter()
+        try:
+            await app(scope, receive, send)
+        finally:
+            if shed:
+                self.shedder.done(time.perf_counter() - started_at)
+            if slot is not None:
+                await self.backend.release(slot)
+
+    def status(self):
+        return {
+            'backend': ADMISSION_BACKEND,
+            'admitted': self.stats.admitted,
+            'rate_limited': self.stats.rate_limited,
+            'concurrency_limited': self.stats.concurrency_limited,
+            'shed': self.stats.shed,
+            'in_flight': self.shedder.in_flight,
+            'concurrency_limit': int(self.shedder.limit),
+            'p99_seconds': self.shedder.last_p99,
+            'routes_in_flight': dict(getattr(self.backend, 'in_flight', {})),
+        }
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller=None):
+        self.app = app
+        self.controller = controller if controller is not None else admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or self.controller.backend is None or \
+                scope['path'].startswith(ADMISSION_EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+        await self.controller(self.app, scope, receive, send)
+
+
+def create_limiter_backend():
+    if ADMISSION_BACKEND == 'local':
+        return LocalLimiterBackend()
+    if ADMISSION_BACKEND == 'none':
+        return None
+    raise ValueError('ADMISSION_BACKEND must be "local" or "none"')
+
+
+admission_controller = AdmissionController(create_limiter_backend())
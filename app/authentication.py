@@ -1,15 +1,19 @@
 import os
+import time
 from datetime import timedelta, datetime
 from typing import Union
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from .models import UserModel
-from sqlalchemy.orm import Session
-from .schemas.users import TokenData
+from .cache import TTLCache
+from .profiling import timed
+from .schemas.users import TokenData, UserResponseScheme
 from .dependencies import get_db
+from .replicas import primary_session
 
 load_dotenv()
 
@@ -17,16 +21,19 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 ALGORITHM = os.getenv('ALGORITHM')
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES')
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/users/token')
-
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+AUTH_STATELESS = os.getenv('AUTH_STATELESS', 'true').lower() in ('1', 'true', 'yes')
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+# seconds a worker trusts its copy of the token version of a user, so a logout
+# handled by another worker rejects the older tokens here after at most this long
+TOKEN_VERSION_TTL = float(os.getenv('TOKEN_VERSION_TTL', 5))
 
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/users/token')
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# decoded and verified tokens, so repeated requests skip the signature check
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+# user id -> users.token_version; tokens carrying another version are rejected
+token_versions = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_VERSION_TTL)
 
 
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None):
@@ -35,27 +42,98 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({'exp': expire})
+    to_encode.update({'exp': expire, 'iat': datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+async def revoke_user_tokens(db: AsyncSession, user_id: int):
+    """
+    Invalidates every token issued to the user until now by bumping the token version
+    """
+    await db.execute(update(UserModel).where(UserModel.id == user_id)
+                     .values(token_version=UserModel.token_version + 1))
+    version = await db.scalar(select(UserModel.token_version).where(UserModel.id == user_id))
+    await db.commit()
+    token_versions.set(user_id, version)
+
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get('sub')
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    user = db.query(UserModel).filter(UserModel.email == token_data.email).first()
+
+
+def decode_access_token(token: str) -> TokenData:
+    with timed('auth'):
+        token_data = token_cache.get(token)
+        if token_data is None:
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except JWTError:
+                raise credentials_exception()
+            email: str = payload.get('sub')
+            if email is None:
+                raise credentials_exception()
+            token_data = TokenData(email=email, id=payload.get('uid'), is_admin=payload.get('adm'),
+                                   issued_at=payload.get('iat'), expires_at=payload.get('exp'),
+                                   version=payload.get('ver'))
+            ttl = TOKEN_CACHE_TTL
+            if token_data.expires_at is not None:
+                ttl = min(ttl, token_data.expires_at - time.time())
+            token_cache.set(token, token_data, ttl=ttl)
+        elif token_data.expires_at is not None and token_data.expires_at <= time.time():
+            raise credentials_exception()
+        return token_data
+
+
+def check_token_version(token_data: TokenData, version: int):
+    """
+    Tokens issued before the version existed count as version 0
+    """
+    if (token_data.version or 0) != version:
+        raise credentials_exception()
+
+
+async def get_current_user_from_db(request: Request, token: str = Depends(oauth2_scheme),
+                                   db: AsyncSession = Depends(get_db)):
+    """
+    Returns the UserModel row of the token owner, for endpoints that need more than the token claims
+    """
+    token_data = decode_access_token(token)
+    # the request session is opened on first use, its reads then follow the writes of this user
+    request.state.user_id = token_data.id
+    # read on the primary, a replica may not have the user or its last logout yet
+    db = await primary_session(db)
+    user = await db.scalar(select(UserModel).where(UserModel.email == token_data.email))
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
+    check_token_version(token_data, user.token_version)
+    token_versions.set(user.id, user.token_version)
+    request.state.user_id = user.id
     return user
 
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme),
+                           db: AsyncSession = Depends(get_db)):
+    """
+    Builds the current user from the verified token claims, the database is only asked for the
+    token version of the user once every TOKEN_VERSION_TTL seconds.
+    Tokens issued without the claims, or AUTH_STATELESS=false, fall back to the row lookup.
+    """
+    token_data = decode_access_token(token)
+    if not AUTH_STATELESS or token_data.id is None or token_data.is_admin is None:
+        return await get_current_user_from_db(request, token, db)
+    request.state.user_id = token_data.id
+    version = token_versions.get(token_data.id)
+    if version is None:
+        # read on the primary, a replica may not have the user or its last logout yet
+        db = await primary_session(db)
+        version = await db.scalar(select(UserModel.token_version).where(UserModel.id == token_data.id))
+        if version is None:
+            raise credentials_exception()
+        token_versions.set(token_data.id, version)
+    check_token_version(token_data, version)
+    return UserResponseScheme(id=token_data.id, email=token_data.email, is_admin=token_data.is_admin)
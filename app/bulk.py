@@ -0,0 +1,165 @@
+import json
+import os
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from dotenv import load_dotenv
+from .changes import record_changes
+from .databases import engine
+from .schemas.bulk import BulkItemResultScheme, BulkResponseScheme
+
+load_dotenv()
+
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', 1000))
+
+NDJSON_MEDIA_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# dialects with INSERT ... ON CONFLICT, the upserts are built with their insert()
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+if engine.dialect.name not in UPSERT_INSERTS:
+    raise RuntimeError(f'SQLALCHEMY_DATABASE_URL must be a PostgreSQL or SQLite database, '
+                       f'"{engine.dialect.name}" has no INSERT ... ON CONFLICT')
+
+
+class InvalidItem:
+    def __init__(self, detail):
+        self.detail = detail
+
+
+async def iter_items(request: Request):
+    """
+    Yields the items of a bulk request body. NDJSON bodies are parsed line by line while
+    they are being received; anything else has to be a JSON array. Lines that are not
+    valid JSON are yielded as InvalidItem, so they are reported without stopping the import.
+    """
+    if request.headers.get('content-type', '').split(';')[0].strip() in NDJSON_MEDIA_TYPES:
+        buffer = b''
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                if line.strip():
+                    yield _parse_line(line)
+        if buffer.strip():
+            yield _parse_line(buffer)
+        return
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Body is not valid JSON')
+    if not isinstance(items, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Body must be a JSON array')
+    for item in items:
+        yield item
+
+
+def _parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return InvalidItem('Line is not valid JSON')
+
+
+async def iter_batches(items, size=BULK_BATCH_SIZE):
+    """
+    Groups an async iterable into lists of (index, item) of at most `size` elements
+    """
+    batch = []
+    index = 0
+    async for item in items:
+        batch.append((index, item))
+        index += 1
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def validation_detail(error: ValidationError):
+    return '; '.join(f"{'.'.join(map(str, value['loc']))}: {value['msg']}" for value in error.errors())
+
+
+def parse_batch(batch, scheme, seen_titles: set):
+    """
+    Validates a batch of (index, item) pairs against `scheme`. Titles repeated within the
+    request are rejected. Returns the error results and the list of (index, parsed item).
+    """
+    results = []
+    parsed = []
+    for index, item in batch:
+        if isinstance(item, InvalidItem):
+            results.append(BulkItemResultScheme(index=index, status='error', detail=item.detail))
+            continue
+        try:
+            value = scheme.parse_obj(item)
+        except ValidationError as error:
+            results.append(BulkItemResultScheme(index=index, status='error', detail=validation_detail(error)))
+            continue
+        if value.title in seen_titles:
+            results.append(BulkItemResultScheme(index=index, status='error', detail='Duplicate title in the request'))
+            continue
+        seen_titles.add(value.title)
+        parsed.append((index, value))
+    return results, parsed
+
+
+def batch_failed(items, error):
+    """
+    Error results for every (index, item) of a batch whose transaction was rolled back
+    """
+    detail = f'Batch failed: {error.__class__.__name__}'
+    return [BulkItemResultScheme(index=index, status='error', detail=detail) for index, _ in items]
+
+
+def bulk_response(results):
+    results = sorted(results, key=lambda result: result.index)
+    return BulkResponseScheme(
+        created=sum(result.status == 'created' for result in results),
+        updated=sum(result.status == 'updated' for result in results),
+        failed=sum(result.status == 'error' for result in results),
+        results=results)
+
+
+def insert_or_update(db, model, index_elements, update_columns):
+    """
+    INSERT ... ON CONFLICT (index_elements) DO UPDATE for the dialect of the session.
+    Column onupdate defaults do not apply to the DO UPDATE, updated_at is set here.
+    """
+    statement = UPSERT_INSERTS[db.bind.dialect.name](model)
+    set_ = {column: getattr(statement.excluded, column) for column in update_columns}
+    if 'updated_at' in model.__table__.columns:
+        set_['updated_at'] = func.now()
+    return statement.on_conflict_do_update(index_elements=index_elements, set_=set_)
+
+
+async def upsert_by_title(db, model, items, update_columns):
+    """
+    Upserts (index, scheme) pairs into `model` keyed by its unique title with one executemany.
+    Existing rows are read beforehand with one IN query, so every item is reported as
+    created, updated or unchanged, and only the written rows go to the change log. The caller commits.
+    """
+    columns = ['title'] + list(update_columns)
+    titles = [value.title for _, value in items]
+    existing = {row.title: row for row in await db.execute(
+        select(*[getattr(model, column) for column in columns]).where(model.title.in_(titles)))}
+    changed = [(index, value) for index, value in items
+               if value.title not in existing or
+               any(getattr(existing[value.title], column) != getattr(value, column) for column in update_columns)]
+    if changed:
+        await db.execute(insert_or_update(db, model, ['title'], update_columns),
+                         [{column: getattr(value, column) for column in columns} for _, value in changed])
+    ids = dict((await db.execute(select(model.title, model.id).where(model.title.in_(titles)))).all())
+    changed_titles = {value.title for _, value in changed}
+    record_changes(db, model, [ids[title] for title in changed_titles])
+    results = []
+    for index, value in items:
+        if value.title not in existing:
+            result_status = 'created'
+        elif value.title in changed_titles:
+            result_status = 'updated'
+        else:
+            result_status = 'unchanged'
+        results.append(BulkItemResultScheme(index=index, status=result_status, id=ids[value.title]))
+    return results
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+from dotenv import load_dotenv
+from .profiling import timed
+
+load_dotenv()
+
+# local keeps the entries and their invalidation in the worker process, so it is refused with several
+# workers (WEB_CONCURRENCY, as read by uvicorn and gunicorn): a write would only invalidate one of them
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'local')
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))
+RESPONSE_CACHE_REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+
+
+class TTLCache:
+    """
+    In-process LRU mapping whose entries also expire after `ttl` seconds
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalCacheBackend:
+    """
+    Keeps the cached responses in the worker process. Invalidations reach this process only,
+    so it is meant for a single worker: the other workers would serve stale entries until they expire.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.versions = {}
+
+    async def get(self, key):
+        return self.entries.get(key)
+
+    async def set(self, key, value):
+        self.entries.set(key, value)
+
+    async def get_version(self, namespace):
+        return self.versions.setdefault(namespace, time.time_ns())
+
+    async def bump_version(self, namespace):
+        self.versions[namespace] = max(time.time_ns(), self.versions.get(namespace, 0) + 1)
+
+
+class RedisCacheBackend:
+    """
+    Shares the cached responses and their invalidation between all workers, needs the redis package
+    """
+
+    def __init__(self, url, ttl=300):
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError('RESPONSE_CACHE_BACKEND=redis requires the redis package')
+        self.redis = redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, key):
+        value = await self.redis.get(f'response:{key}')
+        return None if value is None else json.loads(value)
+
+    async def set(self, key, value):
+        await self.redis.set(f'response:{key}', json.dumps(value), ex=self.ttl)
+
+    async def get_version(self, namespace):
+        await self.redis.set(f'version:{namespace}', time.time_ns(), nx=True)
+        return int(await self.redis.get(f'version:{namespace}'))
+
+    async def bump_version(self, namespace):
+        await self.redis.set(f'version:{namespace}', time.time_ns())
+
+
+class ResponseCache:
+    """
+    Caches rendered JSON responses of read endpoints. Every entry belongs to one or more
+    namespaces, and invalidating a namespace moves its version forward, which makes all
+    of its entries unreachable at once. The version is a timestamp, so it also serves
+    as Last-Modified.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        # entries of namespaces changed less than this many seconds ago are served but not stored
+        self.settle_seconds = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    async def respond(self, request: Request, response: Response, namespaces, response_model, load):
+        """
+        Returns the cached response for the request url or builds it with `load()`,
+        which returns either a Response or data matching `response_model`
+        """
+        if self.backend is None:
+            return await load()
+        versions = [await self.backend.get_version(namespace) for namespace in namespaces]
+        key = f'{request.url.path}?{request.url.query}|' + '|'.join(map(str, versions))
+        entry = await self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = self.render(response, response_model, await load())
+            entry['headers']['Last-Modified'] = formatdate(max(versions) / 1e9, usegmt=True)
+            if time.time_ns() - max(versions) >= self.settle_seconds * 1e9:
+                await self.backend.set(key, entry)
+        else:
+            self.hits += 1
+        if self.is_fresh(request, entry['headers']):
+            self.not_modified += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=entry['headers'])
+        return Response(entry['body'], media_type='application/json', headers=entry['headers'])
+
+    @staticmethod
+    def render(response: Response, response_model, data):
+        with timed('serialize'):
+            if isinstance(data, Response):
+                body = data.body
+                headers = {name: value for name, value in data.headers.items()
+                           if name not in ('content-length', 'content-type')}
+            else:
+                body = json.dumps(jsonable_encoder(parse_obj_as(response_model, data))).encode()
+                headers = dict(response.headers)
+            headers['ETag'] = '"' + hashlib.sha1(body).hexdigest() + '"'
+            return {'body': body.decode(), 'headers': headers}
+
+    @staticmethod
+    def is_fresh(request: Request, headers):
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            return headers['ETag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match == '*'
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since is not None:
+            try:
+                return parsedate_to_datetime(headers['Last-Modified']) <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def invalidate(self, *namespaces):
+        if self.backend is None:
+            return
+        for namespace in namespaces:
+            await self.backend.bump_version(namespace)
+
+    def stats(self):
+        return {
+            'backend': self.backend.__class__.__name__ if self.backend else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+        }
+
+
+def create_cache_backend():
+    if RESPONSE_CACHE_BACKEND == 'local':
+        if WEB_CONCURRENCY > 1:
+            raise ValueError('RESPONSE_CACHE_BACKEND=local only invalidates the entries of one worker, '
+                             'use "redis" or "none" with WEB_CONCURRENCY > 1')
+        return LocalCacheBackend(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+    if RESPONSE_CACHE_BACKEND == 'redis':
+        return RedisCacheBackend(RESPONSE_CACHE_REDIS_URL, ttl=RESPONSE_CACHE_TTL)
+    if RESPONSE_CACHE_BACKEND == 'none':
+        return None
+    raise ValueError('RESPONSE_CACHE_BACKEND must be "local", "redis" or "none"')
+
+
+response_cache = ResponseCache(create_cache_backend())
+
+INGREDIENT_CATEGORIES = 'ingredient-categories'
+INGREDIENTS = 'ingredients'
+RECIPE_CATEGORIES = 'recipe-categories'
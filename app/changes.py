@@ -0,0 +1,137 @@
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from .fast_json import row_plan
+from .models import CategoryIngredientModel, CategoryRecipesModel, ChangeModel, IngredientModel, RecipesModel, \
+    RecipesIngredientsModel
+from .queries import load_ingredient_ids
+from .schemas.ingredients import CategoryIngredientResponseScheme, IngredientResponseScheme
+from .schemas.recipes import CategoryRecipeResponseScheme, RecipeResponseScheme
+
+load_dotenv()
+
+CHANGES_PAGE_SIZE = int(os.getenv('CHANGES_PAGE_SIZE', 500))
+# longest wait of a long-poll request, in seconds
+CHANGES_MAX_WAIT = float(os.getenv('CHANGES_MAX_WAIT', 30))
+CHANGES_POLL_INTERVAL = float(os.getenv('CHANGES_POLL_INTERVAL', 0.5))
+CHANGES_HEARTBEAT_SECONDS = float(os.getenv('CHANGES_HEARTBEAT_SECONDS', 15))
+# changes younger than this are held back: the change log is written and stamped right before
+# COMMIT, but on PostgreSQL concurrent commits may still land out of id order by the time the
+# COMMIT takes, and a consumer must not move its cursor past an id still in flight.
+# SQLite commits one writer at a time, in id order, so 0 is fine there.
+CHANGES_SETTLE_SECONDS = float(os.getenv('CHANGES_SETTLE_SECONDS', 1))
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+# models in the feed -> the scheme of the `data` of their upserts; the entity is the table name
+FEED_MODELS = {
+    CategoryIngredientModel: CategoryIngredientResponseScheme,
+    IngredientModel: IngredientResponseScheme,
+    CategoryRecipesModel: CategoryRecipeResponseScheme,
+    RecipesModel: RecipeResponseScheme,
+}
+ENTITIES = {model.__tablename__: model for model in FEED_MODELS}
+
+
+def change_rows(changes):
+    changed_at = datetime.now(timezone.utc)
+    return [{'entity': entity, 'entity_id': entity_id, 'operation': operation, 'changed_at': changed_at}
+            for (entity, entity_id), operation in changes.items()]
+
+
+def log_changes(session, changes):
+    """
+    Adds the (entity, id) -> operation `changes` to those the transaction of `session` writes
+    when it commits. A delete wins over the upserts of the same row.
+    """
+    pending = session.info.setdefault('changes', {})
+    for key, operation in changes.items():
+        pending[key] = operation if operation == DELETE else pending.get(key, operation)
+
+
+@event.listens_for(Session, 'before_commit')
+def write_changes(session):
+    """
+    Writes the changes of the transaction as it commits, after its last flush. Their ids are
+    drawn and their changed_at taken right before COMMIT, however long the transaction ran.
+    """
+    session.flush()
+    changes = session.info.pop('changes', None)
+    if changes:
+        session.connection().execute(insert(ChangeModel), change_rows(changes))
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_changes(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('changes', None)
+
+
+@event.listens_for(Session, 'after_flush')
+def record_flushed_changes(session, flush_context):
+    """
+    Logs the catalogue rows added, modified or deleted through the session in the flush's
+    transaction. New or removed ingredient links count as an update of their recipe.
+    """
+    changes = {}
+    for instance in session.new:
+        if type(instance) in FEED_MODELS:
+            changes[(instance.__tablename__, instance.id)] = UPSERT
+        elif isinstance(instance, RecipesIngredientsModel):
+            changes.setdefault((RecipesModel.__tablename__, instance.recipe_id), UPSERT)
+    for instance in session.dirty:
+        if type(instance) in FEED_MODELS and session.is_modified(instance, include_collections=False):
+            changes.setdefault((instance.__tablename__, instance.id), UPSERT)
+    for instance in session.deleted:
+        if type(instance) in FEED_MODELS:
+            changes[(instance.__tablename__, instance.id)] = DELETE
+        elif isinstance(instance, RecipesIngredientsModel):
+            changes.setdefault((RecipesModel.__tablename__, instance.recipe_id), UPSERT)
+    if changes:
+        log_changes(session, changes)
+
+
+def record_changes(db, model, ids, operation=UPSERT):
+    """
+    Logs rows written with Core insert/update/delete statements, which the session does not
+    see. They are written with the commit of the caller's transaction.
+    """
+    log_changes(db.sync_session, {(model.__tablename__, entity_id): operation for entity_id in ids})
+
+
+async def load_changes(db, since, limit, entities=None):
+    """
+    The settled changes after the cursor `since`, upserts with the current `data` of their row.
+    A row deleted meanwhile has no data, its tombstone follows later in the feed.
+    """
+    statement = select(ChangeModel).where(
+        ChangeModel.id > since,
+        ChangeModel.changed_at <= datetime.now(timezone.utc) - timedelta(seconds=CHANGES_SETTLE_SECONDS))
+    if entities:
+        statement = statement.where(ChangeModel.entity.in_(entities))
+    changes = (await db.scalars(statement.order_by(ChangeModel.id).limit(limit))).all()
+    upserted = {}
+    for change in changes:
+        if change.operation == UPSERT:
+            upserted.setdefault(change.entity, set()).add(change.entity_id)
+    data = {}
+    for entity, ids in upserted.items():
+        model = ENTITIES[entity]
+        plan = row_plan(model, FEED_MODELS[model])
+        rows = [plan.to_dict(row) for row in await db.execute(plan.select(model).where(model.id.in_(ids)))]
+        if model is RecipesModel:
+            ingredient_ids = await load_ingredient_ids(db, [row['id'] for row in rows])
+            for row in rows:
+                row['ingredient_ids'] = ingredient_ids[row['id']]
+        data.update({(entity, row['id']): row for row in rows})
+    return [{
+        'id': change.id,
+        'entity': change.entity,
+        'entity_id': change.entity_id,
+        'operation': change.operation,
+        'changed_at': change.changed_at,
+        'data': data.get((change.entity, change.entity_id)) if change.operation == UPSERT else None,
+    } for change in changes]
@@ -1,15 +1,281 @@
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
 load_dotenv()
 
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def get_async_url(url):
+    """
+    Turns a sync database url into the matching asyncio one,
+    e.g. postgresql://... into postgresql+asyncpg://...
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'There is no async driver configured for "{backend}"')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
 SQLALCHEMY_DATABASE_URL = os.getenv('SQLALCHEMY_DATABASE_URL')
+DATABASE_ASYNC = os.getenv('DATABASE_ASYNC', 'true').lower() in ('1', 'true', 'yes')
+
+# per engine, so a worker holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+# seconds before a connection is replaced, -1 keeps connections forever
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+# milliseconds, 0 disables the limit (PostgreSQL only)
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 0))
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+
+class TimedPoolMixin:
+    """
+    Measures how long checkouts wait for a free connection (or for a new one to open)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started_at
+            self.stats.checkouts += 1
+            self.stats.wait_seconds += waited
+            self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+
+    def recreate(self):
+        # dispose() replaces the pool, the counters carry over
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url, poolclass):
+    """
+    Pool and connection settings of an engine for `url`. SQLite keeps the pool class SQLAlchemy picks for it.
+    """
+    url = make_url(url)
+    options = {'pool_pre_ping': DB_POOL_PRE_PING, 'connect_args': {}}
+    if url.get_backend_name() == 'sqlite':
+        # the sync sessions hop between threadpool threads, which sqlite refuses by default
+        if url.get_driver_name() == 'pysqlite':
+            options['connect_args']['check_same_thread'] = False
+        return options
+    options.update(poolclass=poolclass, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                   pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE)
+    if DB_STATEMENT_TIMEOUT and url.get_backend_name() == 'postgresql':
+        if url.get_driver_name() == 'asyncpg':
+            options['connect_args']['server_settings'] = {'statement_timeout': str(DB_STATEMENT_TIMEOUT)}
+        else:
+            options['connect_args']['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'
+    return options
+
+
+def enforce_foreign_keys(engine):
+    """
+    SQLite ignores foreign keys, ON DELETE CASCADE included, unless every connection turns them on
+    """
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def set_foreign_keys(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA foreign_keys=ON')
+            cursor.close()
+    return engine
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL, TimedQueuePool))
+
+enforce_foreign_keys(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if DATABASE_ASYNC:
+    SQLALCHEMY_ASYNC_DATABASE_URL = os.getenv('SQLALCHEMY_ASYNC_DATABASE_URL') or get_async_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL, **engine_options(SQLALCHEMY_ASYNC_DATABASE_URL, TimedAsyncQueuePool)
+    )
+    enforce_foreign_keys(async_engine.sync_engine)
+    AsyncSessionLocal = sessionmaker(
+        async_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
+    )
+else:
+    async_engine = None
+    AsyncSessionLocal = None
+
 Base = declarative_base()
+
+
+class SyncSessionAdapter:
+    """
+    Gives a sync Session the awaitable interface of AsyncSession,
+    so the routers work unchanged when DATABASE_ASYNC is switched off.
+    Every blocking call is moved to the threadpool instead of the event loop.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    @property
+    def bind(self):
+        return self.sync_session.bind
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    def _execute_buffered(self, statement, params=None, **kwargs):
+        result = self.sync_session.execute(statement, params, **kwargs)
+        if not getattr(result, 'returns_rows', True):
+            return result
+        # rows have to be fetched in the worker thread, not lazily on the event loop
+        return result.freeze()()
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self._execute_buffered, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        result = await self.execute(statement, params, **kwargs)
+        return result.scalars()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def stream(self, statement, params=None, **kwargs):
+        statement = statement.execution_options(stream_results=True)
+        return SyncStreamResult(await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs))
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def connection(self, **kwargs):
+        return await run_in_threadpool(self.sync_session.connection, **kwargs)
+
+    async def flush(self, objects=None):
+        await run_in_threadpool(self.sync_session.flush, objects)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+class SyncStreamResult:
+    """
+    The AsyncResult of SyncSessionAdapter.stream, every batch of rows is fetched in the threadpool
+    """
+
+    def __init__(self, result):
+        self.result = result
+
+    async def partitions(self, size):
+        while True:
+            rows = await run_in_threadpool(self.result.fetchmany, size)
+            if not rows:
+                break
+            yield rows
+
+    async def close(self):
+        await run_in_threadpool(self.result.close)
+
+
+class LazySession:
+    """
+    Request session that is only created on first use, so requests rejected
+    before they touch the database (e.g. by authentication) never open one
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._session = None
+
+    @property
+    def started(self):
+        return self._session is not None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._factory()
+        return getattr(self._session, name)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def pool_status(value):
+    """
+    Connection counts and checkout waits of an engine's pool
+    """
+    pool = getattr(value, 'sync_engine', value).pool
+    status = {'pool': pool.__class__.__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+        })
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        status.update({
+            'checkouts': stats.checkouts,
+            'timeouts': stats.timeouts,
+            'wait_seconds_total': round(stats.wait_seconds, 6),
+            'max_wait_seconds': round(stats.max_wait_seconds, 6),
+        })
+    return status
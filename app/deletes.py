@@ -0,0 +1,94 @@
+from sqlalchemy import delete, func, select, update
+from .cache import INGREDIENT_CATEGORIES, INGREDIENTS, RECIPE_CATEGORIES, response_cache
+from .changes import DELETE, UPSERT, record_changes
+from .models import CategoryIngredientModel, CategoryRecipesModel, IngredientModel, RecipesIngredientsModel, \
+    RecipesModel
+from .similar_recipes import similar_recipes
+from .stats import count_recipes
+from .text_search import ingredient_text_index, recipe_text_index, recipe_title_index
+
+# Deletes run as Core statements, one per table whatever the number of rows, and leave the rows
+# depending on them to the ON DELETE actions of the foreign keys. The session sees none of it,
+# so the change log, the /stats aggregates, the response cache and the in-memory indexes are updated here.
+
+
+async def delete_ingredients(db, condition):
+    """
+    Deletes the ingredients matching `condition` with their links to recipes.
+    The recipes that used them are logged as updated. Returns the deleted ids.
+    """
+    ids_query = select(IngredientModel.id).where(condition)
+    ids = (await db.scalars(ids_query)).all()
+    if not ids:
+        return []
+    recipe_ids_query = select(RecipesIngredientsModel.recipe_id).where(
+        RecipesIngredientsModel.ingredient_id.in_(ids_query)).distinct()
+    recipe_ids = (await db.scalars(recipe_ids_query)).all()
+    if recipe_ids:
+        record_changes(db, RecipesModel, recipe_ids, UPSERT)
+        await db.execute(update(RecipesModel).where(RecipesModel.id.in_(recipe_ids_query))
+                         .values(updated_at=func.now()).execution_options(synchronize_session=False))
+    record_changes(db, IngredientModel, ids, DELETE)
+    await db.execute(delete(IngredientModel).where(condition).execution_options(synchronize_session=False))
+    await db.commit()
+    await response_cache.invalidate(INGREDIENTS)
+    similar_recipes.remove_ingredients(recipe_ids, ids)
+    for ingredient_id in ids:
+        ingredient_text_index.remove(ingredient_id)
+    return ids
+
+
+async def delete_ingredient_categories(db, condition):
+    """
+    Deletes the categories of ingredients matching `condition`, their ingredients are kept
+    without a category. Returns the deleted ids.
+    """
+    ids_query = select(CategoryIngredientModel.id).where(condition)
+    ids = (await db.scalars(ids_query)).all()
+    if not ids:
+        return []
+    ingredients = IngredientModel.category_id.in_(ids_query)
+    record_changes(db, IngredientModel, (await db.scalars(select(IngredientModel.id).where(ingredients))).all())
+    # what ON DELETE SET NULL would do, with updated_at moving along for the exports
+    await db.execute(update(IngredientModel).where(ingredients).values(category_id=None, updated_at=func.now())
+                     .execution_options(synchronize_session=False))
+    record_changes(db, CategoryIngredientModel, ids, DELETE)
+    await db.execute(delete(CategoryIngredientModel).where(condition).execution_options(synchronize_session=False))
+    await db.commit()
+    await response_cache.invalidate(INGREDIENT_CATEGORIES, INGREDIENTS)
+    return ids
+
+
+async def delete_recipes(db, condition):
+    """
+    Deletes the recipes matching `condition` with their links to ingredients. Returns the deleted ids.
+    """
+    ids_query = select(RecipesModel.id).where(condition)
+    ids = (await db.scalars(ids_query)).all()
+    if not ids:
+        return []
+    record_changes(db, RecipesModel, ids, DELETE)
+    await count_recipes(db, ids_query, -1)
+    await db.execute(delete(RecipesModel).where(condition).execution_options(synchronize_session=False))
+    await db.commit()
+    for recipe_id in ids:
+        similar_recipes.remove_recipe(recipe_id)
+        recipe_text_index.remove(recipe_id)
+        recipe_title_index.remove(recipe_id)
+    return ids
+
+
+async def delete_recipe_categories(db, condition):
+    """
+    Deletes the categories of recipes matching `condition`. The caller checks they hold
+    no recipes, which the foreign key refuses. Returns the deleted ids.
+    """
+    ids_query = select(CategoryRecipesModel.id).where(condition)
+    ids = (await db.scalars(ids_query)).all()
+    if not ids:
+        return []
+    record_changes(db, CategoryRecipesModel, ids, DELETE)
+    await db.execute(delete(CategoryRecipesModel).where(condition).execution_options(synchronize_session=False))
+    await db.commit()
+    await response_cache.invalidate(RECIPE_CATEGORIES)
+    return ids
@@ -1,9 +1,45 @@
-from .databases import SessionLocal
+from fastapi import Depends, Request
+from .databases import DATABASE_ASYNC, AsyncSessionLocal, LazySession, SessionLocal, SyncSessionAdapter
+from .loaders import RequestLoaders
+from .replicas import REPLICA_STICKY_COOKIE, replica_router
 
 
-async def get_db():
-    db = SessionLocal()
+def create_session():
+    if DATABASE_ASYNC:
+        return AsyncSessionLocal()
+    return SyncSessionAdapter(SessionLocal())
+
+
+def client_key(request: Request):
+    """
+    Identifies the client for read-your-writes: the user the request was authenticated as
+    (set by get_current_user), or its address for the requests without one
+    """
+    user_id = getattr(request.state, 'user_id', None)
+    if user_id is not None:
+        return f'user:{user_id}'
+    return f'ip:{request.client.host if request.client else ""}'
+
+
+def open_session(request: Request):
+    def written(written_at):
+        request.state.last_write = written_at
+
+    return replica_router.session(request.method, client_key(request), create_session,
+                                  request.cookies.get(REPLICA_STICKY_COOKIE), written)
+
+
+async def get_db(request: Request):
+    db = LazySession(lambda: open_session(request))
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+
+def get_loaders(db=Depends(get_db)):
+    """
+    The data loaders of the request. FastAPI resolves a dependency once per request,
+    so every endpoint and dependency asking for it shares the same batches and results.
+    """
+    return RequestLoaders(db)
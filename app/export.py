@@ -0,0 +1,143 @@
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from sqlalchemy import func, select
+from dotenv import load_dotenv
+from .fast_json import dumps
+from .models import IngredientModel, RecipesIngredientsModel, RecipesModel
+
+load_dotenv()
+
+# rows fetched from the server side cursor at a time, also the rows per written chunk
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+EXPORT_GZIP_LEVEL = int(os.getenv('EXPORT_GZIP_LEVEL', 6))
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+INGREDIENT_COLUMNS = ('id', 'title', 'category_id', 'updated_at')
+RECIPE_COLUMNS = ('id', 'title', 'category_id', 'description', 'created_at', 'updated_at', 'owner_id',
+                  'difficulty')
+
+
+class NDJSONEncoder:
+    def header(self):
+        return b''
+
+    def encode(self, items):
+        return b''.join(dumps(item) + b'\n' for item in items)
+
+
+class CSVEncoder:
+    """
+    Lists are joined with spaces, e.g. the ingredient_ids of a recipe
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def header(self):
+        return self._write([self.fields])
+
+    def encode(self, items):
+        return self._write([self._value(item[field]) for field in self.fields] for item in items)
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, list):
+            return ' '.join(map(str, value))
+        return value
+
+    @staticmethod
+    def _write(rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+
+def encoder(export_format, fields):
+    if export_format == 'csv':
+        return CSVEncoder(fields)
+    return NDJSONEncoder()
+
+
+def accepts_gzip(request):
+    for encoding in request.headers.get('accept-encoding', '').split(','):
+        name, _, quality = encoding.partition(';')
+        if name.strip() == 'gzip':
+            return quality.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+async def gzip_chunks(chunks):
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def export_window(db, model, since_id=None, since=None):
+    """
+    Filters of one export and the id it ends at. Rows added while the export is
+    streamed are left for the next one, which passes the returned id as since_id.
+    """
+    conditions = []
+    if since_id is not None:
+        conditions.append(model.id > since_id)
+    if since is not None:
+        conditions.append(model.updated_at > since)
+    until_id = await db.scalar(select(func.max(model.id)))
+    conditions.append(model.id <= (until_id or 0))
+    return conditions, until_id if until_id is not None else since_id
+
+
+async def iter_partitions(db, statement):
+    result = await db.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    try:
+        async for rows in result.partitions(EXPORT_BATCH_SIZE):
+            yield rows
+    finally:
+        await result.close()
+
+
+async def ingredient_chunks(db, conditions, export_encoder):
+    statement = select(*[getattr(IngredientModel, name) for name in INGREDIENT_COLUMNS]) \
+        .where(*conditions).order_by(IngredientModel.id)
+    yield export_encoder.header()
+    async for rows in iter_partitions(db, statement):
+        yield export_encoder.encode(dict(row._mapping) for row in rows)
+
+
+async def recipe_chunks(db, conditions, export_encoder):
+    """
+    Recipes are joined with their ingredient links in one ordered query, so the
+    rows of a recipe are adjacent and may continue in the next partition
+    """
+    statement = select(*[getattr(RecipesModel, name) for name in RECIPE_COLUMNS],
+                       RecipesIngredientsModel.ingredient_id) \
+        .outerjoin(RecipesIngredientsModel, RecipesIngredientsModel.recipe_id == RecipesModel.id) \
+        .where(*conditions).order_by(RecipesModel.id, RecipesIngredientsModel.id)
+    yield export_encoder.header()
+    recipe = None
+    async for rows in iter_partitions(db, statement):
+        finished = []
+        for row in rows:
+            if recipe is None or recipe['id'] != row.id:
+                if recipe is not None:
+                    finished.append(recipe)
+                recipe = {name: getattr(row, name) for name in RECIPE_COLUMNS}
+                recipe['ingredient_ids'] = []
+            if row.ingredient_id is not None:
+                recipe['ingredient_ids'].append(row.ingredient_id)
+        if finished:
+            yield export_encoder.encode(finished)
+    if recipe is not None:
+        yield export_encoder.encode([recipe])
@@ -0,0 +1,85 @@
+import json
+from functools import lru_cache
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import aliased
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=jsonable_encoder)
+    return json.dumps(jsonable_encoder(data), separators=(',', ':')).encode()
+
+
+class FastJSONResponse(Response):
+    """
+    Encodes plain dicts and lists with orjson. The content is trusted to have
+    the shape of the endpoint's response_model already, nothing is validated.
+    """
+    media_type = 'application/json'
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class RowPlan:
+    """
+    Reads the fields of `scheme` straight from the columns of `model` in one SELECT:
+    plain fields are columns, nested schemes of many-to-one relationships are outer
+    joined. Rows come back as tuples and are turned into dicts of the scheme's shape,
+    without ORM objects or pydantic validation. Fields that are neither
+    (e.g. RecipeResponseScheme.ingredient_ids) are listed in `missing`.
+    """
+
+    def __init__(self, model, scheme, prefix='', entity=None):
+        entity = model if entity is None else entity
+        columns = inspect(model).columns
+        relationships = inspect(model).relationships
+        self.columns = []
+        self.joins = []
+        self.fields = []
+        self.nested = []
+        self.missing = []
+        for name, field in scheme.__fields__.items():
+            nested_scheme = field.type_
+            if name in columns:
+                self.fields.append((name, len(self.columns)))
+                self.columns.append(getattr(entity, name).label(prefix + name))
+            elif name in relationships and not relationships[name].uselist and \
+                    isinstance(nested_scheme, type) and issubclass(nested_scheme, BaseModel):
+                target = aliased(relationships[name].mapper.class_, name=prefix + name)
+                plan = RowPlan(relationships[name].mapper.class_, nested_scheme, f'{prefix}{name}__', target)
+                self.joins.append((target, getattr(entity, name).of_type(target)))
+                self.joins.extend(plan.joins)
+                offset = len(self.columns)
+                self.nested.append((name, offset, plan))
+                self.columns.extend(plan.columns)
+            else:
+                self.missing.append(name)
+        self.width = len(self.columns)
+
+    def select(self, model):
+        statement = select(*self.columns).select_from(model)
+        for target, onclause in self.joins:
+            statement = statement.outerjoin(target, onclause)
+        return statement
+
+    def to_dict(self, row, offset=0):
+        item = {name: row[offset + index] for name, index in self.fields}
+        for name, start, plan in self.nested:
+            # an unset foreign key leaves all columns of the joined row NULL
+            item[name] = plan.to_dict(row, offset + start) \
+                if any(row[offset + start + index] is not None for _, index in plan.fields) else None
+        return item
+
+
+@lru_cache()
+def row_plan(model, scheme):
+    return RowPlan(model, scheme)
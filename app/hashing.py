@@ -0,0 +1,120 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from passlib.context import CryptContext
+from .profiling import timed
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+PASSWORD_HASHING_EXECUTOR = os.getenv('PASSWORD_HASHING_EXECUTOR', 'thread')
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASHING_CONCURRENCY = int(os.getenv('PASSWORD_HASHING_CONCURRENCY', PASSWORD_HASHING_WORKERS))
+
+# hashes made with a different cost factor are reported by needs_update and rehashed on login
+pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto', bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password, hashed_password):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a thread or process pool, so it does not freeze the event loop.
+    At most `concurrency` calls are handed to the pool at once, the rest wait in the queue.
+    """
+
+    def __init__(self, executor=PASSWORD_HASHING_EXECUTOR, workers=PASSWORD_HASHING_WORKERS,
+                 concurrency=PASSWORD_HASHING_CONCURRENCY):
+        if executor not in ('thread', 'process'):
+            raise ValueError('Password hashing executor must be "thread" or "process"')
+        self.executor_kind = executor
+        self.workers = workers
+        self.concurrency = concurrency
+        self._executor = None
+        self._semaphore = None
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self.executor_kind == 'process' else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def run(self, func, *args):
+        with timed('hash'):
+            queued_at = time.perf_counter()
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                await self.semaphore.acquire()
+            finally:
+                self.queued -= 1
+            started_at = time.perf_counter()
+            self.wait_seconds += started_at - queued_at
+            self.running += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+            finally:
+                self.running -= 1
+                self.completed += 1
+                self.run_seconds += time.perf_counter() - started_at
+                self.semaphore.release()
+
+    async def hash(self, password):
+        return await self.run(get_password_hash, password)
+
+    async def verify(self, plain_password, hashed_password):
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password, hashed_password):
+        """
+        Returns (verified, new_hash). new_hash is not None when the stored hash
+        was made with an outdated cost factor and should replace it.
+        """
+        return await self.run(verify_and_update_password, plain_password, hashed_password)
+
+    def stats(self):
+        return {
+            'executor': self.executor_kind,
+            'workers': self.workers,
+            'concurrency': self.concurrency,
+            'bcrypt_rounds': BCRYPT_ROUNDS,
+            'queued': self.queued,
+            'max_queued': self.max_queued,
+            'running': self.running,
+            'completed': self.completed,
+            'wait_seconds_total': round(self.wait_seconds, 6),
+            'run_seconds_total': round(self.run_seconds, 6),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
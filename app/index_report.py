@@ -0,0 +1,100 @@
+"""
+Reports unused and missing indexes, run as `python -m app.index_report`.
+
+Foreign keys without an index are found from the schema on any database. On PostgreSQL
+the statistics views add indexes that were never scanned, tables read mostly by
+sequential scans and, with the pg_stat_statements extension, the most expensive queries.
+The statistics count since the last pg_stat_reset(), so run it after a representative load.
+"""
+import argparse
+import json
+from sqlalchemy import inspect, text
+from .databases import engine
+
+UNUSED_INDEXES = text("""
+    SELECT s.relname AS table, s.indexrelname AS index, pg_relation_size(s.indexrelid) AS size_bytes
+    FROM pg_stat_user_indexes s JOIN pg_index i ON i.indexrelid = s.indexrelid
+    WHERE s.idx_scan = 0 AND NOT i.indisunique AND NOT i.indisprimary
+    ORDER BY pg_relation_size(s.indexrelid) DESC
+""")
+
+SEQUENTIAL_SCANS = text("""
+    SELECT relname AS table, seq_scan, seq_tup_read, coalesce(idx_scan, 0) AS idx_scan, n_live_tup AS rows
+    FROM pg_stat_user_tables
+    WHERE seq_scan > coalesce(idx_scan, 0) AND n_live_tup >= :min_rows
+    ORDER BY seq_tup_read DESC
+""")
+
+SLOW_STATEMENTS = text("""
+    SELECT query, calls, round(total_exec_time::numeric, 1) AS total_ms,
+           round(mean_exec_time::numeric, 3) AS mean_ms, rows
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+    ORDER BY total_exec_time DESC
+    LIMIT :limit
+""")
+
+
+def unindexed_foreign_keys(connection):
+    """
+    Foreign keys whose columns are not the leading columns of any index,
+    so joins and cascades through them scan the whole table
+    """
+    inspector = inspect(connection)
+    missing = []
+    for table in inspector.get_table_names():
+        leading = [inspector.get_pk_constraint(table)['constrained_columns']]
+        leading += [index['column_names'] for index in inspector.get_indexes(table)]
+        leading += [constraint['column_names'] for constraint in inspector.get_unique_constraints(table)]
+        for foreign_key in inspector.get_foreign_keys(table):
+            columns = foreign_key['constrained_columns']
+            if not any(index[:len(columns)] == columns for index in leading):
+                missing.append({'table': table, 'columns': columns, 'references': foreign_key['referred_table']})
+    return missing
+
+
+def rows(connection, statement, **params):
+    return [dict(row._mapping) for row in connection.execute(statement, params)]
+
+
+def build_report(connection, min_rows=1000, limit=10):
+    report = {'unindexed_foreign_keys': unindexed_foreign_keys(connection)}
+    if connection.dialect.name != 'postgresql':
+        return report
+    report['unused_indexes'] = rows(connection, UNUSED_INDEXES)
+    report['sequential_scans'] = rows(connection, SEQUENTIAL_SCANS, min_rows=min_rows)
+    if connection.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")):
+        report['slow_statements'] = rows(connection, SLOW_STATEMENTS, limit=limit)
+    return report
+
+
+def print_report(report):
+    titles = {
+        'unindexed_foreign_keys': 'Foreign keys without an index',
+        'unused_indexes': 'Indexes never scanned (not counting unique and primary keys)',
+        'sequential_scans': 'Tables read mostly by sequential scans',
+        'slow_statements': 'Most expensive statements',
+    }
+    for section, items in report.items():
+        print(f'{titles[section]}: {len(items) or "none"}')
+        for item in items:
+            print('    ' + ', '.join(f'{key}={value}' for key, value in item.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reports unused and missing database indexes')
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help='ignore sequential scans of tables smaller than this')
+    parser.add_argument('--limit', type=int, default=10, help='number of expensive statements to show')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+    with engine.connect() as connection:
+        report = build_report(connection, min_rows=args.min_rows, limit=args.limit)
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
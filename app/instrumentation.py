@@ -0,0 +1,41 @@
+from sqlalchemy import event
+from .databases import engine, async_engine
+from .replicas import replica_router
+
+
+class QueryCounter:
+    """
+    Records the SQL statements executed while the block runs. Listens on the
+    application engines unless others are passed:
+
+        with QueryCounter() as queries:
+            client.get('/ingredients/list')
+        queries.assert_count(2)
+    """
+
+    def __init__(self, *engines):
+        if not engines:
+            engines = [engine] if async_engine is None else [engine, async_engine]
+            engines += [replica.engine for replica in replica_router.replicas]
+        self.engines = [getattr(value, 'sync_engine', value) for value in engines]
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        for value in self.engines:
+            event.listen(value, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        for value in self.engines:
+            event.remove(value, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def assert_count(self, expected):
+        assert self.count == expected, \
+            f'Expected {expected} queries, got {self.count}:\n' + '\n'.join(self.statements)
@@ -0,0 +1,153 @@
+import asyncio
+from functools import lru_cache
+from pydantic import BaseModel
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import joinedload, selectinload
+from .models import CategoryIngredientModel, CategoryRecipesModel, IngredientModel, RecipesModel
+from .queries import load_ingredient_ids
+from .schemas.ingredients import CategoryIngredientResponseScheme, IngredientResponseScheme
+from .schemas.recipes import CategoryRecipeResponseScheme, RecipeResponseScheme
+
+
+@lru_cache()
+def loader_options(model, scheme):
+    """
+    Eager loading options for every relationship of `model` that `scheme` serializes,
+    so orm_mode never triggers a lazy load per row. Many-to-one relationships are joined
+    into the main query, collections are fetched with one extra SELECT ... IN per relationship.
+    """
+    relationships = inspect(model).relationships
+    options = []
+    for name, field in scheme.__fields__.items():
+        if name not in relationships:
+            continue
+        relationship = relationships[name]
+        attribute = getattr(model, name)
+        loader = selectinload(attribute) if relationship.uselist else joinedload(attribute)
+        nested_scheme = field.type_
+        if isinstance(nested_scheme, type) and issubclass(nested_scheme, BaseModel):
+            loader = loader.options(*loader_options(relationship.mapper.class_, nested_scheme))
+        options.append(loader)
+    return tuple(options)
+
+
+class DataLoader:
+    """
+    Coalesces the lookups by key made while the event loop runs one step into a single
+    `batch_load(keys)` call, which returns a mapping of the found keys. Results are kept for
+    the life of the loader, unknown keys resolve to None.
+    """
+
+    def __init__(self, batch_load, lock: asyncio.Lock):
+        self.batch_load = batch_load
+        self.lock = lock
+        self.futures = {}
+        self.queue = []
+        # the dispatch tasks running, referenced so they are not garbage collected midway
+        self.tasks = set()
+
+    def load(self, key):
+        future = self.futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.futures[key] = loop.create_future()
+            self.queue.append(key)
+            if len(self.queue) == 1:
+                # runs after the tasks already scheduled had their turn to queue keys
+                loop.call_soon(self.schedule, loop)
+        return future
+
+    async def load_many(self, keys):
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def schedule(self, loop):
+        keys, self.queue = self.queue, []
+        task = loop.create_task(self.dispatch(keys))
+        self.tasks.add(task)
+        task.add_done_callback(lambda _: self.settle(keys, task))
+
+    def settle(self, keys, task):
+        """
+        Fails the futures a dispatch left pending, when it was cancelled or broke
+        """
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is None:
+            return
+        for key in keys:
+            future = self.futures.get(key)
+            if future is not None and not future.done():
+                del self.futures[key]
+                if task.cancelled():
+                    future.cancel()
+                else:
+                    future.set_exception(task.exception())
+
+    async def dispatch(self, keys):
+        try:
+            # one session can not run two statements at once, the loaders of a request take turns
+            async with self.lock:
+                values = await self.batch_load(keys)
+        except Exception as error:
+            for key in keys:
+                future = self.futures.pop(key)
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for key in keys:
+            future = self.futures[key]
+            if future.cancelled():
+                # its caller went away, the next load of the key starts over
+                del self.futures[key]
+            else:
+                future.set_result(values.get(key))
+
+
+def rows_by_id(db, model, scheme):
+    """
+    Batch function loading the columns of `model` that `scheme` has as dicts, by id
+    """
+    columns = [getattr(model, name) for name in scheme.__fields__ if name in model.__table__.columns]
+
+    async def batch_load(ids):
+        rows = await db.execute(select(*columns).where(model.id.in_(ids)))
+        return {row.id: dict(row._mapping) for row in rows}
+    return batch_load
+
+
+class RequestLoaders:
+    """
+    The data loaders of one request, see get_loaders. The rows come back as dicts in the
+    shape of the response schemes, nested objects are resolved through the loaders too.
+    The recipe reads by id go through them; the ingredient lists and searches join their
+    categories into the one query that finds the ingredients instead.
+    """
+
+    def __init__(self, db):
+        lock = asyncio.Lock()
+        self.ingredient_categories = DataLoader(
+            rows_by_id(db, CategoryIngredientModel, CategoryIngredientResponseScheme), lock)
+        self.ingredient_rows = DataLoader(rows_by_id(db, IngredientModel, IngredientResponseScheme), lock)
+        self.recipe_categories = DataLoader(rows_by_id(db, CategoryRecipesModel, CategoryRecipeResponseScheme), lock)
+        self.recipe_rows = DataLoader(rows_by_id(db, RecipesModel, RecipeResponseScheme), lock)
+        self.recipe_ingredient_ids = DataLoader(lambda ids: load_ingredient_ids(db, ids), lock)
+
+    async def ingredient(self, ingredient_id):
+        ingredient = await self.ingredient_rows.load(ingredient_id)
+        if ingredient is None:
+            return None
+        category = await self.ingredient_categories.load(ingredient['category_id']) \
+            if ingredient['category_id'] is not None else None
+        return {**ingredient, 'category': category}
+
+    async def recipe(self, recipe_id):
+        recipe = await self.recipe_rows.load(recipe_id)
+        if recipe is None:
+            return None
+        return {**recipe, 'ingredient_ids': await self.recipe_ingredient_ids.load(recipe_id)}
+
+    @staticmethod
+    async def many(load, ids):
+        """
+        Resolves `load(id)` for all ids at once, dropping the ones not found
+        """
+        return [item for item in await asyncio.gather(*(load(item_id) for item_id in ids)) if item is not None]
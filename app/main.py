@@ -1,8 +1,11 @@
 from fastapi import FastAPI
 
-from .routers import ingredients, users, recipes
-from .databases import engine
-from . import models
+from .routers import ingredients, users, recipes, monitoring, metrics, export, changes, stats
+from .admission import AdmissionMiddleware
+from .databases import async_engine, engine
+from .hashing import password_hasher
+from .profiling import PROFILING_ENABLED, ProfilingMiddleware, instrument_engines, instrument_serialization
+from .replicas import ReadYourWritesMiddleware, replica_router
 
 tags_metadata = [
     {
@@ -16,11 +19,25 @@ tags_metadata = [
     {
         'name': 'Recipes',
         'description': 'You can manage recipes there'
+    },
+    {
+        'name': 'Export',
+        'description': 'Streaming exports of the catalogue for administrators'
+    },
+    {
+        'name': 'Changes',
+        'description': 'Feed of the changes of the catalogue'
+    },
+    {
+        'name': 'Stats',
+        'description': 'Aggregates of the catalogue for dashboards'
+    },
+    {
+        'name': 'Monitoring',
+        'description': 'Runtime statistics for administrators'
     }
 ]
 
-models.Base.metadata.create_all(engine)
-
 app = FastAPI(
     redoc_url=None,
     openapi_tags=tags_metadata,
@@ -37,3 +54,23 @@ app = FastAPI(
 app.include_router(users.router)
 app.include_router(ingredients.router)
 app.include_router(recipes.router)
+app.include_router(export.router)
+app.include_router(changes.router)
+app.include_router(stats.router)
+app.include_router(monitoring.router)
+
+app.add_middleware(ReadYourWritesMiddleware)
+# added before the profiling middleware, which then also measures the rejected requests
+app.add_middleware(AdmissionMiddleware)
+
+if PROFILING_ENABLED:
+    instrument_engines(engine, *([async_engine] if async_engine is not None else []),
+                       *[replica.engine for replica in replica_router.replicas])
+    instrument_serialization()
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(metrics.router)
+
+
+@app.on_event('shutdown')
+def shutdown_password_hasher():
+    password_hasher.shutdown()
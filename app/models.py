@@ -1,5 +1,5 @@
 import sqlalchemy
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import backref, relationship
 from sqlalchemy.sql import func
 from .databases import Base
 
@@ -10,7 +10,9 @@ class CategoryIngredientModel(Base):
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, index=True)
     title = sqlalchemy.Column(sqlalchemy.String, unique=True, nullable=False)
     description = sqlalchemy.Column(sqlalchemy.TEXT, nullable=True)
-    ingredients = relationship('IngredientModel', back_populates='category')
+    updated_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # the database sets category_id of the ingredients to NULL, they are not loaded to do it
+    ingredients = relationship('IngredientModel', back_populates='category', passive_deletes=True)
 
     def __str__(self):
         return self.title
@@ -20,8 +22,14 @@ class RecipesIngredientsModel(Base):
     __tablename__ = 'recipes_ingredient'
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, index=True)
-    recipe_id = sqlalchemy.Column(sqlalchemy.ForeignKey('recipes.id'), nullable=False)
-    ingredient_id = sqlalchemy.Column(sqlalchemy.ForeignKey('ingredients.id'), nullable=False)
+    recipe_id = sqlalchemy.Column(sqlalchemy.ForeignKey('recipes.id', ondelete='CASCADE'), nullable=False)
+    ingredient_id = sqlalchemy.Column(sqlalchemy.ForeignKey('ingredients.id', ondelete='CASCADE'), nullable=False)
+
+    # the unique index also serves lookups by recipe_id, the second one lookups by ingredient
+    __table_args__ = (
+        sqlalchemy.Index('uq_recipes_ingredient_recipe_id_ingredient_id', 'recipe_id', 'ingredient_id', unique=True),
+        sqlalchemy.Index('ix_recipes_ingredient_ingredient_id_recipe_id', 'ingredient_id', 'recipe_id'),
+    )
 
 
 class IngredientModel(Base):
@@ -29,7 +37,9 @@ class IngredientModel(Base):
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, index=True)
     title = sqlalchemy.Column(sqlalchemy.String, nullable=False, unique=True)
-    category_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey('category_ingredients.id'))
+    category_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                    sqlalchemy.ForeignKey('category_ingredients.id', ondelete='SET NULL'), index=True)
+    updated_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     category = relationship('CategoryIngredientModel', back_populates='ingredients')
 
     def __str__(self):
@@ -43,6 +53,9 @@ class UserModel(Base):
     email = sqlalchemy.Column(sqlalchemy.String, unique=True, nullable=False)
     password = sqlalchemy.Column(sqlalchemy.String, nullable=False)
     is_admin = sqlalchemy.Column(sqlalchemy.Boolean, nullable=False)
+    # the tokens carry the version they were issued with, logging out bumps it
+    token_version = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=0, server_default='0')
+    updated_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     def __str__(self):
         return self.email
@@ -53,7 +66,9 @@ class CategoryRecipesModel(Base):
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, index=True)
     title = sqlalchemy.Column(sqlalchemy.String, nullable=False, unique=True)
-    recipes = relationship('RecipesModel', backref='category')
+    updated_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # a category still holding recipes can not be deleted, the database refuses it
+    recipes = relationship('RecipesModel', backref='category', passive_deletes='all')
 
     def __str__(self):
         return self.title
@@ -64,13 +79,71 @@ class RecipesModel(Base):
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, index=True)
     title = sqlalchemy.Column(sqlalchemy.String, nullable=False)
-    category_id = sqlalchemy.Column(sqlalchemy.ForeignKey('category_recipes.id'), nullable=False)
+    category_id = sqlalchemy.Column(sqlalchemy.ForeignKey('category_recipes.id', ondelete='RESTRICT'),
+                                    nullable=False, index=True)
     description = sqlalchemy.Column(sqlalchemy.TEXT, nullable=False)
     created_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True), server_default=func.now())
-    owner_id = sqlalchemy.Column(sqlalchemy.ForeignKey('users.id'), nullable=False)
+    updated_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    owner_id = sqlalchemy.Column(sqlalchemy.ForeignKey('users.id'), nullable=False, index=True)
     difficulty = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
-    ingredients = relationship('IngredientModel', secondary='recipes_ingredient', backref='recipes', lazy=True)
+    # the rows of recipes_ingredient go with ON DELETE CASCADE on both sides
+    ingredients = relationship('IngredientModel', secondary='recipes_ingredient', lazy=True, passive_deletes=True,
+                               backref=backref('recipes', passive_deletes=True))
     owner = relationship('UserModel', backref='recipes')
 
     def __str__(self):
         return self.title
+
+
+class ChangeModel(Base):
+    """
+    Change log of the catalogue, one row per created, updated or deleted row. The id is the
+    cursor of the /changes feed, a `delete` row is the tombstone of a removed one.
+    """
+    __tablename__ = 'changes'
+
+    id = sqlalchemy.Column(sqlalchemy.BigInteger().with_variant(sqlalchemy.Integer, 'sqlite'), primary_key=True)
+    entity = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+    entity_id = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    operation = sqlalchemy.Column(sqlalchemy.String(6), nullable=False)
+    changed_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True), nullable=False)
+
+
+# Aggregates of the catalogue for /stats, kept up to date by app/stats.py in the transactions
+# that write recipes. The (recipe_count DESC, key) indexes serve the top-N reads.
+
+class RecipeCategoryStatsModel(Base):
+    __tablename__ = 'stats_recipe_categories'
+
+    category_id = sqlalchemy.Column(sqlalchemy.ForeignKey('category_recipes.id', ondelete='CASCADE'),
+                                    primary_key=True)
+    recipe_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=0)
+
+
+class IngredientStatsModel(Base):
+    __tablename__ = 'stats_ingredients'
+
+    ingredient_id = sqlalchemy.Column(sqlalchemy.ForeignKey('ingredients.id', ondelete='CASCADE'),
+                                      primary_key=True)
+    recipe_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=0)
+
+
+class DifficultyStatsModel(Base):
+    __tablename__ = 'stats_difficulty'
+
+    difficulty = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, autoincrement=False)
+    recipe_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=0)
+
+
+class OwnerStatsModel(Base):
+    __tablename__ = 'stats_owners'
+
+    owner_id = sqlalchemy.Column(sqlalchemy.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    recipe_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=0)
+
+
+sqlalchemy.Index('ix_stats_recipe_categories_top', RecipeCategoryStatsModel.recipe_count.desc(),
+                 RecipeCategoryStatsModel.category_id)
+sqlalchemy.Index('ix_stats_ingredients_top', IngredientStatsModel.recipe_count.desc(),
+                 IngredientStatsModel.ingredient_id)
+sqlalchemy.Index('ix_stats_owners_top', OwnerStatsModel.recipe_count.desc(), OwnerStatsModel.owner_id)
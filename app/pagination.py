@@ -0,0 +1,122 @@
+import os
+from typing import Optional
+from fastapi import HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from dotenv import load_dotenv
+from .fast_json import FastJSONResponse, row_plan
+
+load_dotenv()
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 1000))
+
+
+class PageParams:
+    """
+    Query parameters of the list endpoints, used as `page: PageParams = Depends()`
+    """
+
+    def __init__(self,
+                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description='Page size'),
+                 cursor: Optional[int] = Query(None, ge=0, description='Id of the last item of the previous page'),
+                 fields: Optional[str] = Query(None, description='Comma separated fields to return, e.g. id,title')):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+
+    def columns(self, model):
+        available = model.__table__.columns.keys()
+        unknown = [field for field in self.fields if field not in available]
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f'Unknown fields: {", ".join(unknown)}')
+        names = self.fields if 'id' in self.fields else ['id'] + self.fields
+        return [getattr(model, name) for name in names]
+
+
+ID_LIST_PATTERN = r'^\s*\d+\s*(,\s*\d+\s*)*$'
+
+
+def parse_ids(ids: str):
+    """
+    Ids of a comma separated list, repeats dropped
+    """
+    ids = list(dict.fromkeys(int(value) for value in ids.split(',')))
+    if len(ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'At most {MAX_PAGE_SIZE} ids are allowed')
+    return ids
+
+
+def id_list(ids: str = Query(..., regex=ID_LIST_PATTERN, description='Comma separated ids, e.g. 1,2,3')):
+    """
+    The `ids` query parameter of the multi-get endpoints
+    """
+    return parse_ids(ids)
+
+
+def optional_id_list(ids: Optional[str] = Query(None, regex=ID_LIST_PATTERN,
+                                                description='Comma separated ids, e.g. 1,2,3')):
+    """
+    The `ids` query parameter of the bulk deletes, which can select by category instead
+    """
+    return parse_ids(ids) if ids is not None else None
+
+
+async def fetch_page(db, model, page: PageParams, options=()):
+    """
+    Loads one page of `model` ordered by id, starting after `page.cursor`.
+    Returns (items, next_cursor); with `page.fields` the items are dicts holding only those columns.
+    """
+    if page.fields:
+        statement = select(*page.columns(model))
+    else:
+        statement = select(model).options(*options)
+    statement = statement.order_by(model.id).limit(page.limit + 1)
+    if page.cursor is not None:
+        statement = statement.where(model.id > page.cursor)
+    result = await db.execute(statement)
+    items = [dict(row._mapping) for row in result] if page.fields else result.scalars().all()
+    next_cursor = None
+    if len(items) > page.limit:
+        items = items[:page.limit]
+        last = items[-1]
+        next_cursor = last['id'] if page.fields else last.id
+    if page.fields and 'id' not in page.fields:
+        for item in items:
+            del item['id']
+    return items, next_cursor
+
+
+async def fetch_rows_page(db, model, scheme, page: PageParams):
+    """
+    Like fetch_page, but the items are dicts in the shape of `scheme` read from plain
+    SQL rows (see RowPlan). Fields of `scheme` that are not columns are left out.
+    """
+    if page.fields:
+        return await fetch_page(db, model, page)
+    plan = row_plan(model, scheme)
+    statement = plan.select(model).order_by(model.id).limit(page.limit + 1)
+    if page.cursor is not None:
+        statement = statement.where(model.id > page.cursor)
+    items = [plan.to_dict(row) for row in await db.execute(statement)]
+    next_cursor = None
+    if len(items) > page.limit:
+        items = items[:page.limit]
+        next_cursor = items[-1]['id']
+    return items, next_cursor
+
+
+def page_response(request: Request, response: Response, page: PageParams, items, next_cursor, trusted=False):
+    """
+    Adds the link to the next page and returns the items. Sparse fieldsets do not
+    match the response_model, and `trusted` items are plain dicts already in its shape,
+    so both skip the validation and are returned as a ready FastJSONResponse.
+    """
+    headers = {}
+    if next_cursor is not None:
+        headers['Link'] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+        headers['X-Next-Cursor'] = str(next_cursor)
+    if page.fields or trusted:
+        return FastJSONResponse(items, headers=headers)
+    response.headers.update(headers)
+    return items
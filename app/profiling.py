@@ -0,0 +1,296 @@
+import contextvars
+import cProfile
+import os
+import random
+import time
+from contextlib import contextmanager
+from bisect import bisect_left
+from pathlib import Path
+import fastapi.routing
+from sqlalchemy import event
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# share of the requests captured by the profiler, e.g. 0.001
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+# requests sending this header with PROFILE_SECRET as the value are always profiled
+PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile').lower().encode()
+PROFILE_SECRET = os.getenv('PROFILE_SECRET')
+# cprofile or pyinstrument (needs the pyinstrument package)
+PROFILER = os.getenv('PROFILER', 'cprofile')
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', 'profiles'))
+# when set, /metrics wants "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# phases measured inside a request besides SQL, Server-Timing names
+PHASES = ('serialize', 'auth', 'hash')
+
+current_timings = contextvars.ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+
+@contextmanager
+def timed(phase):
+    """
+    Adds the time spent in the block to `phase` of the current request, does nothing outside of one
+    """
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] += time.perf_counter() - started_at
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profiling_started_at', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = conn.info['profiling_started_at'].pop()
+    timings = current_timings.get()
+    if timings is not None:
+        timings.sql_count += 1
+        timings.sql_seconds += time.perf_counter() - started_at
+
+
+def instrument_engines(*engines):
+    for value in engines:
+        value = getattr(value, 'sync_engine', value)
+        event.listen(value, 'before_cursor_execute', before_cursor_execute)
+        event.listen(value, 'after_cursor_execute', after_cursor_execute)
+
+
+def instrument_serialization():
+    """
+    FastAPI validates and encodes the returned data with fastapi.routing.serialize_response,
+    which has no hook of its own, so it is wrapped to time the `serialize` phase
+    """
+    serialize_response = fastapi.routing.serialize_response
+
+    async def timed_serialize_response(*args, **kwargs):
+        with timed('serialize'):
+            return await serialize_response(*args, **kwargs)
+
+    fastapi.routing.serialize_response = timed_serialize_response
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    def observe(self, seconds, status_code, timings: RequestTimings):
+        self.requests += 1
+        self.errors += status_code >= 500
+        self.seconds += seconds
+        index = bisect_left(LATENCY_BUCKETS, seconds)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        self.sql_count += timings.sql_count
+        self.sql_seconds += timings.sql_seconds
+        for phase, value in timings.phases.items():
+            self.phases[phase] += value
+
+
+class MetricsRegistry:
+    """
+    Request metrics of this worker process by method and route template
+    """
+
+    def __init__(self):
+        self.routes = {}
+
+    def observe(self, method, route, seconds, status_code, timings):
+        key = (method, route)
+        if key not in self.routes:
+            self.routes[key] = RouteMetrics()
+        self.routes[key].observe(seconds, status_code, timings)
+
+    def render(self):
+        """
+        The metrics in the Prometheus text exposition format
+        """
+        lines = []
+
+        def family(name, kind, description, samples):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        def labels(method, route, **extra):
+            values = {'method': method, 'route': route, **extra}
+            return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in values.items()) + '}'
+
+        routes = sorted(self.routes.items())
+        family('http_requests_total', 'counter', 'Requests handled',
+               [f'http_requests_total{labels(*key)} {metrics.requests}' for key, metrics in routes])
+        family('http_request_errors_total', 'counter', 'Requests answered with a 5xx status',
+               [f'http_request_errors_total{labels(*key)} {metrics.errors}' for key, metrics in routes])
+        samples = []
+        for key, metrics in routes:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                cumulative += count
+                samples.append(f'http_request_duration_seconds_bucket{labels(*key, le=bound)} {cumulative}')
+            samples.append(f'http_request_duration_seconds_bucket{labels(*key, le="+Inf")} {metrics.requests}')
+            samples.append(f'http_request_duration_seconds_sum{labels(*key)} {metrics.seconds:.6f}')
+            samples.append(f'http_request_duration_seconds_count{labels(*key)} {metrics.requests}')
+        family('http_request_duration_seconds', 'histogram', 'Wall time of the requests', samples)
+        family('http_request_sql_statements_total', 'counter', 'SQL statements executed by the requests',
+               [f'http_request_sql_statements_total{labels(*key)} {metrics.sql_count}' for key, metrics in routes])
+        family('http_request_sql_seconds_total', 'counter', 'Time the requests spent in SQL statements',
+               [f'http_request_sql_seconds_total{labels(*key)} {metrics.sql_seconds:.6f}' for key, metrics in routes])
+        family('http_request_phase_seconds_total', 'counter',
+               'Time the requests spent serializing responses, checking tokens and hashing passwords',
+               [f'http_request_phase_seconds_total{labels(*key, phase=phase)} {seconds:.6f}'
+                for key, metrics in routes for phase, seconds in metrics.phases.items()])
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics_registry = MetricsRegistry()
+
+
+def server_timing(total, timings: RequestTimings):
+    entries = [f'app;dur={total * 1000:.2f}',
+               f'sql;dur={timings.sql_seconds * 1000:.2f};desc="{timings.sql_count} queries"']
+    entries += [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in timings.phases.items() if seconds]
+    return ', '.join(entries)
+
+
+class Profiler:
+    """
+    Captures one request. The profilers see the whole thread, so requests running
+    concurrently on the same event loop show up in the capture too, and only one
+    capture runs at a time: cProfile can not enable a second profiler meanwhile.
+    """
+
+    # a capture is running in this process
+    running = False
+
+    def __init__(self):
+        if PROFILER == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as Pyinstrument
+            except ImportError:
+                raise RuntimeError('PROFILER=pyinstrument requires the pyinstrument package')
+            self.profiler = Pyinstrument(async_mode='enabled')
+        elif PROFILER == 'cprofile':
+            self.profiler = cProfile.Profile()
+        else:
+            raise ValueError('PROFILER must be "cprofile" or "pyinstrument"')
+
+    def start(self):
+        Profiler.running = True
+        if PROFILER == 'pyinstrument':
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self, name):
+        """
+        Saves the capture into PROFILE_DIR and returns the file name
+        """
+        try:
+            if PROFILER == 'pyinstrument':
+                self.profiler.stop()
+            else:
+                self.profiler.disable()
+        finally:
+            Profiler.running = False
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        if PROFILER == 'pyinstrument':
+            path = PROFILE_DIR / f'{name}.html'
+            path.write_text(self.profiler.output_html())
+        else:
+            path = PROFILE_DIR / f'{name}.prof'
+            self.profiler.dump_stats(path)
+        return path.name
+
+
+def route_template(scope):
+    route = scope.get('route')
+    if route is not None:
+        return route.path
+    endpoint = scope.get('endpoint')
+    app = scope.get('app')
+    if endpoint is not None and app is not None:
+        for route in app.routes:
+            if getattr(route, 'endpoint', None) is endpoint:
+                return route.path
+    return 'unmatched'
+
+
+class ProfilingMiddleware:
+    """
+    Records wall, SQL, serialization, token and password hashing time of every request into
+    the /metrics registry and the Server-Timing header, and profiles sampled requests
+    """
+
+    def __init__(self, app, sample_rate=PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    def should_profile(self, scope):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if PROFILE_SECRET is None:
+            return False
+        return dict(scope['headers']).get(PROFILE_HEADER) == PROFILE_SECRET.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        # sampled requests arriving during a capture are not profiled
+        profiler = Profiler() if not Profiler.running and self.should_profile(scope) else None
+        profile_name = None
+        if profiler is not None:
+            profile_name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{random.getrandbits(32):08x}'
+        started_at = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', server_timing(time.perf_counter() - started_at, timings).encode()))
+                if profile_name is not None:
+                    headers.append((b'x-profile-id', profile_name.encode()))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        if profiler is not None:
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if profiler is not None:
+                profiler.stop(profile_name)
+            current_timings.reset(token)
+            metrics_registry.observe(scope['method'], route_template(scope), time.perf_counter() - started_at,
+                                     status_code, timings)
@@ -0,0 +1,25 @@
+from sqlalchemy import select
+from .models import RecipesIngredientsModel
+from .schemas.recipes import RecipeResponseScheme
+
+RECIPE_COLUMNS = [name for name in RecipeResponseScheme.__fields__ if name != 'ingredient_ids']
+
+
+async def load_ingredient_ids(db, recipe_ids):
+    """
+    Maps every recipe id to the ids of its ingredients with one SELECT ... IN
+    """
+    ingredient_ids = {recipe_id: [] for recipe_id in recipe_ids}
+    if not ingredient_ids:
+        return ingredient_ids
+    rows = await db.execute(
+        select(RecipesIngredientsModel.recipe_id, RecipesIngredientsModel.ingredient_id).where(
+            RecipesIngredientsModel.recipe_id.in_(ingredient_ids)).order_by(RecipesIngredientsModel.id))
+    for recipe_id, ingredient_id in rows:
+        ingredient_ids[recipe_id].append(ingredient_id)
+    return ingredient_ids
+
+
+def recipe_response(recipe, ingredient_ids):
+    return RecipeResponseScheme(**{name: getattr(recipe, name) for name in RECIPE_COLUMNS},
+                                ingredient_ids=ingredient_ids)
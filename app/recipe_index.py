@@ -0,0 +1,50 @@
+import numpy
+from .similar_recipes import similar_recipes
+
+
+class RecipeIngredientIndex:
+    """
+    Looks recipes up by ingredient in the recipe x ingredient snapshot of SimilarRecipes: its
+    transpose lists the recipes of every ingredient. The snapshot is built off the event loop and
+    shared by the workers, the recipes changed since then come from its changes.
+    """
+
+    def __init__(self, similar):
+        self.similar = similar
+
+    async def ensure_loaded(self, db):
+        await self.similar.ensure_loaded(db)
+
+    def search(self, ingredient_ids, max_missing=0, limit=20, offset=0):
+        """
+        Ranks the recipes sharing at least one ingredient with `ingredient_ids`: complete recipes first,
+        then by the number of missing ingredients. Returns (recipe_id, matched, missing ingredient ids).
+        """
+        available = frozenset(ingredient_ids)
+        if not available:
+            return []
+        snapshot = self.similar.snapshot
+        changes = self.similar.changes
+        postings = [snapshot.ingredient_indices[snapshot.ingredient_indptr[ingredient_id]:
+                                                snapshot.ingredient_indptr[ingredient_id + 1]]
+                    for ingredient_id in available if 0 <= ingredient_id < len(snapshot.ingredient_indptr) - 1]
+        matched = numpy.bincount(numpy.concatenate(postings or [numpy.zeros(0, dtype=numpy.int32)]),
+                                 minlength=len(snapshot.sizes))
+        # the recipes changed since the snapshot are matched from their changes below
+        matched[[recipe_id for recipe_id in changes if recipe_id < len(matched)]] = 0
+        missing = snapshot.sizes - matched
+        candidates = numpy.flatnonzero((matched > 0) & (missing <= max_missing))
+        # no more than offset + limit of them can make the page
+        order = numpy.lexsort((candidates, -matched[candidates], missing[candidates]))[:offset + limit]
+        results = [(int(missing[recipe_id]), -int(matched[recipe_id]), int(recipe_id))
+                   for recipe_id in candidates[order]]
+        for recipe_id, (_, ingredients) in changes.items():
+            shared = len(ingredients & available) if ingredients else 0
+            if shared and len(ingredients) - shared <= max_missing:
+                results.append((len(ingredients) - shared, -shared, recipe_id))
+        results.sort()
+        return [(recipe_id, -shared, sorted(self.similar.ingredients(recipe_id) - available))
+                for _, shared, recipe_id in results[offset:offset + limit]]
+
+
+recipe_index = RecipeIngredientIndex(similar_recipes)
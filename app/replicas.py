@@ -0,0 +1,245 @@
+import itertools
+import math
+import os
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+from .cache import TTLCache, response_cache
+from .databases import DATABASE_ASYNC, SyncSessionAdapter, TimedAsyncQueuePool, TimedQueuePool, engine_options, \
+    get_async_url
+
+load_dotenv()
+
+# comma separated sync urls, GET requests are spread over them
+SQLALCHEMY_REPLICA_URLS = [url.strip() for url in os.getenv('SQLALCHEMY_REPLICA_URLS', '').split(',') if url.strip()]
+# round_robin or least_connections
+REPLICA_STRATEGY = os.getenv('REPLICA_STRATEGY', 'round_robin')
+# reads of a client stay on the primary for this long after its last write
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+# cookie carrying the unix time of the client's last write, so every worker honours the above
+REPLICA_STICKY_COOKIE = os.getenv('REPLICA_STICKY_COOKIE', 'last_write')
+# an unreachable replica is skipped for this long
+REPLICA_RETRY_SECONDS = float(os.getenv('REPLICA_RETRY_SECONDS', 30))
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+class Replica:
+    def __init__(self, url):
+        self.url = make_url(url)
+        if DATABASE_ASYNC:
+            async_url = get_async_url(url)
+            self.engine = create_async_engine(async_url, **engine_options(async_url, TimedAsyncQueuePool))
+            self.session_factory = sessionmaker(
+                self.engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
+            )
+        else:
+            self.engine = create_engine(url, **engine_options(url, TimedQueuePool))
+            session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+            self.session_factory = lambda: SyncSessionAdapter(session_factory())
+        self.active = 0
+        self.down_until = 0.0
+        self.failures = 0
+
+    @property
+    def is_up(self):
+        return self.down_until <= time.monotonic()
+
+    def status(self):
+        return {
+            'url': self.url.render_as_string(hide_password=True),
+            'up': self.is_up,
+            'active_sessions': self.active,
+            'failures': self.failures,
+        }
+
+
+class ReplicaSession:
+    """
+    Read session on a replica. The first statement checks out a connection, and when
+    the replica can not be reached the session moves to the primary and the replica
+    is skipped by later requests for REPLICA_RETRY_SECONDS.
+    """
+
+    def __init__(self, router, replica, primary_factory):
+        self.router = router
+        self.replica = replica
+        self.primary_factory = primary_factory
+        self.session = replica.session_factory()
+        self.connected = False
+        self.primary = None
+        replica.active += 1
+
+    @property
+    def bind(self):
+        return self.session.bind
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def ready(self):
+        if self.connected:
+            return self.session
+        self.connected = True
+        try:
+            await self.session.connection()
+        except (DBAPIError, OSError):
+            self.router.mark_down(self.replica)
+            await self.release()
+            self.session = self.primary_factory()
+        return self.session
+
+    async def execute(self, *args, **kwargs):
+        return await (await self.ready()).execute(*args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await (await self.ready()).scalar(*args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return await (await self.ready()).scalars(*args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await (await self.ready()).get(*args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        return await (await self.ready()).stream(*args, **kwargs)
+
+    async def on_primary(self):
+        """
+        A session on the primary, for the reads that must not lag behind the writes
+        """
+        if self.replica is None:
+            # the replica was unreachable, this session already is on the primary
+            return self.session
+        if self.primary is None:
+            self.primary = self.primary_factory()
+        return self.primary
+
+    async def release(self):
+        if self.replica is not None:
+            self.replica.active -= 1
+            self.replica = None
+            await self.session.close()
+
+    async def close(self):
+        if self.primary is not None:
+            await self.primary.close()
+            self.primary = None
+        if self.replica is not None:
+            await self.release()
+        else:
+            await self.session.close()
+
+
+async def primary_session(db):
+    """
+    `db` itself, or a session on the primary when `db` reads from a replica
+    """
+    on_primary = getattr(db, 'on_primary', None)
+    return db if on_primary is None else await on_primary()
+
+
+class ReplicaRouter:
+    """
+    Picks the database of a request: GET and HEAD go to a replica, everything else,
+    and the reads of a client that has just written, to the primary. A client has just
+    written when this worker committed for it lately, or when its last write cookie says so.
+    """
+
+    def __init__(self, urls, strategy=REPLICA_STRATEGY, sticky_seconds=REPLICA_STICKY_SECONDS):
+        if strategy not in ('round_robin', 'least_connections'):
+            raise ValueError('REPLICA_STRATEGY must be "round_robin" or "least_connections"')
+        self.replicas = [Replica(url) for url in urls]
+        self.strategy = strategy
+        self._next = itertools.cycle(range(len(self.replicas)))
+        self.sticky_seconds = sticky_seconds
+        self.sticky = TTLCache(maxsize=100000, ttl=sticky_seconds)
+
+    def choose(self):
+        replicas = [replica for replica in self.replicas if replica.is_up]
+        if not replicas:
+            return None
+        if self.strategy == 'least_connections':
+            return min(replicas, key=lambda replica: replica.active)
+        for _ in self.replicas:
+            replica = self.replicas[next(self._next)]
+            if replica.is_up:
+                return replica
+
+    def mark_down(self, replica):
+        replica.failures += 1
+        replica.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+
+    def stick(self, key):
+        self.sticky.set(key, True)
+
+    def wrote_lately(self, key, written_at=None):
+        """
+        Whether the client `key` wrote in the last `sticky_seconds`; `written_at` is the unix time
+        of its last write the client sent back, a string as it comes from the cookie
+        """
+        if self.sticky.get(key) is not None:
+            return True
+        try:
+            return time.time() - float(written_at) < self.sticky_seconds
+        except (TypeError, ValueError):
+            return False
+
+    def session(self, method, key, primary_factory, written_at=None, on_commit=None):
+        """
+        Creates the session of a request with `method`, made by the client identified by `key`.
+        `on_commit` gets the unix time of every commit of the request, to hand it to the client.
+        """
+        replica = None
+        if method in READ_METHODS and not self.wrote_lately(key, written_at):
+            replica = self.choose()
+        if replica is not None:
+            return ReplicaSession(self, replica, primary_factory)
+        session = primary_factory()
+        if self.replicas:
+            def committed(_):
+                self.stick(key)
+                if on_commit is not None:
+                    on_commit(time.time())
+
+            event.listen(session.sync_session, 'after_commit', committed)
+        return session
+
+    def status(self):
+        return {'strategy': self.strategy, 'replicas': [replica.status() for replica in self.replicas]}
+
+
+class ReadYourWritesMiddleware:
+    """
+    Sets the last write cookie on the responses of the requests that committed a write
+    """
+
+    def __init__(self, app, router=None):
+        self.app = app
+        self.router = router if router is not None else replica_router
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            written_at = scope.get('state', {}).get('last_write')
+            if message['type'] == 'http.response.start' and written_at is not None:
+                max_age = math.ceil(self.router.sticky_seconds)
+                cookie = f'{REPLICA_STICKY_COOKIE}={written_at:.3f}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax'
+                message['headers'] = [*message.get('headers', []), (b'set-cookie', cookie.encode('latin-1'))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+replica_router = ReplicaRouter(SQLALCHEMY_REPLICA_URLS)
+
+if replica_router.replicas:
+    # a replica may still return the old data for a moment after a write, do not cache it meanwhile
+    response_cache.settle_seconds = REPLICA_STICKY_SECONDS
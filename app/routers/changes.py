@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..authentication import get_current_user
+from ..changes import CHANGES_HEARTBEAT_SECONDS, CHANGES_MAX_WAIT, CHANGES_PAGE_SIZE, CHANGES_POLL_INTERVAL, \
+    ENTITIES, load_changes
+from ..dependencies import get_db
+from ..fast_json import FastJSONResponse, dumps
+from ..schemas.changes import ChangeFeedScheme
+from ..schemas.users import UserResponseScheme
+
+router = APIRouter(
+    prefix='/changes',
+    tags=['Changes']
+)
+
+
+async def poll_changes(request: Request, db, since, limit, entities, wait):
+    """
+    Loads the changes after `since`, waiting up to `wait` seconds for the first one.
+    The transaction is ended between polls, so no connection is held while waiting.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        changes = await load_changes(db, since, limit, entities)
+        await db.rollback()
+        if changes or time.monotonic() >= deadline or await request.is_disconnected():
+            return changes
+        await asyncio.sleep(min(CHANGES_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+
+
+async def event_stream(request: Request, db, since, limit, entities):
+    """
+    Server-sent events, one `change` event per change with its id as the event id,
+    and a comment line as a heartbeat while nothing changes
+    """
+    last_sent = time.monotonic()
+    while not await request.is_disconnected():
+        changes = await poll_changes(request, db, since, limit, entities, CHANGES_HEARTBEAT_SECONDS)
+        if changes:
+            since = changes[-1]['id']
+            yield b''.join(b'id: %d\nevent: change\ndata: %s\n\n' % (change['id'], dumps(change))
+                           for change in changes)
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= CHANGES_HEARTBEAT_SECONDS:
+            yield b': heartbeat\n\n'
+            last_sent = time.monotonic()
+
+
+@router.get('', status_code=status.HTTP_200_OK, response_model=ChangeFeedScheme,
+            summary='Changes of the catalogue since a cursor')
+async def list_changes(request: Request,
+                       since: int = Query(0, ge=0, description='next_cursor of the previous call, 0 for all changes'),
+                       limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=5000),
+                       wait: float = Query(0, ge=0, le=CHANGES_MAX_WAIT,
+                                           description='Seconds to wait for a change when there is none yet'),
+                       entity: Optional[List[str]] = Query(None, description='Only changes of these tables'),
+                       db: AsyncSession = Depends(get_db),
+                       current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Created, updated and deleted ingredients, recipes and their categories in the order they
+    were written. An upsert carries the current row as _data_, a delete is a tombstone.
+    With _Accept: text/event-stream_ the changes are pushed as server-sent events instead,
+    resuming after _Last-Event-ID_ when the client reconnects.
+    """
+    unknown = set(entity or ()) - set(ENTITIES)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f'Unknown entities: {", ".join(sorted(unknown))}')
+    if 'text/event-stream' in request.headers.get('accept', ''):
+        last_event_id = request.headers.get('last-event-id', '')
+        if last_event_id.isdigit():
+            since = int(last_event_id)
+        return StreamingResponse(event_stream(request, db, since, limit, entity), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    changes = await poll_changes(request, db, since, limit, entity, wait)
+    return FastJSONResponse({'changes': changes, 'next_cursor': changes[-1]['id'] if changes else since})
@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..authentication import get_current_user
+from ..dependencies import get_db
+from ..export import INGREDIENT_COLUMNS, MEDIA_TYPES, RECIPE_COLUMNS, accepts_gzip, encoder, export_window, \
+    gzip_chunks, ingredient_chunks, recipe_chunks
+from ..models import IngredientModel, RecipesModel
+from ..schemas.users import UserResponseScheme
+
+router = APIRouter(
+    prefix='/export',
+    tags=['Export']
+)
+
+
+def export_response(request: Request, name, export_format, chunks, until_id):
+    headers = {
+        'Content-Disposition': f'attachment; filename="{name}.{export_format}"',
+        'Vary': 'Accept-Encoding',
+    }
+    if until_id is not None:
+        headers['X-Export-Until-Id'] = str(until_id)
+    if accepts_gzip(request):
+        headers['Content-Encoding'] = 'gzip'
+        chunks = gzip_chunks(chunks)
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[export_format], headers=headers)
+
+
+@router.get('/ingredients', status_code=status.HTTP_200_OK, summary='Export all ingredients')
+async def export_ingredients(request: Request,
+                             export_format: str = Query('ndjson', alias='format', regex='^(ndjson|csv)$'),
+                             since_id: Optional[int] = Query(None, ge=0, description='Only ingredients with a larger id'),
+                             since: Optional[datetime] = Query(None, description='Only ingredients changed after this time'),
+                             db: AsyncSession = Depends(get_db),
+                             current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Streams the ingredients as NDJSON or CSV, gzip compressed when the client accepts it.
+    _X-Export-Until-Id_ is the since_id of the next incremental export.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    conditions, until_id = await export_window(db, IngredientModel, since_id, since)
+    chunks = ingredient_chunks(db, conditions, encoder(export_format, INGREDIENT_COLUMNS))
+    return export_response(request, 'ingredients', export_format, chunks, until_id)
+
+
+@router.get('/recipes', status_code=status.HTTP_200_OK, summary='Export all recipes')
+async def export_recipes(request: Request,
+                         export_format: str = Query('ndjson', alias='format', regex='^(ndjson|csv)$'),
+                         since_id: Optional[int] = Query(None, ge=0, description='Only recipes with a larger id'),
+                         since: Optional[datetime] = Query(None, description='Only recipes changed after this time'),
+                         db: AsyncSession = Depends(get_db),
+                         current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Streams the recipes with their ingredient ids as NDJSON or CSV, gzip compressed when
+    the client accepts it. _X-Export-Until-Id_ is the since_id of the next incremental export.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    conditions, until_id = await export_window(db, RecipesModel, since_id, since)
+    chunks = recipe_chunks(db, conditions, encoder(export_format, RECIPE_COLUMNS + ('ingredient_ids',)))
+    return export_response(request, 'recipes', export_format, chunks, until_id)
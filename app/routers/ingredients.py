@@ -1,9 +1,19 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..dependencies import get_db
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..cache import INGREDIENT_CATEGORIES, INGREDIENTS, response_cache
+from ..bulk import batch_failed, bulk_response, iter_batches, iter_items, parse_batch, upsert_by_title
+from ..deletes import delete_ingredient_categories, delete_ingredients
+from ..dependencies import get_db, get_loaders
+from ..fast_json import FastJSONResponse
+from ..loaders import RequestLoaders, loader_options
+from ..pagination import PageParams, fetch_rows_page, id_list, optional_id_list, page_response
+from ..text_search import autocomplete_ids, ingredient_text_index, search_ids
 from ..schemas.ingredients import CategoryIngredientCreationScheme, IngredientCreationScheme, \
-    CategoryIngredientResponseScheme, IngredientResponseScheme
+    CategoryIngredientResponseScheme, IngredientResponseScheme, IngredientSearchResultScheme, IngredientSuggestionScheme
+from ..schemas.bulk import BulkDeleteResponseScheme, BulkItemResultScheme, BulkResponseScheme
 from ..schemas.users import UserResponseScheme
 from ..models import CategoryIngredientModel, IngredientModel
 from ..authentication import get_current_user
@@ -21,7 +31,7 @@ router = APIRouter(
              response_description='Created category')
 async def create_ingredient_category(
         category_scheme: CategoryIngredientCreationScheme,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: UserResponseScheme = Depends(get_current_user)):
     """
     You can create a category with two parameters:
@@ -30,26 +40,83 @@ async def create_ingredient_category(
     """
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    if db.query(CategoryIngredientModel).filter(CategoryIngredientModel.title == category_scheme.title).first():
+    if await db.scalar(select(CategoryIngredientModel).where(CategoryIngredientModel.title == category_scheme.title)):
         raise HTTPException(status_code=status.HTTP_302_FOUND, detail='This category already exists')
     category = CategoryIngredientModel(**category_scheme.dict())
     db.add(category)
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
+    await response_cache.invalidate(INGREDIENT_CATEGORIES)
     return category
 
 
+@router.post('/category/bulk',
+             status_code=status.HTTP_200_OK,
+             response_model=BulkResponseScheme,
+             summary='Create or update many categories of ingredients')
+async def upsert_ingredient_categories(
+        request: Request,
+        db: AsyncSession = Depends(get_db),
+        current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Accepts a JSON array or an NDJSON stream of categories. A category with an
+    existing _title_ gets its _description_ updated, every item gets its own result
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    results = []
+    seen_titles = set()
+    async for batch in iter_batches(iter_items(request)):
+        errors, categories = parse_batch(batch, CategoryIngredientCreationScheme, seen_titles)
+        results.extend(errors)
+        if not categories:
+            continue
+        try:
+            results.extend(await upsert_by_title(db, CategoryIngredientModel, categories, ['description']))
+            await db.commit()
+        except SQLAlchemyError as error:
+            await db.rollback()
+            results.extend(batch_failed(categories, error))
+    await response_cache.invalidate(INGREDIENT_CATEGORIES)
+    return bulk_response(results)
+
+
 @router.get('/category/list',
             status_code=status.HTTP_200_OK,
             response_model=List[CategoryIngredientResponseScheme],
             summary='List of categories of ingredients',
             response_description='List of categories')
-async def categories_list(db: Session = Depends(get_db), current_user: UserResponseScheme = Depends(get_current_user)):
+async def categories_list(request: Request, response: Response, page: PageParams = Depends(),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    You will see the list of categories. The list is split into pages:
+    pass _cursor_ from the _Link_ header to get the next one
+    """
+    async def load():
+        categories, next_cursor = await fetch_rows_page(db, CategoryIngredientModel, CategoryIngredientResponseScheme,
+                                                        page)
+        return page_response(request, response, page, categories, next_cursor, trusted=True)
+
+    return await response_cache.respond(request, response, [INGREDIENT_CATEGORIES],
+                                        List[CategoryIngredientResponseScheme], load)
+
+
+@router.get('/category/batch',
+            status_code=status.HTTP_200_OK,
+            response_model=List[CategoryIngredientResponseScheme],
+            summary='Get many categories of ingredients by id')
+async def category_batch(request: Request, response: Response, ids: List[int] = Depends(id_list),
+                         loaders: RequestLoaders = Depends(get_loaders),
+                         current_user: UserResponseScheme = Depends(get_current_user)):
     """
-    You will see the list of categories
+    Pass the ids as _?ids=1,2,3_. The categories found are returned in that order
     """
-    categories = db.query(CategoryIngredientModel).all()
-    return categories
+    async def load():
+        return FastJSONResponse(await loaders.many(loaders.ingredient_categories.load, ids))
+
+    return await response_cache.respond(request, response, [INGREDIENT_CATEGORIES],
+                                        List[CategoryIngredientResponseScheme], load)
 
 
 @router.put('/category/update/{category_id}',
@@ -60,23 +127,24 @@ async def categories_list(db: Session = Depends(get_db), current_user: UserRespo
 async def update_category(
         category_id: int,
         category_scheme: CategoryIngredientCreationScheme,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: UserResponseScheme = Depends(get_current_user)):
     """
     To update a category you need to pass _category_id_
     """
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    category = db.query(CategoryIngredientModel).filter(CategoryIngredientModel.id == category_id).first()
+    category = await db.scalar(select(CategoryIngredientModel).where(CategoryIngredientModel.id == category_id))
     if category is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
-    if db.query(CategoryIngredientModel).filter(CategoryIngredientModel.title == category_scheme.title).first():
+    if await db.scalar(select(CategoryIngredientModel).where(CategoryIngredientModel.title == category_scheme.title)):
         raise HTTPException(status_code=status.HTTP_302_FOUND, detail='Category already exists')
     category.title = category_scheme.title
     category.description = category_scheme.description
 
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
+    await response_cache.invalidate(INGREDIENT_CATEGORIES)
     return category
 
 
@@ -85,18 +153,15 @@ async def update_category(
                summary='Delete a category')
 async def delete_category(
         category_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: UserResponseScheme = Depends(get_current_user)):
     """
-    To delete a category you need to pass _category_id_
+    To delete a category you need to pass _category_id_. Its ingredients stay, without a category.
     """
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    category = db.query(CategoryIngredientModel).filter(CategoryIngredientModel.id == category_id).first()
-    if category is None:
+    if not await delete_ingredient_categories(db, CategoryIngredientModel.id == category_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
-    db.delete(category)
-    db.commit()
 
 
 @router.get('/category/{category_id}',
@@ -105,15 +170,21 @@ async def delete_category(
             summary='Get category by id')
 async def get_category(
         category_id: int,
-        db: Session = Depends(get_db),
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_db),
         current_user: UserResponseScheme = Depends(get_current_user)):
     """
     To get a category you need to pass _category_id_
     """
-    category = db.query(CategoryIngredientModel).filter(CategoryIngredientModel.id == category_id).first()
-    if category is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
-    return category
+    async def load():
+        category = await db.scalar(select(CategoryIngredientModel).where(CategoryIngredientModel.id == category_id))
+        if category is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
+        return category
+
+    return await response_cache.respond(request, response, [INGREDIENT_CATEGORIES],
+                                        CategoryIngredientResponseScheme, load)
 
 
 @router.post('/create',
@@ -122,32 +193,101 @@ async def get_category(
              response_model=IngredientCreationScheme,
              description=f"You can create an ingredient here.")
 async def create_ingredient(ingredient_scheme: IngredientCreationScheme,
-                            db: Session = Depends(get_db),
+                            db: AsyncSession = Depends(get_db),
                             current_user: UserResponseScheme = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    if db.query(CategoryIngredientModel).filter(
-            CategoryIngredientModel.id == ingredient_scheme.category_id).first() is None:
+    if ingredient_scheme.category_id is not None and await db.scalar(select(CategoryIngredientModel).where(
+            CategoryIngredientModel.id == ingredient_scheme.category_id)) is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
 
-    if db.query(IngredientModel).filter(IngredientModel.title == ingredient_scheme.title).first():
+    if await db.scalar(select(IngredientModel).where(IngredientModel.title == ingredient_scheme.title)):
         raise HTTPException(status_code=status.HTTP_302_FOUND, detail='Ingredient already exists')
 
     ingredient = IngredientModel(**ingredient_scheme.dict())
     db.add(ingredient)
-    db.commit()
-    db.refresh(ingredient)
+    await db.commit()
+    await db.refresh(ingredient)
+    await response_cache.invalidate(INGREDIENTS)
+    ingredient_text_index.add(ingredient.id, {'title': ingredient.title})
     return ingredient
 
 
+@router.post('/bulk',
+             status_code=status.HTTP_200_OK,
+             response_model=BulkResponseScheme,
+             summary='Create or update many ingredients')
+async def upsert_ingredients(request: Request,
+                             db: AsyncSession = Depends(get_db),
+                             current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Accepts a JSON array or an NDJSON stream of ingredients. An ingredient with an
+    existing _title_ gets its _category_id_ updated, every item gets its own result
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    results = []
+    seen_titles = set()
+    async for batch in iter_batches(iter_items(request)):
+        errors, ingredients = parse_batch(batch, IngredientCreationScheme, seen_titles)
+        results.extend(errors)
+        if not ingredients:
+            continue
+        # an ingredient may have no category
+        category_ids = set((await db.scalars(select(CategoryIngredientModel.id).where(
+            CategoryIngredientModel.id.in_({value.category_id for _, value in ingredients})))).all()) | {None}
+        results.extend(BulkItemResultScheme(index=index, status='error', detail='Category was not found')
+                       for index, value in ingredients if value.category_id not in category_ids)
+        ingredients = [(index, value) for index, value in ingredients if value.category_id in category_ids]
+        if not ingredients:
+            continue
+        try:
+            upserted = await upsert_by_title(db, IngredientModel, ingredients, ['category_id'])
+            await db.commit()
+        except SQLAlchemyError as error:
+            await db.rollback()
+            results.extend(batch_failed(ingredients, error))
+            continue
+        titles = {index: value.title for index, value in ingredients}
+        for result in upserted:
+            ingredient_text_index.add(result.id, {'title': titles[result.index]})
+        results.extend(upserted)
+    await response_cache.invalidate(INGREDIENTS)
+    return bulk_response(results)
+
+
 @router.get('/list',
             status_code=status.HTTP_200_OK,
             summary='List of ingredients',
             response_model=List[IngredientResponseScheme]
             )
-async def ingredient_list(db: Session = Depends(get_db), current_user: UserResponseScheme = Depends(get_current_user)):
-    ingredients = db.query(IngredientModel).all()
-    return ingredients
+async def ingredient_list(request: Request, response: Response, page: PageParams = Depends(),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: UserResponseScheme = Depends(get_current_user)):
+    async def load():
+        ingredients, next_cursor = await fetch_rows_page(db, IngredientModel, IngredientResponseScheme, page)
+        return page_response(request, response, page, ingredients, next_cursor, trusted=True)
+
+    return await response_cache.respond(request, response, [INGREDIENTS, INGREDIENT_CATEGORIES],
+                                        List[IngredientResponseScheme], load)
+
+
+@router.get('/batch',
+            status_code=status.HTTP_200_OK,
+            summary='Get many ingredients by id',
+            response_model=List[IngredientResponseScheme])
+async def ingredient_batch(request: Request, response: Response, ids: List[int] = Depends(id_list),
+                           loaders: RequestLoaders = Depends(get_loaders),
+                           current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Pass the ids as _?ids=1,2,3_. The ingredients found are returned in that order
+    with their categories, which are fetched together in one more query
+    """
+    async def load():
+        return FastJSONResponse(await loaders.many(loaders.ingredient, ids))
+
+    return await response_cache.respond(request, response, [INGREDIENTS, INGREDIENT_CATEGORIES],
+                                        List[IngredientResponseScheme], load)
 
 
 @router.put('/update/{ingredient_id}',
@@ -157,38 +297,90 @@ async def ingredient_list(db: Session = Depends(get_db), current_user: UserRespo
 async def update_ingredient(
         ingredient_id: int,
         ingredient_scheme: IngredientCreationScheme,
-        db: Session = Depends(get_db), current_user: UserResponseScheme = Depends(get_current_user)):
+        db: AsyncSession = Depends(get_db), current_user: UserResponseScheme = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    ingredient = db.query(IngredientModel).filter(IngredientModel.id == ingredient_id).first()
+    ingredient = await db.scalar(select(IngredientModel).where(IngredientModel.id == ingredient_id))
     if ingredient is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Ingredient was not found')
-    if db.query(IngredientModel).filter(IngredientModel.title == ingredient_scheme.title).first():
+    if ingredient_scheme.category_id is not None and await db.scalar(select(CategoryIngredientModel).where(
+            CategoryIngredientModel.id == ingredient_scheme.category_id)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
+    if await db.scalar(select(IngredientModel).where(IngredientModel.title == ingredient_scheme.title)):
         raise HTTPException(status_code=status.HTTP_302_FOUND, detail='Ingredient already exists')
     ingredient.title = ingredient_scheme.title
     ingredient.category_id = ingredient_scheme.category_id
-    db.commit()
-    db.refresh(ingredient)
+    await db.commit()
+    await db.refresh(ingredient)
+    await response_cache.invalidate(INGREDIENTS)
+    ingredient_text_index.add(ingredient.id, {'title': ingredient.title})
     return ingredient
 
 
+@router.delete('/delete', status_code=status.HTTP_200_OK, response_model=BulkDeleteResponseScheme,
+               summary='Delete many ingredients')
+async def delete_ingredients_bulk(ids: Optional[List[int]] = Depends(optional_id_list),
+                                  category_id: Optional[int] = Query(None, description='Delete every ingredient of it'),
+                                  db: AsyncSession = Depends(get_db),
+                                  current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Deletes the ingredients of _ids_ or all those of _category_id_, with their links to recipes
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    if (ids is None) == (category_id is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Pass either ids or category_id')
+    condition = IngredientModel.id.in_(ids) if ids is not None else IngredientModel.category_id == category_id
+    return {'deleted': len(await delete_ingredients(db, condition))}
+
+
 @router.delete('/delete/{ingredient_id}', status_code=status.HTTP_204_NO_CONTENT, summary='Delete an ingredient')
-async def delete_ingredient(ingredient_id, db: Session = Depends(get_db),
+async def delete_ingredient(ingredient_id: int, db: AsyncSession = Depends(get_db),
                             current_user: UserResponseScheme = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    ingredient = db.query(IngredientModel).filter(IngredientModel.id == ingredient_id).first()
-    if ingredient is None:
+    if not await delete_ingredients(db, IngredientModel.id == ingredient_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Ingredient was not found')
-    db.delete(ingredient)
-    db.commit()
+
+
+@router.get('/search', status_code=status.HTTP_200_OK, response_model=List[IngredientSearchResultScheme],
+            summary='Search ingredients')
+async def search_ingredients(q: str = Query(..., min_length=1),
+                             limit: int = Query(20, ge=1, le=100),
+                             offset: int = Query(0, ge=0),
+                             db: AsyncSession = Depends(get_db),
+                             current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Finds ingredients by words of the title, tolerating typos and unfinished words
+    """
+    matches = await search_ids(db, IngredientModel, ingredient_text_index, q, limit, offset)
+    ingredients = {ingredient.id: ingredient for ingredient in (await db.scalars(
+        select(IngredientModel).where(IngredientModel.id.in_([ingredient_id for ingredient_id, _ in matches]))
+        .options(*loader_options(IngredientModel, IngredientResponseScheme)))).all()}
+    return [IngredientSearchResultScheme(ingredient=IngredientResponseScheme.from_orm(ingredients[ingredient_id]),
+                                         score=score)
+            for ingredient_id, score in matches if ingredient_id in ingredients]
+
+
+@router.get('/autocomplete', status_code=status.HTTP_200_OK, response_model=List[IngredientSuggestionScheme],
+            summary='Suggest ingredient titles')
+async def autocomplete_ingredients(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50),
+                                   db: AsyncSession = Depends(get_db),
+                                   current_user: UserResponseScheme = Depends(get_current_user)):
+    ingredient_ids = await autocomplete_ids(db, IngredientModel, ingredient_text_index, q, limit)
+    ingredients = {ingredient.id: ingredient for ingredient in (await db.execute(
+        select(IngredientModel.id, IngredientModel.title).where(IngredientModel.id.in_(ingredient_ids))))}
+    return [ingredients[ingredient_id] for ingredient_id in ingredient_ids if ingredient_id in ingredients]
 
 
 @router.get('/{ingredient_id}', response_model=IngredientCreationScheme, status_code=status.HTTP_200_OK,
             summary='Get ingredient by id')
-async def get_ingredient(ingredient_id, db: Session = Depends(get_db),
+async def get_ingredient(ingredient_id, request: Request, response: Response, db: AsyncSession = Depends(get_db),
                          current_user: UserResponseScheme = Depends(get_current_user)):
-    ingredient = db.query(IngredientModel).filter(IngredientModel.id == ingredient_id).first()
-    if ingredient is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Ingredient was not found')
-    return ingredient
+    async def load():
+        ingredient = await db.scalar(select(IngredientModel).where(IngredientModel.id == ingredient_id))
+        if ingredient is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Ingredient was not found')
+        return ingredient
+
+    return await response_cache.respond(request, response, [INGREDIENTS], IngredientCreationScheme, load)
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Header, HTTPException, Response, status
+from typing import Union
+from ..profiling import METRICS_TOKEN, metrics_registry
+
+router = APIRouter(
+    tags=['Monitoring']
+)
+
+
+@router.get('/metrics', summary='Request metrics in the Prometheus format', response_class=Response)
+async def metrics(authorization: Union[str, None] = Header(None)):
+    """
+    Per route request counts, latency histogram, SQL statements and time spent
+    in serialization, token checks and password hashing of this worker process
+    """
+    if METRICS_TOKEN is not None and authorization != f'Bearer {METRICS_TOKEN}':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
+    return Response(metrics_registry.render(), media_type='text/plain; version=0.0.4')
@@ -0,0 +1,59 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, status
+from ..admission import admission_controller
+from ..authentication import get_current_user
+from ..cache import response_cache
+from ..databases import async_engine, engine, pool_status
+from ..hashing import password_hasher
+from ..replicas import replica_router
+from ..schemas.users import UserResponseScheme
+
+router = APIRouter(
+    prefix='/monitoring',
+    tags=['Monitoring']
+)
+
+
+@router.get('/hashing', status_code=status.HTTP_200_OK, summary='Password hashing pool statistics')
+async def hashing_stats(current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Queue depth, concurrency and timings of the bcrypt worker pool
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    return password_hasher.stats()
+
+
+@router.get('/cache', status_code=status.HTTP_200_OK, summary='Response cache statistics')
+async def cache_stats(current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Hits, misses and 304 answers of the response cache
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    return response_cache.stats()
+
+
+@router.get('/pool', status_code=status.HTTP_200_OK, summary='Database connection pool statistics')
+async def pool_stats(current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Connections in use, overflow and checkout waits of this worker's pools
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    pools = {'sync': pool_status(engine)}
+    if async_engine is not None:
+        pools['async'] = pool_status(async_engine)
+    for number, replica in enumerate(replica_router.replicas):
+        pools[f'replica-{number}'] = {**replica.status(), **pool_status(replica.engine)}
+    return {'pid': os.getpid(), 'pools': pools, 'replica_strategy': replica_router.strategy}
+
+
+@router.get('/admission', status_code=status.HTTP_200_OK, summary='Admission control statistics')
+async def admission_stats(current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Requests admitted, rate limited and shed by this worker, with its current concurrency limit
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    return {'pid': os.getpid(), **admission_controller.status()}
@@ -1,12 +1,30 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status, Depends
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..authentication import get_current_user
-from ..dependencies import get_db
-from ..schemas.recipes import CategoryRecipeResponseScheme, CategoryRecipeCreationScheme, RecipeCreationScheme
+from ..deletes import delete_recipe_categories, delete_recipes
+from ..dependencies import get_db, get_loaders
+from ..fast_json import FastJSONResponse
+from ..loaders import RequestLoaders
+from ..pagination import PageParams, fetch_rows_page, id_list, optional_id_list, page_response
+from ..cache import RECIPE_CATEGORIES, response_cache
+from ..bulk import batch_failed, bulk_response, iter_batches, iter_items, parse_batch
+from ..queries import recipe_response
+from ..recipe_index import recipe_index
+from ..similar_recipes import METRICS, similar_recipes
+from ..stats import count_recipes
+from ..text_search import autocomplete_ids, recipe_text_index, recipe_title_index, search_ids
+from ..schemas.bulk import BulkDeleteResponseScheme, BulkItemResultScheme, BulkResponseScheme
+from ..schemas.recipes import CategoryRecipeResponseScheme, CategoryRecipeCreationScheme, RecipeCreationScheme, \
+    RecipeResponseScheme, RecipeSearchResultScheme, RecipeSuggestionScheme, ShoppingListScheme
 from ..schemas.users import UserResponseScheme
-from ..models import CategoryRecipesModel, RecipesModel, RecipesIngredientsModel
+from ..models import CategoryIngredientModel, CategoryRecipesModel, IngredientModel, RecipesModel, \
+    RecipesIngredientsModel
+
+SHOPPING_LIST_MAX_RECIPES = 100
 
 router = APIRouter(
     prefix='/recipes',
@@ -16,76 +34,111 @@ router = APIRouter(
 
 @router.get('/category/list', status_code=status.HTTP_200_OK, response_model=List[CategoryRecipeResponseScheme],
             summary='List of categories of recipes')
-async def recipe_category_list(db: Session = Depends(get_db),
+async def recipe_category_list(request: Request, response: Response, page: PageParams = Depends(),
+                               db: AsyncSession = Depends(get_db),
                                current_user: UserResponseScheme = Depends(get_current_user)):
-    categories = db.query(CategoryRecipesModel).all()
-    return categories
+    async def load():
+        categories, next_cursor = await fetch_rows_page(db, CategoryRecipesModel, CategoryRecipeResponseScheme, page)
+        return page_response(request, response, page, categories, next_cursor, trusted=True)
+
+    return await response_cache.respond(request, response, [RECIPE_CATEGORIES],
+                                        List[CategoryRecipeResponseScheme], load)
+
+
+@router.get('/category/batch', status_code=status.HTTP_200_OK, response_model=List[CategoryRecipeResponseScheme],
+            summary='Get many categories of recipes by id')
+async def recipe_category_batch(request: Request, response: Response, ids: List[int] = Depends(id_list),
+                                loaders: RequestLoaders = Depends(get_loaders),
+                                current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Pass the ids as _?ids=1,2,3_. The categories found are returned in that order
+    """
+    async def load():
+        return FastJSONResponse(await loaders.many(loaders.recipe_categories.load, ids))
+
+    return await response_cache.respond(request, response, [RECIPE_CATEGORIES],
+                                        List[CategoryRecipeResponseScheme], load)
 
 
 @router.get('/category/{category_id}', status_code=status.HTTP_200_OK, response_model=CategoryRecipeResponseScheme,
             summary='Get category by id')
-async def get_recipe_category(category_id: int, db: Session = Depends(get_db),
+async def get_recipe_category(category_id: int, request: Request, response: Response,
+                              db: AsyncSession = Depends(get_db),
                               current_user: UserResponseScheme = Depends(get_current_user)):
-    category = db.query(CategoryRecipesModel).filter(CategoryRecipesModel.id == category_id).first()
-    if category is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
-    return category
+    async def load():
+        category = await db.scalar(select(CategoryRecipesModel).where(CategoryRecipesModel.id == category_id))
+        if category is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
+        return category
+
+    return await response_cache.respond(request, response, [RECIPE_CATEGORIES], CategoryRecipeResponseScheme, load)
 
 
 @router.post('/category/create', status_code=status.HTTP_201_CREATED, response_model=CategoryRecipeResponseScheme,
              summary='Create a category for recipes')
-async def create_recipe_category(category_scheme: CategoryRecipeCreationScheme, db: Session = Depends(get_db),
+async def create_recipe_category(category_scheme: CategoryRecipeCreationScheme, db: AsyncSession = Depends(get_db),
                                  current_user: UserResponseScheme = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    if db.query(CategoryRecipesModel).filter(CategoryRecipesModel.title == category_scheme.title).first():
+    if await db.scalar(select(CategoryRecipesModel).where(CategoryRecipesModel.title == category_scheme.title)):
         raise HTTPException(status_code=status.HTTP_302_FOUND, detail='Category already exists')
     category = CategoryRecipesModel(**category_scheme.dict())
     db.add(category)
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
+    await response_cache.invalidate(RECIPE_CATEGORIES)
     return category
 
 
 @router.put('/category/update/{category_id}', status_code=status.HTTP_200_OK,
             response_model=CategoryRecipeResponseScheme, summary='Update category of recipes')
 async def update_recipe_category(category_id: int, category_scheme: CategoryRecipeCreationScheme,
-                                 db: Session = Depends(get_db),
+                                 db: AsyncSession = Depends(get_db),
                                  current_user: UserResponseScheme = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    category = db.query(CategoryRecipesModel).filter(CategoryRecipesModel.id == category_id).first()
+    category = await db.scalar(select(CategoryRecipesModel).where(CategoryRecipesModel.id == category_id))
     if category is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
-    if db.query(CategoryRecipesModel).filter(CategoryRecipesModel.title == category_scheme.title).first():
+    if await db.scalar(select(CategoryRecipesModel).where(CategoryRecipesModel.title == category_scheme.title)):
         raise HTTPException(status_code=status.HTTP_302_FOUND, detail='Category already exists')
     category.title = category_scheme.title
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
+    await response_cache.invalidate(RECIPE_CATEGORIES)
     return category
 
 
 @router.delete('/category/delete/{category_id}', status_code=status.HTTP_204_NO_CONTENT,
                summary='Delete a category of recipes')
-async def delete_recipe_category(category_id, db: Session = Depends(get_db),
+async def delete_recipe_category(category_id: int, db: AsyncSession = Depends(get_db),
                                  current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Only an empty category can be deleted, its recipes have to be deleted or moved first
+    """
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    category = db.query(CategoryRecipesModel).filter(CategoryRecipesModel.id == category_id).first()
-    if category is None:
+    if await db.scalar(select(RecipesModel.id).where(RecipesModel.category_id == category_id).limit(1)) is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Category still has recipes')
+    if not await delete_recipe_categories(db, CategoryRecipesModel.id == category_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
-    db.delete(category)
-    db.commit()
 
 
-@router.post('/create', status_code=status.HTTP_201_CREATED, summary='Create a recipe',
-             )
-async def create_recipe(recipe_scheme: RecipeCreationScheme, db: Session = Depends(get_db),
+@router.post('/create', status_code=status.HTTP_201_CREATED, response_model=RecipeResponseScheme,
+             summary='Create a recipe')
+async def create_recipe(recipe_scheme: RecipeCreationScheme, db: AsyncSession = Depends(get_db),
                         current_user: UserResponseScheme = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    if db.query(RecipesModel).filter(RecipesModel.title == recipe_scheme.title).first():
+    if await db.scalar(select(RecipesModel).where(RecipesModel.title == recipe_scheme.title)):
         raise HTTPException(status_code=status.HTTP_302_FOUND, detail='Recipe already exists')
+    if await db.get(CategoryRecipesModel, recipe_scheme.category_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Category was not found')
+    # a recipe links every ingredient once, repeats in the request are dropped
+    ingredient_ids = list(dict.fromkeys(value.ingredient_id for value in recipe_scheme.ingredients))
+    if ingredient_ids and len((await db.scalars(select(IngredientModel.id).where(
+            IngredientModel.id.in_(ingredient_ids)))).all()) != len(ingredient_ids):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Ingredient was not found')
     recipe = RecipesModel(
         title=recipe_scheme.title,
         category_id=recipe_scheme.category_id,
@@ -94,47 +147,248 @@ async def create_recipe(recipe_scheme: RecipeCreationScheme, db: Session = Depen
     )
     recipe.owner_id = current_user.id
     db.add(recipe)
-    db.commit()
-    recipe_ingredient = RecipesIngredientsModel()
-    for value in recipe_scheme.ingredients:
-        recipe_ingredient.recipe_id = recipe.id
-        recipe_ingredient.ingredient_id = value.ingredient_id
-        db.add(recipe_ingredient)
-        db.commit()
-        recipe_ingredient = RecipesIngredientsModel()
-    db.refresh(recipe)
-    return recipe
-
-
-@router.get('/list', status_code=status.HTTP_200_OK, summary='List of recipes')
-async def recipes_list(db: Session = Depends(get_db), current_user: UserResponseScheme = Depends(get_current_user)):
-    recipes = db.query(RecipesModel, RecipesIngredientsModel.ingredient_id).join(RecipesIngredientsModel,
-                                                                                 RecipesModel.id == RecipesIngredientsModel.recipe_id).all()
-    return recipes
-
-
-@router.get('/{recipe_id}', status_code=status.HTTP_200_OK, summary='Get recipe by id')
-async def get_recipe(recipe_id: int, db: Session = Depends(get_db),
+    await db.flush()
+    if ingredient_ids:
+        await db.execute(insert(RecipesIngredientsModel),
+                         [{'recipe_id': recipe.id, 'ingredient_id': ingredient_id} for ingredient_id in ingredient_ids])
+    await count_recipes(db, [recipe.id])
+    await db.commit()
+    await db.refresh(recipe)
+    similar_recipes.add_recipe(recipe.id, ingredient_ids)
+    recipe_text_index.add(recipe.id, {'title': recipe.title, 'description': recipe.description})
+    recipe_title_index.add(recipe.id, {'title': recipe.title})
+    return recipe_response(recipe, ingredient_ids)
+
+
+async def import_recipes(db: AsyncSession, batch, owner_id: int, seen_titles: set):
+    """
+    Validates a batch of (index, item) pairs and inserts the valid recipes, then their
+    ingredients with one executemany, committed as a single transaction.
+    Returns a result for every item of the batch.
+    """
+    results, recipes = parse_batch(batch, RecipeCreationScheme, seen_titles)
+    if not recipes:
+        return results
+
+    existing_titles = set((await db.scalars(select(RecipesModel.title).where(
+        RecipesModel.title.in_([recipe_scheme.title for _, recipe_scheme in recipes])))).all())
+    category_ids = set((await db.scalars(select(CategoryRecipesModel.id).where(
+        CategoryRecipesModel.id.in_({recipe_scheme.category_id for _, recipe_scheme in recipes})))).all())
+    ingredient_ids = set((await db.scalars(select(IngredientModel.id).where(IngredientModel.id.in_(
+        {value.ingredient_id for _, recipe_scheme in recipes for value in recipe_scheme.ingredients})))).all())
+    valid = []
+    for index, recipe_scheme in recipes:
+        if recipe_scheme.title in existing_titles:
+            detail = 'Recipe already exists'
+        elif recipe_scheme.category_id not in category_ids:
+            detail = 'Category was not found'
+        elif any(value.ingredient_id not in ingredient_ids for value in recipe_scheme.ingredients):
+            detail = 'Ingredient was not found'
+        else:
+            valid.append((index, recipe_scheme))
+            continue
+        results.append(BulkItemResultScheme(index=index, status='error', detail=detail))
+    if not valid:
+        return results
+
+    # added through the session, the flush returns the id of every recipe: titles are not unique
+    new_recipes = [RecipesModel(title=recipe_scheme.title, category_id=recipe_scheme.category_id,
+                                description=recipe_scheme.description, difficulty=recipe_scheme.difficulty,
+                                owner_id=owner_id)
+                   for _, recipe_scheme in valid]
+    # a recipe links every ingredient once, repeats in the request are dropped
+    recipe_ingredient_ids = [list(dict.fromkeys(value.ingredient_id for value in recipe_scheme.ingredients))
+                             for _, recipe_scheme in valid]
+    try:
+        db.add_all(new_recipes)
+        await db.flush()
+        recipe_ids = [recipe.id for recipe in new_recipes]
+        links = [{'recipe_id': recipe_id, 'ingredient_id': ingredient_id}
+                 for recipe_id, ids in zip(recipe_ids, recipe_ingredient_ids) for ingredient_id in ids]
+        if links:
+            await db.execute(insert(RecipesIngredientsModel), links)
+        await count_recipes(db, recipe_ids)
+        await db.commit()
+    except SQLAlchemyError as error:
+        await db.rollback()
+        results.extend(batch_failed(valid, error))
+        return results
+    for (index, recipe_scheme), recipe_id, ids in zip(valid, recipe_ids, recipe_ingredient_ids):
+        similar_recipes.add_recipe(recipe_id, ids)
+        recipe_text_index.add(recipe_id, {'title': recipe_scheme.title, 'description': recipe_scheme.description})
+        recipe_title_index.add(recipe_id, {'title': recipe_scheme.title})
+        results.append(BulkItemResultScheme(index=index, status='created', id=recipe_id))
+    return results
+
+
+@router.post('/bulk', status_code=status.HTTP_200_OK, response_model=BulkResponseScheme,
+             summary='Create many recipes at once')
+async def create_recipes_bulk(request: Request, db: AsyncSession = Depends(get_db),
+                              current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Accepts a JSON array or an NDJSON stream (_Content-Type: application/x-ndjson_)
+    of recipes in the format of _/recipes/create_. They are inserted in batches,
+    every item gets its own result, so one invalid recipe does not fail the others
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    results = []
+    seen_titles = set()
+    async for batch in iter_batches(iter_items(request)):
+        results.extend(await import_recipes(db, batch, current_user.id, seen_titles))
+    return bulk_response(results)
+
+
+@router.get('/list', status_code=status.HTTP_200_OK, response_model=List[RecipeResponseScheme],
+            summary='List of recipes')
+async def recipes_list(request: Request, response: Response, page: PageParams = Depends(),
+                       db: AsyncSession = Depends(get_db), loaders: RequestLoaders = Depends(get_loaders),
+                       current_user: UserResponseScheme = Depends(get_current_user)):
+    recipes, next_cursor = await fetch_rows_page(db, RecipesModel, RecipeResponseScheme, page)
+    if not page.fields:
+        ingredient_ids = await loaders.recipe_ingredient_ids.load_many([recipe['id'] for recipe in recipes])
+        for recipe, ids in zip(recipes, ingredient_ids):
+            recipe['ingredient_ids'] = ids
+    return page_response(request, response, page, recipes, next_cursor, trusted=True)
+
+
+@router.get('/batch', status_code=status.HTTP_200_OK, response_model=List[RecipeResponseScheme],
+            summary='Get many recipes by id')
+async def recipe_batch(ids: List[int] = Depends(id_list), loaders: RequestLoaders = Depends(get_loaders),
+                       current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Pass the ids as _?ids=1,2,3_. The recipes found are returned in that order, their
+    ingredient ids are fetched together in one more query
+    """
+    return FastJSONResponse(await loaders.many(loaders.recipe, ids))
+
+
+@router.get('/search', status_code=status.HTTP_200_OK, response_model=List[RecipeSearchResultScheme],
+            summary='Find recipes by available ingredients')
+async def search_recipes(q: Optional[str] = Query(None, description='Words of the title or description'),
+                         ingredients: Optional[List[int]] = Query(None, description='Ids of the available ingredients'),
+                         max_missing: int = Query(0, ge=0, description='How many ingredients a recipe may lack'),
+                         limit: int = Query(20, ge=1, le=100),
+                         offset: int = Query(0, ge=0),
+                         db: AsyncSession = Depends(get_db), loaders: RequestLoaders = Depends(get_loaders),
+                         current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Pass either _q_ or _ingredients_:
+    - _q_ finds recipes by title and description, tolerating typos and unfinished words
+    - _ingredients_ (e.g. _?ingredients=1&ingredients=5_) lists the available ingredients.
+    Recipes that can be cooked right away come first, then the ones missing
+    up to _max_missing_ ingredients
+    """
+    if (q is None) == (ingredients is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Pass either q or ingredients')
+    if q is not None:
+        matches = [(recipe_id, {'score': score})
+                   for recipe_id, score in await search_ids(db, RecipesModel, recipe_text_index, q, limit, offset)]
+    else:
+        await recipe_index.ensure_loaded(db)
+        matches = [(recipe_id, {'matched': matched, 'missing_ingredient_ids': missing})
+                   for recipe_id, matched, missing in recipe_index.search(ingredients, max_missing, limit, offset)]
+    recipes = {recipe['id']: recipe for recipe in await loaders.many(loaders.recipe, [
+        recipe_id for recipe_id, _ in matches])}
+    return [RecipeSearchResultScheme(recipe=recipes[recipe_id], **match)
+            for recipe_id, match in matches if recipe_id in recipes]
+
+
+@router.get('/autocomplete', status_code=status.HTTP_200_OK, response_model=List[RecipeSuggestionScheme],
+            summary='Suggest recipe titles')
+async def autocomplete_recipes(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50),
+                               db: AsyncSession = Depends(get_db),
+                               current_user: UserResponseScheme = Depends(get_current_user)):
+    recipe_ids = await autocomplete_ids(db, RecipesModel, recipe_title_index, q, limit)
+    recipes = {recipe.id: recipe for recipe in (await db.execute(
+        select(RecipesModel.id, RecipesModel.title).where(RecipesModel.id.in_(recipe_ids))))}
+    return [recipes[recipe_id] for recipe_id in recipe_ids if recipe_id in recipes]
+
+
+@router.get('/shopping-list', status_code=status.HTTP_200_OK, response_model=ShoppingListScheme,
+            summary='Ingredients needed for many recipes')
+async def shopping_list(recipe_ids: List[int] = Query(..., description='Ids of the planned recipes'),
+                        db: AsyncSession = Depends(get_db),
+                        current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Pass the planned recipes as _?recipe_ids=1&recipe_ids=5_. Returns every ingredient they
+    need once, grouped by category, with the number of the recipes using it.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if len(recipe_ids) > SHOPPING_LIST_MAX_RECIPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f'At most {SHOPPING_LIST_MAX_RECIPES} recipes are allowed')
+    rows = await db.execute(
+        select(CategoryIngredientModel.id, CategoryIngredientModel.title, IngredientModel.id, IngredientModel.title,
+               func.count(RecipesIngredientsModel.recipe_id))
+        .select_from(RecipesIngredientsModel)
+        .join(IngredientModel, IngredientModel.id == RecipesIngredientsModel.ingredient_id)
+        .outerjoin(CategoryIngredientModel, CategoryIngredientModel.id == IngredientModel.category_id)
+        .where(RecipesIngredientsModel.recipe_id.in_(recipe_ids))
+        .group_by(CategoryIngredientModel.id, CategoryIngredientModel.title, IngredientModel.id, IngredientModel.title)
+        .order_by(CategoryIngredientModel.title, IngredientModel.title))
+    categories = {}
+    for category_id, category_title, ingredient_id, ingredient_title, recipe_count in rows:
+        if category_id not in categories:
+            categories[category_id] = {'id': category_id, 'title': category_title, 'ingredients': []}
+        categories[category_id]['ingredients'].append(
+            {'id': ingredient_id, 'title': ingredient_title, 'recipe_count': recipe_count})
+    # built in the shape of ShoppingListScheme, returned without validating it again
+    return FastJSONResponse({'recipe_ids': recipe_ids, 'categories': list(categories.values())})
+
+
+@router.get('/{recipe_id}/similar', status_code=status.HTTP_200_OK, response_model=List[RecipeSearchResultScheme],
+            summary='Recipes with similar ingredients')
+async def similar_recipe_list(recipe_id: int, limit: int = Query(10, ge=1, le=100),
+                              metric: str = Query('jaccard', regex=f'^({"|".join(METRICS)})$'),
+                              db: AsyncSession = Depends(get_db), loaders: RequestLoaders = Depends(get_loaders),
+                              current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    The recipes sharing the most ingredients with the recipe, by _jaccard_ or _cosine_ similarity
+    of their ingredient sets. _matched_ is the number of shared ingredients.
+    """
+    if await loaders.recipe_rows.load(recipe_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Recipe not found')
+    await similar_recipes.ensure_loaded(db)
+    matches = similar_recipes.similar(recipe_id, limit, metric) or []
+    recipes = {recipe['id']: recipe for recipe in await loaders.many(loaders.recipe, [
+        match_id for match_id, _, _ in matches])}
+    return [RecipeSearchResultScheme(recipe=recipes[match_id], score=score, matched=shared)
+            for match_id, score, shared in matches if match_id in recipes]
+
+
+@router.get('/{recipe_id}', status_code=status.HTTP_200_OK, response_model=RecipeResponseScheme,
+            summary='Get recipe by id')
+async def get_recipe(recipe_id: int, loaders: RequestLoaders = Depends(get_loaders),
                      current_user: UserResponseScheme = Depends(get_current_user)):
-    recipe = db.query(RecipesModel, RecipesIngredientsModel.ingredient_id).filter(RecipesModel.id == recipe_id).join(
-        RecipesIngredientsModel,
-        RecipesIngredientsModel.recipe_id == recipe_id).all()
-    if not recipe:
+    recipe = await loaders.recipe(recipe_id)
+    if recipe is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Recipe not found')
-    return recipe
+    return FastJSONResponse(recipe)
+
+
+@router.delete('/delete', status_code=status.HTTP_200_OK, response_model=BulkDeleteResponseScheme,
+               summary='Delete many recipes')
+async def delete_recipes_bulk(ids: Optional[List[int]] = Depends(optional_id_list),
+                              category_id: Optional[int] = Query(None, description='Delete every recipe of it'),
+                              db: AsyncSession = Depends(get_db),
+                              current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Deletes the recipes of _ids_ or all those of _category_id_, with their ingredient links
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    if (ids is None) == (category_id is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Pass either ids or category_id')
+    condition = RecipesModel.id.in_(ids) if ids is not None else RecipesModel.category_id == category_id
+    return {'deleted': len(await delete_recipes(db, condition))}
 
 
 @router.delete('/delete/{recipe_id}', status_code=status.HTTP_204_NO_CONTENT, summary='Delete a recipe')
-async def delete_recipe(recipe_id: int, db: Session = Depends(get_db),
+async def delete_recipe(recipe_id: int, db: AsyncSession = Depends(get_db),
                         current_user: UserResponseScheme = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
-    recipe = db.query(RecipesModel).filter(RecipesModel.id == recipe_id).first()
-    if recipe is None:
+    if not await delete_recipes(db, RecipesModel.id == recipe_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Recipe not found')
-    ingredients = db.query(RecipesIngredientsModel).filter(RecipesIngredientsModel.recipe_id == recipe_id).all()
-    db.delete(recipe)
-    for value in ingredients:
-        db.delete(value)
-    db.commit()
 
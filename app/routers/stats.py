@@ -0,0 +1,82 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..authentication import get_current_user
+from ..dependencies import get_db
+from ..models import CategoryRecipesModel, DifficultyStatsModel, IngredientModel, IngredientStatsModel, \
+    OwnerStatsModel, RecipeCategoryStatsModel
+from ..schemas.stats import CategoryStatsScheme, DifficultyStatsScheme, IngredientStatsScheme, OwnerStatsScheme
+from ..schemas.users import UserResponseScheme
+
+router = APIRouter(
+    prefix='/stats',
+    tags=['Stats']
+)
+
+
+@router.get('/recipes/categories', status_code=status.HTTP_200_OK, response_model=List[CategoryStatsScheme],
+            summary='Recipes per category')
+async def recipes_per_category(limit: int = Query(100, ge=1, le=1000), db: AsyncSession = Depends(get_db),
+                               current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    The categories of recipes holding the most recipes first
+    """
+    rows = await db.execute(
+        select(CategoryRecipesModel.id, CategoryRecipesModel.title, RecipeCategoryStatsModel.recipe_count)
+        .join(CategoryRecipesModel, CategoryRecipesModel.id == RecipeCategoryStatsModel.category_id)
+        .where(RecipeCategoryStatsModel.recipe_count > 0)
+        .order_by(RecipeCategoryStatsModel.recipe_count.desc(), RecipeCategoryStatsModel.category_id)
+        .limit(limit)
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+@router.get('/ingredients/popular', status_code=status.HTTP_200_OK, response_model=List[IngredientStatsScheme],
+            summary='Most used ingredients')
+async def popular_ingredients(limit: int = Query(20, ge=1, le=1000), db: AsyncSession = Depends(get_db),
+                              current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    The ingredients used by the most recipes, with the number of recipes using them
+    """
+    rows = await db.execute(
+        select(IngredientModel.id, IngredientModel.title, IngredientStatsModel.recipe_count)
+        .join(IngredientModel, IngredientModel.id == IngredientStatsModel.ingredient_id)
+        .where(IngredientStatsModel.recipe_count > 0)
+        .order_by(IngredientStatsModel.recipe_count.desc(), IngredientStatsModel.ingredient_id)
+        .limit(limit)
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+@router.get('/recipes/difficulty', status_code=status.HTTP_200_OK, response_model=List[DifficultyStatsScheme],
+            summary='Histogram of the recipe difficulty')
+async def difficulty_histogram(db: AsyncSession = Depends(get_db),
+                               current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    Number of recipes of every difficulty, by difficulty
+    """
+    rows = await db.execute(
+        select(DifficultyStatsModel.difficulty, DifficultyStatsModel.recipe_count)
+        .where(DifficultyStatsModel.recipe_count > 0)
+        .order_by(DifficultyStatsModel.difficulty)
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+@router.get('/recipes/owners', status_code=status.HTTP_200_OK, response_model=List[OwnerStatsScheme],
+            summary='Recipes per owner')
+async def recipes_per_owner(limit: int = Query(20, ge=1, le=1000), db: AsyncSession = Depends(get_db),
+                            current_user: UserResponseScheme = Depends(get_current_user)):
+    """
+    The users owning the most recipes first
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have enough permissions')
+    rows = await db.execute(
+        select(OwnerStatsModel.owner_id, OwnerStatsModel.recipe_count)
+        .where(OwnerStatsModel.recipe_count > 0)
+        .order_by(OwnerStatsModel.recipe_count.desc(), OwnerStatsModel.owner_id)
+        .limit(limit)
+    )
+    return [dict(row._mapping) for row in rows]
@@ -3,13 +3,15 @@ from datetime import timedelta
 
 from fastapi import APIRouter, status, HTTPException, Depends
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 from ..dependencies import get_db
 from ..schemas.users import UserCreationScheme, UserResponseScheme, Token
 from ..models import UserModel
-from ..authentication import get_password_hash, verify_password, ACCESS_TOKEN_EXPIRE_MINUTES, \
-    create_access_token, get_current_user
+from ..authentication import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, \
+    get_current_user, get_current_user_from_db, revoke_user_tokens
+from ..hashing import password_hasher
 
 load_dotenv()
 
@@ -21,13 +23,13 @@ router = APIRouter(
 
 @router.post('/register', status_code=status.HTTP_200_OK, summary='Register User',
              response_model=UserResponseScheme)
-async def register_user(user_scheme: UserCreationScheme, db: Session = Depends(get_db)):
+async def register_user(user_scheme: UserCreationScheme, db: AsyncSession = Depends(get_db)):
     """
     You can register a new user
     """
-    if db.query(UserModel).filter(UserModel.email == user_scheme.email).first():
+    if await db.scalar(select(UserModel).where(UserModel.email == user_scheme.email)):
         raise HTTPException(status_code=status.HTTP_302_FOUND, detail='User already exists')
-    hashed_password = get_password_hash(user_scheme.password)
+    hashed_password = await password_hasher.hash(user_scheme.password)
     user = UserModel(**user_scheme.dict())
     user.password = hashed_password
     if user_scheme.email == os.getenv('ADMIN_EMAIL') and user_scheme.password == os.getenv('ADMIN_PASSWORD'):
@@ -35,27 +37,39 @@ async def register_user(user_scheme: UserCreationScheme, db: Session = Depends(g
     else:
         user.is_admin = False
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.post('/token', response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(UserModel).filter(UserModel.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(UserModel).where(UserModel.email == form_data.username))
+    if user:
+        verified, new_hash = await password_hasher.verify_and_update(form_data.password, user.password)
+    if not user or not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Incorrect email or password',
             headers={"WWW-Authenticate": "Bearer"})
+    if new_hash is not None:
+        # the stored hash uses an outdated bcrypt cost factor
+        user.password = new_hash
+        await db.commit()
     access_token_expires = timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES))
     access_token = create_access_token(
-        data={'sub': user.email}, expires_delta=access_token_expires
+        data={'sub': user.email, 'uid': user.id, 'adm': user.is_admin, 'ver': user.token_version},
+        expires_delta=access_token_expires
     )
     return {'access_token': access_token, 'token_type': 'bearer'}
 
 
 @router.get('/me', response_model=UserResponseScheme)
-async def get_user(current_user: UserResponseScheme = Depends(get_current_user)):
+async def get_user(current_user: UserResponseScheme = Depends(get_current_user_from_db)):
     return current_user
 
+
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT, summary='Revoke all tokens of the user')
+async def logout(db: AsyncSession = Depends(get_db), current_user: UserResponseScheme = Depends(get_current_user)):
+    await revoke_user_tokens(db, current_user.id)
+
@@ -0,0 +1,20 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class BulkItemResultScheme(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BulkResponseScheme(BaseModel):
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    results: List[BulkItemResultScheme] = []
+
+
+class BulkDeleteResponseScheme(BaseModel):
+    deleted: int
@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class ChangeScheme(BaseModel):
+    id: int
+    entity: str
+    entity_id: int
+    operation: str
+    changed_at: datetime
+    data: Optional[dict] = None
+
+
+class ChangeFeedScheme(BaseModel):
+    changes: List[ChangeScheme]
+    next_cursor: int
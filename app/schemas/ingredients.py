@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel
 
@@ -14,6 +15,7 @@ class CategoryIngredientResponseScheme(BaseModel):
     id: int
     title: str
     description: Optional[str] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
@@ -21,7 +23,7 @@ class CategoryIngredientResponseScheme(BaseModel):
 
 class IngredientCreationScheme(BaseModel):
     title: str
-    category_id: int
+    category_id: Optional[int] = None
 
     class Config:
         orm_mode = True
@@ -30,8 +32,23 @@ class IngredientCreationScheme(BaseModel):
 class IngredientResponseScheme(BaseModel):
     id: int
     title: str
-    category_id: int
-    category: CategoryIngredientResponseScheme
+    # both are null once the category is deleted
+    category_id: Optional[int] = None
+    category: Optional[CategoryIngredientResponseScheme] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+class IngredientSearchResultScheme(BaseModel):
+    ingredient: IngredientResponseScheme
+    score: float
+
+
+class IngredientSuggestionScheme(BaseModel):
+    id: int
+    title: str
 
     class Config:
         orm_mode = True
@@ -1,11 +1,12 @@
-from typing import List
-from ..models import RecipesIngredientsModel
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel
 
 
 class CategoryRecipeResponseScheme(BaseModel):
     id: int
     title: str
+    updated_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
@@ -33,3 +34,48 @@ class RecipeCreationScheme(BaseModel):
         orm_mode = True
 
 
+class RecipeResponseScheme(BaseModel):
+    id: int
+    title: str
+    category_id: int
+    description: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    owner_id: int
+    difficulty: int
+    ingredient_ids: List[int]
+
+    class Config:
+        orm_mode = True
+
+
+class RecipeSearchResultScheme(BaseModel):
+    recipe: RecipeResponseScheme
+    score: Optional[float] = None
+    matched: Optional[int] = None
+    missing_ingredient_ids: Optional[List[int]] = None
+
+
+class ShoppingListItemScheme(BaseModel):
+    id: int
+    title: str
+    recipe_count: int
+
+
+class ShoppingListCategoryScheme(BaseModel):
+    id: Optional[int] = None
+    title: Optional[str] = None
+    ingredients: List[ShoppingListItemScheme]
+
+
+class ShoppingListScheme(BaseModel):
+    recipe_ids: List[int]
+    categories: List[ShoppingListCategoryScheme]
+
+
+class RecipeSuggestionScheme(BaseModel):
+    id: int
+    title: str
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+
+
+class CategoryStatsScheme(BaseModel):
+    id: int
+    title: str
+    recipe_count: int
+
+
+class IngredientStatsScheme(BaseModel):
+    id: int
+    title: str
+    recipe_count: int
+
+
+class DifficultyStatsScheme(BaseModel):
+    difficulty: int
+    recipe_count: int
+
+
+class OwnerStatsScheme(BaseModel):
+    owner_id: int
+    recipe_count: int
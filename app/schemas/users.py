@@ -24,3 +24,8 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Union[EmailStr, None] = None
+    id: Union[int, None] = None
+    is_admin: Union[bool, None] = None
+    issued_at: Union[int, None] = None
+    expires_at: Union[int, None] = None
+    version: Union[int, None] = None
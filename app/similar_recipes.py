@@ -0,0 +1,242 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+import numpy
+from scipy import sparse
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from .models import RecipesIngredientsModel
+
+load_dotenv()
+
+# the snapshot is rebuilt from the database when it is older than this, in seconds
+SIMILAR_RECIPES_TTL = int(os.getenv('SIMILAR_RECIPES_TTL', 300))
+# directory of the memory-mapped snapshots, shared by the workers of a host
+SIMILAR_RECIPES_DIR = Path(os.getenv('SIMILAR_RECIPES_DIR', 'similarity'))
+# recipes changed since the snapshot are scored one by one, past this many the snapshot is rebuilt early
+SIMILAR_RECIPES_MAX_CHANGES = int(os.getenv('SIMILAR_RECIPES_MAX_CHANGES', 1000))
+
+METRICS = ('jaccard', 'cosine')
+ARRAYS = ('indptr', 'indices', 'ingredient_indptr', 'ingredient_indices')
+
+
+class Snapshot:
+    """
+    The recipe x ingredient matrix in CSR form, with rows indexed by recipe id (indptr, indices),
+    and its transpose (ingredient_indptr, ingredient_indices) to find the recipes of an ingredient.
+    """
+
+    def __init__(self, arrays, built_at):
+        self.indptr = arrays['indptr']
+        self.indices = arrays['indices']
+        self.ingredient_indptr = arrays['ingredient_indptr']
+        self.ingredient_indices = arrays['ingredient_indices']
+        self.sizes = numpy.diff(self.indptr)
+        self.built_at = built_at
+
+    @classmethod
+    def build(cls, recipe_ids, ingredient_ids, built_at):
+        shape = (int(recipe_ids.max(initial=0)) + 1, int(ingredient_ids.max(initial=0)) + 1)
+        matrix = sparse.csr_matrix((numpy.ones(len(recipe_ids), dtype=numpy.int8), (recipe_ids, ingredient_ids)),
+                                   shape=shape)
+        matrix.sum_duplicates()
+        transposed = matrix.T.tocsr()
+        transposed.sort_indices()
+        return cls({
+            'indptr': matrix.indptr.astype(numpy.int64),
+            'indices': matrix.indices.astype(numpy.int32),
+            'ingredient_indptr': transposed.indptr.astype(numpy.int64),
+            'ingredient_indices': transposed.indices.astype(numpy.int32),
+        }, built_at)
+
+    def ingredients(self, recipe_id):
+        if recipe_id + 1 >= len(self.indptr):
+            return numpy.zeros(0, dtype=numpy.int32)
+        return self.indices[self.indptr[recipe_id]:self.indptr[recipe_id + 1]]
+
+    def save(self, directory: Path):
+        """
+        Writes the arrays into a new version directory and points CURRENT at it. Readers
+        switch atomically, the previous version stays for the workers still mapping it.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        version = f'{int(self.built_at * 1000)}-{os.getpid()}'
+        path = directory / version
+        path.mkdir()
+        for name in ARRAYS:
+            numpy.save(path / f'{name}.npy', getattr(self, name))
+        (path / 'meta.json').write_text(json.dumps({'built_at': self.built_at}))
+        (directory / f'CURRENT.{os.getpid()}').write_text(version)
+        os.replace(directory / f'CURRENT.{os.getpid()}', directory / 'CURRENT')
+        versions = sorted((item for item in directory.iterdir() if item.is_dir()), key=lambda item: item.name)
+        for old in versions[:-2]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: Path):
+        """
+        Maps the current snapshot of `directory` read-only, None when there is none
+        """
+        try:
+            path = directory / (directory / 'CURRENT').read_text().strip()
+            built_at = json.loads((path / 'meta.json').read_text())['built_at']
+            arrays = {name: numpy.load(path / f'{name}.npy', mmap_mode='r') for name in ARRAYS}
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(arrays, built_at)
+
+
+class SimilarRecipes:
+    """
+    Top-k recipes sharing the most ingredients with a recipe, by Jaccard or cosine similarity.
+    Scores come from a snapshot of recipes_ingredient that the workers share through memory-mapped
+    files. Recipes changed by this process since the snapshot are kept aside and override it,
+    writes of other processes show up with the next snapshot after SIMILAR_RECIPES_TTL.
+    """
+
+    def __init__(self, directory=SIMILAR_RECIPES_DIR, ttl=SIMILAR_RECIPES_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self.snapshot = None
+        # recipe id -> (time of the change, ingredient ids or None when deleted)
+        self.changes = {}
+        # last write of this process before it had a snapshot to record the changes against
+        self.written_at = 0.0
+        self._lock = None
+
+    def is_fresh(self, snapshot):
+        return snapshot is not None and time.time() - snapshot.built_at < self.ttl and \
+            len(self.changes) <= SIMILAR_RECIPES_MAX_CHANGES
+
+    async def ensure_loaded(self, db):
+        if self.is_fresh(self.snapshot):
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        if self._lock.locked() and self.snapshot is not None:
+            # another request is refreshing it, the current one is still good enough
+            return
+        async with self._lock:
+            if self.is_fresh(self.snapshot):
+                return
+            snapshot = await run_in_threadpool(Snapshot.load, self.directory)
+            if not self.is_fresh(snapshot) or snapshot.built_at < self.written_at or \
+                    (self.snapshot is not None and snapshot.built_at <= self.snapshot.built_at):
+                built_at = time.time()
+                rows = (await db.execute(
+                    select(RecipesIngredientsModel.recipe_id, RecipesIngredientsModel.ingredient_id))).all()
+                snapshot = await run_in_threadpool(self._build_and_save, rows, built_at)
+            self.snapshot = snapshot
+            self.changes = {recipe_id: change for recipe_id, change in self.changes.items()
+                            if change[0] >= snapshot.built_at}
+
+    def _build_and_save(self, rows, built_at):
+        recipe_ids = numpy.fromiter((row[0] for row in rows), dtype=numpy.int64, count=len(rows))
+        ingredient_ids = numpy.fromiter((row[1] for row in rows), dtype=numpy.int64, count=len(rows))
+        snapshot = Snapshot.build(recipe_ids, ingredient_ids, built_at)
+        try:
+            snapshot.save(self.directory)
+        except OSError:
+            # the snapshot still serves this process
+            pass
+        return snapshot
+
+    def add_recipe(self, recipe_id, ingredient_ids):
+        if self.snapshot is None:
+            self.written_at = time.time()
+        else:
+            self.changes[recipe_id] = (time.time(), frozenset(ingredient_ids))
+
+    def remove_recipe(self, recipe_id):
+        if self.snapshot is None:
+            self.written_at = time.time()
+        else:
+            self.changes[recipe_id] = (time.time(), None)
+
+    def remove_ingredients(self, recipe_ids, ingredient_ids):
+        """
+        `recipe_ids` lost the deleted `ingredient_ids`
+        """
+        if self.snapshot is None:
+            self.written_at = time.time()
+            return
+        removed = frozenset(ingredient_ids)
+        changed_at = time.time()
+        for recipe_id in recipe_ids:
+            self.changes[recipe_id] = (changed_at, (self.ingredients(recipe_id) or frozenset()) - removed)
+
+    def ingredients(self, recipe_id):
+        if recipe_id in self.changes:
+            return self.changes[recipe_id][1]
+        return frozenset(self.snapshot.ingredients(recipe_id).tolist()) or None
+
+    def similar(self, recipe_id, limit=10, metric='jaccard'):
+        """
+        Returns (recipe_id, score, shared ingredients) of the `limit` most similar recipes,
+        or None when the recipe has no ingredients
+        """
+        ingredients = self.ingredients(recipe_id)
+        if not ingredients:
+            return None
+        snapshot = self.snapshot
+        size = len(ingredients)
+        # shared ingredients of every recipe of the snapshot: the recipes of each ingredient, counted
+        postings = [snapshot.ingredient_indices[snapshot.ingredient_indptr[ingredient_id]:
+                                                snapshot.ingredient_indptr[ingredient_id + 1]]
+                    for ingredient_id in ingredients if ingredient_id + 1 < len(snapshot.ingredient_indptr)]
+        shared = numpy.bincount(numpy.concatenate(postings or [numpy.zeros(0, dtype=numpy.int32)]),
+                                minlength=len(snapshot.sizes))
+        overridden = [other_id for other_id in list(self.changes) + [recipe_id] if other_id < len(shared)]
+        shared[overridden] = 0
+        candidates = self._candidates(shared, size, limit, metric)
+        candidate_shared = shared[candidates].astype(numpy.float64)
+        candidate_sizes = snapshot.sizes[candidates]
+        # recipes changed since the snapshot
+        extra = [(other_id, len(ingredients & other), len(other)) for other_id, (_, other) in self.changes.items()
+                 if other and other_id != recipe_id and not ingredients.isdisjoint(other)]
+        if extra:
+            extra_ids, extra_shared, extra_sizes = (numpy.array(values) for values in zip(*extra))
+            candidates = numpy.concatenate([candidates, extra_ids])
+            candidate_shared = numpy.concatenate([candidate_shared, extra_shared])
+            candidate_sizes = numpy.concatenate([candidate_sizes, extra_sizes])
+        if not len(candidates):
+            return []
+        scores = score(candidate_shared, candidate_sizes, size, metric)
+        if len(candidates) > limit:
+            # every recipe tied with the last place is kept, the recipe ids break the tie below
+            top = numpy.flatnonzero(scores >= numpy.partition(scores, len(scores) - limit)[len(scores) - limit])
+        else:
+            top = numpy.arange(len(candidates))
+        top = top[numpy.lexsort((candidates[top], -scores[top]))][:limit]
+        return [(int(candidates[index]), round(float(scores[index]), 6), int(candidate_shared[index])) for index in top]
+
+    def _candidates(self, shared, size, limit, metric):
+        """
+        The recipes that can make the top `limit`. Common ingredients give most recipes a shared
+        one, so the recipes sharing the most are scored first: the `limit`-th best score among them
+        rules out those sharing too few to reach it (s shared score at most score(s, s, size)).
+        """
+        counts = numpy.bincount(shared, minlength=size + 1)
+        at_least = numpy.cumsum(counts[::-1])[::-1]
+        best = numpy.flatnonzero(at_least[1:] >= limit)
+        if not len(best):
+            return numpy.flatnonzero(shared)
+        first = numpy.flatnonzero(shared >= best[-1] + 1)
+        scores = score(shared[first].astype(numpy.float64), self.snapshot.sizes[first], size, metric)
+        threshold = numpy.partition(scores, len(scores) - limit)[len(scores) - limit]
+        levels = numpy.arange(1, size + 1, dtype=numpy.float64)
+        reachable = numpy.flatnonzero(score(levels, levels, size, metric) >= threshold)
+        return numpy.flatnonzero(shared >= reachable[0] + 1)
+
+
+def score(shared, sizes, size, metric):
+    if metric == 'cosine':
+        return shared / numpy.sqrt(sizes * size)
+    return shared / (sizes + size - shared)
+
+
+similar_recipes = SimilarRecipes()
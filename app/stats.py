@@ -0,0 +1,34 @@
+from sqlalchemy import func, select
+from .bulk import UPSERT_INSERTS
+from .models import DifficultyStatsModel, IngredientStatsModel, OwnerStatsModel, RecipeCategoryStatsModel, \
+    RecipesIngredientsModel, RecipesModel
+
+# aggregate table, its key column, and the column of the recipes it is grouped by
+RECIPE_STATS = (
+    (RecipeCategoryStatsModel, 'category_id', RecipesModel.category_id),
+    (DifficultyStatsModel, 'difficulty', RecipesModel.difficulty),
+    (OwnerStatsModel, 'owner_id', RecipesModel.owner_id),
+)
+
+
+def add_counts(db, model, key, counts_query):
+    """
+    INSERT ... SELECT of (key, count) rows that adds the counts to those already stored
+    """
+    statement = UPSERT_INSERTS[db.bind.dialect.name](model).from_select([key, 'recipe_count'], counts_query)
+    return statement.on_conflict_do_update(
+        index_elements=[key], set_={'recipe_count': model.recipe_count + statement.excluded.recipe_count})
+
+
+async def count_recipes(db, recipe_ids, sign=1):
+    """
+    Adds the recipes of `recipe_ids` (ids or a select of them) to the aggregates, or takes them
+    away with sign=-1: one statement per table, grouped in the database. Runs in the caller's
+    transaction, after the recipes and their ingredients are inserted or before they are deleted.
+    """
+    for model, key, column in RECIPE_STATS:
+        await db.execute(add_counts(db, model, key, select(column, func.count() * sign).where(
+            RecipesModel.id.in_(recipe_ids)).group_by(column)))
+    await db.execute(add_counts(db, IngredientStatsModel, 'ingredient_id', select(
+        RecipesIngredientsModel.ingredient_id, func.count() * sign).where(
+        RecipesIngredientsModel.recipe_id.in_(recipe_ids)).group_by(RecipesIngredientsModel.ingredient_id)))
@@ -0,0 +1,205 @@
+import asyncio
+import bisect
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from sqlalchemy import desc, func, literal_column, or_, select
+from dotenv import load_dotenv
+from .models import IngredientModel, RecipesModel
+
+load_dotenv()
+
+# auto: Postgres full-text search on postgresql, the in-process index elsewhere
+TEXT_SEARCH_BACKEND = os.getenv('TEXT_SEARCH_BACKEND', 'auto')
+TEXT_INDEX_TTL = int(os.getenv('TEXT_INDEX_TTL', 300))
+FUZZY_THRESHOLD = float(os.getenv('FUZZY_THRESHOLD', 0.3))
+# the text search configuration baked into the generated search_vector columns, see migrations/versions
+TEXT_SEARCH_CONFIG = 'simple'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class TextIndex:
+    """
+    In-process full-text index used where Postgres is not available (e.g. SQLite).
+    Every query term is matched exactly, as a prefix of a token or by trigram
+    similarity like pg_trgm, in that order of preference. Documents have to match all terms.
+    """
+
+    def __init__(self, model, fields, ttl=TEXT_INDEX_TTL):
+        # fields: {column name: weight}
+        self.model = model
+        self.fields = fields
+        self.ttl = ttl
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.tokens = []
+        self.trigrams = defaultdict(set)
+        self.loaded_at = None
+        self._lock = None
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    async def ensure_loaded(self, db):
+        if self.is_loaded and time.monotonic() - self.loaded_at < self.ttl:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.is_loaded and time.monotonic() - self.loaded_at < self.ttl:
+                return
+            rows = await db.execute(select(self.model.id, *[getattr(self.model, field) for field in self.fields]))
+            self.postings, self.documents, self.tokens, self.trigrams = defaultdict(dict), {}, [], defaultdict(set)
+            for row in rows:
+                self._add(row[0], dict(zip(self.fields, row[1:])))
+            self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def add(self, doc_id, values):
+        if self.is_loaded:
+            self.remove(doc_id)
+            self._add(doc_id, values)
+
+    def _add(self, doc_id, values):
+        weights = Counter()
+        for field, weight in self.fields.items():
+            for token in tokenize(values.get(field)):
+                weights[token] += weight
+        self.documents[doc_id] = weights
+        for token, weight in weights.items():
+            if token not in self.postings:
+                bisect.insort(self.tokens, token)
+                for trigram in trigrams(token):
+                    self.trigrams[trigram].add(token)
+            self.postings[token][doc_id] = weight
+
+    def remove(self, doc_id):
+        for token in self.documents.pop(doc_id, ()):
+            documents = self.postings.get(token)
+            if documents is None:
+                continue
+            documents.pop(doc_id, None)
+            if not documents:
+                del self.postings[token]
+                del self.tokens[bisect.bisect_left(self.tokens, token)]
+                for trigram in trigrams(token):
+                    self.trigrams[trigram].discard(token)
+
+    def prefixed(self, prefix):
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + '\uffff')
+        return self.tokens[start:min(end, start + MAX_PREFIX_EXPANSIONS)]
+
+    def similar(self, term):
+        term_trigrams = trigrams(term)
+        shared = Counter()
+        for trigram in term_trigrams:
+            shared.update(self.trigrams.get(trigram, ()))
+        similarities = {token: count / (len(term_trigrams) + len(trigrams(token)) - count)
+                        for token, count in shared.items()}
+        return {token: similarity for token, similarity in similarities.items() if similarity >= FUZZY_THRESHOLD}
+
+    def expand(self, term, fuzzy=True):
+        """
+        Tokens a query term stands for, with how well each of them matches
+        """
+        matches = {}
+        if fuzzy:
+            matches.update((token, similarity * 0.6) for token, similarity in self.similar(term).items())
+        matches.update((token, 0.8) for token in self.prefixed(term))
+        if term in self.postings:
+            matches[term] = 1.0
+        return matches
+
+    def search(self, query, limit=20, offset=0, fuzzy=True):
+        """
+        Returns [(doc_id, score)] ordered by score, the best first
+        """
+        scores = None
+        for term in dict.fromkeys(tokenize(query)):
+            term_scores = defaultdict(float)
+            for token, quality in self.expand(term, fuzzy).items():
+                documents = self.postings[token]
+                idf = math.log(1 + len(self.documents) / len(documents))
+                for doc_id, weight in documents.items():
+                    term_scores[doc_id] = max(term_scores[doc_id], quality * weight * idf)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {doc_id: score + term_scores[doc_id] for doc_id, score in scores.items()
+                          if doc_id in term_scores}
+            if not scores:
+                return []
+        ranked = sorted((scores or {}).items(), key=lambda item: (-item[1], item[0]))
+        return ranked[offset:offset + limit]
+
+
+recipe_text_index = TextIndex(RecipesModel, {'title': 2, 'description': 1})
+recipe_title_index = TextIndex(RecipesModel, {'title': 1})
+ingredient_text_index = TextIndex(IngredientModel, {'title': 1})
+
+
+def use_postgres(db):
+    if TEXT_SEARCH_BACKEND == 'auto':
+        return db.bind.dialect.name == 'postgresql'
+    return TEXT_SEARCH_BACKEND == 'postgres'
+
+
+def tsquery(query):
+    """
+    A prefix query matching all terms, e.g. 'tom soup' -> 'tom:* & soup:*'
+    """
+    return ' & '.join(f'{term}:*' for term in tokenize(query))
+
+
+async def search_ids(db, model, index, query, limit=20, offset=0):
+    """
+    Ranked [(id, score)] of `model` rows matching `query`, through Postgres full-text and
+    trigram search (generated search_vector columns, pg_trgm) or the in-process `index`
+    """
+    if not tokenize(query):
+        return []
+    if not use_postgres(db):
+        await index.ensure_loaded(db)
+        return index.search(query, limit=limit, offset=offset)
+    search_vector = literal_column(f'{model.__tablename__}.search_vector')
+    ts_query = func.to_tsquery(TEXT_SEARCH_CONFIG, tsquery(query))
+    score = func.ts_rank(search_vector, ts_query) + func.similarity(model.title, query)
+    rows = await db.execute(
+        select(model.id, score.label('score')).where(or_(
+            search_vector.op('@@')(ts_query), model.title.op('%')(query)
+        )).order_by(desc('score'), model.id).limit(limit).offset(offset))
+    return [(row.id, row.score) for row in rows]
+
+
+async def autocomplete_ids(db, model, index, query, limit=10):
+    """
+    Ids of `model` rows whose title has words starting with the terms of `query`, best matches first
+    """
+    if not tokenize(query):
+        return []
+    if not use_postgres(db):
+        await index.ensure_loaded(db)
+        return [doc_id for doc_id, _ in index.search(query, limit=limit, fuzzy=False)]
+    prefix = query.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    # both patterns are served by the trigram index on title
+    rows = await db.scalars(
+        select(model.id).where(or_(model.title.ilike(f'{prefix}%'), model.title.ilike(f'% {prefix}%')))
+        .order_by(func.length(model.title), model.id).limit(limit))
+    return rows.all()
@@ -0,0 +1,10 @@
+"""
+Performance benchmarks of the API, run in-process against a seeded database:
+
+    python -m benchmarks seed --recipes 100000
+    python -m benchmarks run --requests 200 --output results/HEAD.json
+    python -m benchmarks replay requests.log.jsonl --output results/replay.json
+    python -m benchmarks compare results/main.json results/HEAD.json
+
+The database is --database-url (sqlite:///./benchmark.db by default), never the one of .env.
+"""
@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import fnmatch
+import os
+import sys
+from .dataset import ADMIN_EMAIL, DatasetConfig
+
+DEFAULT_DATABASE_URL = 'sqlite:///./benchmark.db'
+
+
+def configure_environment(args):
+    """
+    The app reads its settings on import, so they are set before anything of it is imported
+    """
+    os.environ['SQLALCHEMY_DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('ALGORITHM', 'HS256')
+    os.environ.setdefault('ACCESS_TOKEN_EXPIRE_MINUTES', '60')
+    # the scenarios measure the endpoints, one client sending as fast as it can would only measure the 429s
+    os.environ.setdefault('ADMISSION_BACKEND', 'none')
+
+
+def dataset_config(args):
+    return DatasetConfig(categories=args.categories, ingredients=args.ingredients, recipes=args.recipes,
+                         ingredients_per_recipe=args.ingredients_per_recipe, users=args.users, seed=args.seed)
+
+
+def prepare_database(args):
+    """
+    Migrates the database and seeds it unless it already has a catalogue
+    """
+    from sqlalchemy import func, select
+    from app.databases import engine
+    from app.models import RecipesModel
+    from .dataset import create_schema, seed
+
+    create_schema()
+    with engine.connect() as connection:
+        if connection.scalar(select(func.count()).select_from(RecipesModel)):
+            return None
+    return seed(engine, dataset_config(args))
+
+
+def load_context(args):
+    from sqlalchemy import select
+    from app.authentication import create_access_token
+    from app.databases import engine
+    from app.models import CategoryIngredientModel, CategoryRecipesModel, IngredientModel, RecipesModel, UserModel
+    from app.text_search import tokenize
+    from .scenarios import BenchmarkContext
+
+    with engine.connect() as connection:
+        ids = {
+            'ingredient_categories': connection.scalars(select(CategoryIngredientModel.id)).all(),
+            'recipe_categories': connection.scalars(select(CategoryRecipesModel.id)).all(),
+            'ingredients': connection.scalars(select(IngredientModel.id).order_by(IngredientModel.id)).all(),
+            'recipes': connection.scalars(select(RecipesModel.id)).all(),
+        }
+        words = sorted({token for title in connection.scalars(select(IngredientModel.title).limit(1000))
+                        for token in tokenize(title) if len(token) > 3})
+        admin = connection.execute(select(UserModel.id, UserModel.email).where(UserModel.email == ADMIN_EMAIL)).one()
+        user = connection.execute(select(UserModel.id, UserModel.email).where(UserModel.is_admin.is_(False))
+                                  .order_by(UserModel.id).limit(1)).one()
+    admin_token = create_access_token({'sub': admin.email, 'uid': admin.id, 'adm': True})
+    user_token = create_access_token({'sub': user.email, 'uid': user.id, 'adm': False})
+    return BenchmarkContext(ids, words, admin_token, user_token, seed=args.seed)
+
+
+async def drive(args, action):
+    import httpx
+    from app.main import app
+
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(app=app, base_url='http://benchmark') as client:
+            return await action(client)
+    finally:
+        await app.router.shutdown()
+
+
+def selected_scenarios(patterns):
+    from .scenarios import SCENARIOS
+    if not patterns:
+        return SCENARIOS
+    return [scenario for scenario in SCENARIOS if any(fnmatch.fnmatch(scenario.name, pattern) for pattern in patterns)]
+
+
+def command_seed(args):
+    configure_environment(args)
+    counts = prepare_database(args)
+    print(f'Seeded {counts}' if counts else 'The database already has a catalogue, nothing seeded')
+
+
+def command_run(args):
+    configure_environment(args)
+    from .report import metadata, print_results, save
+    from .runner import Runner
+
+    prepare_database(args)
+    context = load_context(args)
+    scenarios = selected_scenarios(args.scenario)
+    runner = Runner(None, concurrency=args.concurrency, memory_requests=args.memory_requests)
+
+    async def action(client):
+        runner.client = client
+        return await runner.run_scenarios(context, scenarios, args.requests, args.warmup)
+
+    results = asyncio.run(drive(args, action))
+    print_results(results)
+    if args.output:
+        save(args.output, metadata(mode='scenarios', dataset=dataset_config(args).as_dict(),
+                                   database=args.database_url.split(':', 1)[0], requests=args.requests,
+                                   warmup=args.warmup, concurrency=args.concurrency), results)
+
+
+def command_replay(args):
+    configure_environment(args)
+    from .report import metadata, print_results, save
+    from .runner import Runner, load_log
+
+    prepare_database(args)
+    context = load_context(args)
+    entries = load_log(args.log)
+    runner = Runner(None, concurrency=args.concurrency)
+
+    async def action(client):
+        runner.client = client
+        return await runner.replay(entries, {'admin': context.admin, 'user': context.user})
+
+    results = asyncio.run(drive(args, action))
+    print_results(results)
+    if args.output:
+        save(args.output, metadata(mode='replay', log=args.log, database=args.database_url.split(':', 1)[0],
+                                   concurrency=args.concurrency), results)
+
+
+def command_compare(args):
+    from .report import compare, load
+
+    baseline, current = load(args.baseline), load(args.current)
+    regressions = compare(baseline, current, args.threshold)
+    print(f'{baseline["meta"].get("commit")} -> {current["meta"].get("commit")}: '
+          f'{len(regressions) or "no"} regression(s) over {args.threshold}%')
+    for regression in regressions:
+        print(f'    {regression["scenario"]} {regression["metric"]}: '
+              f'{regression["baseline"]} -> {regression["current"]} ({regression["change_percent"]:+}%)')
+    return 1 if regressions else 0
+
+
+def add_database_arguments(parser):
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL, help='database to seed and benchmark')
+    defaults = DatasetConfig()
+    dataset = parser.add_argument_group('dataset', 'size of the catalogue seeded into an empty database')
+    dataset.add_argument('--categories', type=int, default=defaults.categories)
+    dataset.add_argument('--ingredients', type=int, default=defaults.ingredients)
+    dataset.add_argument('--recipes', type=int, default=defaults.recipes)
+    dataset.add_argument('--ingredients-per-recipe', type=int, default=defaults.ingredients_per_recipe)
+    dataset.add_argument('--users', type=int, default=defaults.users)
+    dataset.add_argument('--seed', type=int, default=defaults.seed, help='random seed of the data and requests')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks the API in-process')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed = commands.add_parser('seed', help='migrate and seed the benchmark database')
+    add_database_arguments(seed)
+    seed.set_defaults(handler=command_seed)
+
+    run = commands.add_parser('run', help='drive every endpoint and report the timings')
+    add_database_arguments(run)
+    run.add_argument('--requests', type=int, default=100, help='timed requests per scenario')
+    run.add_argument('--warmup', type=int, default=5, help='untimed requests per scenario')
+    run.add_argument('--concurrency', type=int, default=1, help='requests in flight at once')
+    run.add_argument('--memory-requests', type=int, default=10,
+                     help='requests per scenario measured under tracemalloc after the timed ones')
+    run.add_argument('--scenario', action='append', help='only the matching scenarios, e.g. "recipes.*"')
+    run.add_argument('--output', help='where to save the results as JSON')
+    run.set_defaults(handler=command_run)
+
+    replay = commands.add_parser('replay', help='replay a recorded request log (JSON lines)')
+    add_database_arguments(replay)
+    replay.add_argument('log')
+    replay.add_argument('--concurrency', type=int, default=1)
+    replay.add_argument('--output', help='where to save the results as JSON')
+    replay.set_defaults(handler=command_replay)
+
+    compare = commands.add_parser('compare', help='compare two saved results, fails on regressions')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=10.0, help='allowed change in percent')
+    compare.set_defaults(handler=command_compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
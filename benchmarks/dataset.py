@@ -0,0 +1,119 @@
+import random
+from pathlib import Path
+from sqlalchemy import func, insert, select
+
+SYLLABLES = ['ba', 'ca', 'da', 'fe', 'gi', 'ko', 'la', 'mi', 'no', 'pa', 'ri', 'sa', 'to', 'vi', 'zu',
+             'ber', 'lin', 'mon', 'ran', 'sel', 'tor', 'ven']
+DISHES = ['soup', 'salad', 'stew', 'pie', 'curry', 'risotto', 'pasta', 'cake', 'bowl', 'roast', 'omelette']
+STYLES = ['spicy', 'creamy', 'smoky', 'fresh', 'rustic', 'crispy', 'quick', 'classic', 'baked', 'grilled']
+
+BENCHMARK_PASSWORD = 'benchmark'
+ADMIN_EMAIL = 'admin@benchmark.example.com'
+CHUNK_SIZE = 5000
+
+
+class DatasetConfig:
+    """
+    Size of the synthetic catalogue, the same seed always produces the same data
+    """
+
+    def __init__(self, categories=20, ingredients=2000, recipes=10000, ingredients_per_recipe=8, users=100,
+                 seed=42):
+        self.categories = categories
+        self.ingredients = ingredients
+        self.recipes = recipes
+        self.ingredients_per_recipe = ingredients_per_recipe
+        self.users = users
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def word(rng, syllables=3):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, syllables)))
+
+
+def unique_titles(rng, count, make):
+    titles = set()
+    while len(titles) < count:
+        title = make()
+        if title in titles:
+            title = f'{title} {len(titles)}'
+        titles.add(title)
+    return sorted(titles)
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def create_schema():
+    """
+    Brings the database of SQLALCHEMY_DATABASE_URL to the latest migration
+    """
+    from alembic import command
+    from alembic.config import Config
+    root = Path(__file__).resolve().parents[1]
+    config = Config(str(root / 'alembic.ini'))
+    config.set_main_option('script_location', str(root / 'migrations'))
+    command.upgrade(config, 'head')
+
+
+def seed(engine, config: DatasetConfig):
+    """
+    Fills an empty database with the catalogue described by `config`
+    """
+    from app.hashing import get_password_hash
+    from app.models import CategoryIngredientModel, CategoryRecipesModel, IngredientModel, RecipesIngredientsModel, \
+        RecipesModel, UserModel
+
+    rng = random.Random(config.seed)
+    with engine.begin() as connection:
+        if connection.scalar(select(func.count()).select_from(RecipesModel)):
+            raise RuntimeError('The benchmark database already has recipes, seed an empty one')
+
+        password = get_password_hash(BENCHMARK_PASSWORD)
+        users = [{'email': ADMIN_EMAIL, 'password': password, 'is_admin': True}]
+        users += [{'email': f'user{number}@benchmark.example.com', 'password': password, 'is_admin': False}
+                  for number in range(1, config.users)]
+        connection.execute(insert(UserModel), users)
+
+        connection.execute(insert(CategoryIngredientModel), [
+            {'title': title.capitalize(), 'description': f'Ingredients of the {title} group'}
+            for title in unique_titles(rng, config.categories, lambda: word(rng, 2))])
+        connection.execute(insert(CategoryRecipesModel), [
+            {'title': title.capitalize()} for title in unique_titles(rng, config.categories, lambda: word(rng, 2))])
+        ingredient_category_ids = connection.scalars(select(CategoryIngredientModel.id)).all()
+        recipe_category_ids = connection.scalars(select(CategoryRecipesModel.id)).all()
+        user_ids = connection.scalars(select(UserModel.id)).all()
+
+        for rows in chunks([{'title': title, 'category_id': rng.choice(ingredient_category_ids)}
+                            for title in unique_titles(rng, config.ingredients, lambda: word(rng))]):
+            connection.execute(insert(IngredientModel), rows)
+        ingredients = connection.execute(select(IngredientModel.id, IngredientModel.title)).all()
+        ingredient_ids = [ingredient.id for ingredient in ingredients]
+        # a few ingredients are in most recipes (salt, oil, ...), like in real catalogues
+        weights = [1 / (rank + 1) for rank in range(len(ingredient_ids))]
+
+        titles = unique_titles(rng, config.recipes, lambda: f'{rng.choice(STYLES)} {rng.choice(ingredients).title} '
+                                                            f'{rng.choice(DISHES)}'.capitalize())
+        for rows in chunks([{
+            'title': title,
+            'category_id': rng.choice(recipe_category_ids),
+            'description': ' '.join(rng.choice(STYLES + DISHES) if rng.random() < 0.3 else word(rng)
+                                    for _ in range(rng.randint(10, 40))),
+            'owner_id': rng.choice(user_ids),
+            'difficulty': rng.randint(1, 5),
+        } for title in titles]):
+            connection.execute(insert(RecipesModel), rows)
+
+        links = []
+        for recipe_id in connection.scalars(select(RecipesModel.id)):
+            count = max(1, min(len(ingredient_ids), round(rng.gauss(config.ingredients_per_recipe, 2))))
+            chosen = set(rng.choices(ingredient_ids, weights=weights, k=count))
+            links += [{'recipe_id': recipe_id, 'ingredient_id': ingredient_id} for ingredient_id in sorted(chosen)]
+        for rows in chunks(links):
+            connection.execute(insert(RecipesIngredientsModel), rows)
+    return {'users': len(users), 'ingredients': len(ingredient_ids), 'recipes': len(titles), 'links': len(links)}
@@ -0,0 +1,83 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+# metric -> whether a higher value is better
+COMPARED_METRICS = {
+    'throughput_rps': True,
+    'latency_ms.p50': False,
+    'latency_ms.p95': False,
+    'latency_ms.p99': False,
+    'queries_per_request': False,
+    'allocated_kib_per_request': False,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parents[1], check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(**extra):
+    return {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        **extra,
+    }
+
+
+def save(path, meta, results):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'meta': meta, 'results': results}, indent=2))
+
+
+def load(path):
+    return json.loads(Path(path).read_text())
+
+
+def metric(result, name):
+    for key in name.split('.'):
+        result = result.get(key) if result else None
+    return result
+
+
+def print_results(results):
+    print(f'{"scenario":<32} {"req":>6} {"err":>5} {"rps":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+          f'{"queries":>8} {"KiB":>8}')
+    for name, result in results.items():
+        latency = result['latency_ms']
+        print(f'{name:<32} {result["requests"]:>6} {result["errors"]:>5} {format_value(result["throughput_rps"]):>9} '
+              f'{format_value(latency["p50"]):>9} {format_value(latency["p95"]):>9} {format_value(latency["p99"]):>9} '
+              f'{format_value(result["queries_per_request"]):>8} {format_value(result["allocated_kib_per_request"]):>8}')
+
+
+def format_value(value):
+    return '-' if value is None else f'{value:g}'
+
+
+def compare(baseline, current, threshold=10.0):
+    """
+    Lists the metrics of `current` that are more than `threshold` percent worse than in `baseline`
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        for metric_name, higher_is_better in COMPARED_METRICS.items():
+            old, new = metric(previous, metric_name), metric(result, metric_name)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append({'scenario': name, 'metric': metric_name, 'baseline': old, 'current': new,
+                                    'change_percent': round(change, 1)})
+    return regressions
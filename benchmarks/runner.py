@@ -0,0 +1,180 @@
+import asyncio
+import json
+import re
+import time
+import tracemalloc
+from .scenarios import CREATES, created_ids
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(fraction * len(values) + 0.5) - 1))]
+
+
+def summarize(latencies, statuses, errors, elapsed, queries, allocations):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'status_codes': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+        'throughput_rps': round(count / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / count * 1000, 3) if count else None,
+            'p50': round(percentile(latencies, 0.50) * 1000, 3) if count else None,
+            'p95': round(percentile(latencies, 0.95) * 1000, 3) if count else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 3) if count else None,
+            'max': round(latencies[-1] * 1000, 3) if count else None,
+        },
+        'queries_per_request': round(queries / count, 2) if count else None,
+        'allocated_kib_per_request': round(sum(allocations) / len(allocations) / 1024, 1) if allocations else None,
+    }
+
+
+class Runner:
+    """
+    Sends requests straight to the ASGI app (no sockets, no server) and measures them.
+    Every batch is timed first, then a few more requests run under tracemalloc,
+    which would otherwise slow the timed ones down.
+    """
+
+    def __init__(self, client, concurrency=1, memory_requests=10):
+        self.client = client
+        self.concurrency = concurrency
+        self.memory_requests = memory_requests
+
+    async def send(self, request):
+        started_at = time.perf_counter()
+        response = await self.client.request(**request)
+        return response, time.perf_counter() - started_at
+
+    async def measure(self, requests, timed, expected_status=None, on_response=None):
+        """
+        Sends the first `timed` of `requests`, `concurrency` of them at a time,
+        and the following ones one by one to measure their allocations
+        """
+        from app.instrumentation import QueryCounter
+
+        latencies, statuses = [], []
+        errors = 0
+        pending = iter(requests[:timed])
+
+        async def worker():
+            nonlocal errors
+            for request in pending:
+                response, latency = await self.send(request)
+                latencies.append(latency)
+                statuses.append(response.status_code)
+                if response.status_code >= 500 or \
+                        (expected_status is not None and response.status_code != expected_status):
+                    errors += 1
+                elif on_response is not None:
+                    on_response(response)
+
+        with QueryCounter() as queries:
+            started_at = time.perf_counter()
+            await asyncio.gather(*[worker() for _ in range(self.concurrency)])
+            elapsed = time.perf_counter() - started_at
+
+        allocations = []
+        tracemalloc.start()
+        try:
+            for request in requests[timed:timed + self.memory_requests]:
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                response, _ = await self.send(request)
+                if on_response is not None and response.status_code < 300:
+                    on_response(response)
+                allocations.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+        return summarize(latencies, statuses, errors, elapsed, queries.count, allocations)
+
+    async def run_scenarios(self, context, scenarios, requests, warmup=0):
+        results = {}
+        total = warmup + requests + self.memory_requests
+        for scenario in scenarios:
+            kind = CREATES.get(scenario.name)
+
+            def remember(response, kind=kind):
+                if kind is not None:
+                    for row_id in created_ids(response):
+                        context.remember(kind, row_id)
+
+            built = [scenario.build(context, number) for number in range(total)]
+            for request in built[:warmup]:
+                response, _ = await self.send(request)
+                if response.status_code < 300:
+                    remember(response)
+            results[scenario.name] = await self.measure(built[warmup:], requests, scenario.expected_status, remember)
+        return results
+
+    async def replay(self, entries, headers):
+        """
+        Replays recorded requests in their order. The results have all of them under "all"
+        and every method and path separately; the queries of a path are only known
+        when the requests run one at a time.
+        """
+        from app.instrumentation import QueryCounter
+
+        groups = {}
+        pending = iter(entries)
+
+        async def worker():
+            for entry in pending:
+                group = groups.setdefault(entry_name(entry), {'latencies': [], 'statuses': [], 'errors': 0,
+                                                              'queries': 0})
+                queries_before = queries.count
+                response, latency = await self.send(replay_request(entry, headers))
+                group['latencies'].append(latency)
+                group['statuses'].append(response.status_code)
+                group['queries'] += queries.count - queries_before
+                expected = entry.get('status')
+                if response.status_code >= 500 or (expected is not None and response.status_code != expected):
+                    group['errors'] += 1
+
+        with QueryCounter() as queries:
+            started_at = time.perf_counter()
+            await asyncio.gather(*[worker() for _ in range(self.concurrency)])
+            elapsed = time.perf_counter() - started_at
+
+        results = {'all': summarize(
+            [latency for group in groups.values() for latency in group['latencies']],
+            [code for group in groups.values() for code in group['statuses']],
+            sum(group['errors'] for group in groups.values()), elapsed, queries.count, [])}
+        for name, group in groups.items():
+            result = summarize(group['latencies'], group['statuses'], group['errors'], None,
+                               group['queries'], [])
+            if self.concurrency > 1:
+                result['queries_per_request'] = None
+            results[name] = result
+        return results
+
+
+ID_RE = re.compile(r'/\d+(?=/|$)')
+
+
+def entry_name(entry):
+    return entry.get('name') or f'{entry.get("method", "GET").upper()} {ID_RE.sub("/{id}", entry["path"])}'
+
+
+def replay_request(entry, headers):
+    """
+    A request log line: {"method", "path", "params"?, "json"?, "data"?, "headers"?,
+    "auth"?: "admin" | "user", "status"?: expected status code, "name"?: group in the results}
+    """
+    request = {'method': entry.get('method', 'GET').upper(), 'url': entry['path'],
+               'headers': {**headers.get(entry.get('auth'), {}), **entry.get('headers', {})}}
+    for key in ('params', 'json', 'data'):
+        if key in entry:
+            request[key] = entry[key]
+    return request
+
+
+def load_log(path):
+    with open(path) as log:
+        return [json.loads(line) for line in log if line.strip()]
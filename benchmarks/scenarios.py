@@ -0,0 +1,316 @@
+import random
+from .dataset import ADMIN_EMAIL, BENCHMARK_PASSWORD
+
+SCENARIOS = []
+
+
+class Scenario:
+    """
+    One endpoint under load. `build(context, number)` returns the keyword
+    arguments of httpx.AsyncClient.request for the `number`-th request.
+    """
+
+    def __init__(self, name, build, expected_status):
+        self.name = name
+        self.build = build
+        self.expected_status = expected_status
+
+
+def scenario(name, expected_status=200):
+    def register(build):
+        SCENARIOS.append(Scenario(name, build, expected_status))
+        return build
+    return register
+
+
+class BenchmarkContext:
+    """
+    What the requests are made of: ids and words of the seeded catalogue, tokens,
+    and the rows created by earlier scenarios for the update and delete ones
+    """
+
+    def __init__(self, ids, words, admin_token, user_token, seed=42):
+        self.ids = ids
+        self.words = words
+        self.admin = {'Authorization': f'Bearer {admin_token}'}
+        self.user = {'Authorization': f'Bearer {user_token}'}
+        self.rng = random.Random(seed)
+        self.created = {}
+
+    def pick(self, kind):
+        return self.rng.choice(self.ids[kind])
+
+    def word(self):
+        return self.rng.choice(self.words)
+
+    def remember(self, kind, row_id):
+        self.created.setdefault(kind, []).append(row_id)
+
+    def take(self, kind):
+        created = self.created.get(kind)
+        return created.pop() if created else 0
+
+
+def recipe_body(context, title):
+    return {
+        'title': title,
+        'category_id': context.pick('recipe_categories'),
+        'description': ' '.join(context.word() for _ in range(20)),
+        'difficulty': context.rng.randint(1, 5),
+        'ingredients': [{'ingredient_id': ingredient_id}
+                        for ingredient_id in context.rng.sample(context.ids['ingredients'], 8)],
+    }
+
+
+@scenario('users.register')
+def register(context, number):
+    return {'method': 'POST', 'url': '/users/register',
+            'json': {'email': f'bench{number}-{context.rng.random()}@benchmark.example.com', 'password': 'benchmark'}}
+
+
+@scenario('users.token')
+def token(context, number):
+    return {'method': 'POST', 'url': '/users/token',
+            'data': {'username': ADMIN_EMAIL, 'password': BENCHMARK_PASSWORD}}
+
+
+@scenario('users.me')
+def me(context, number):
+    return {'method': 'GET', 'url': '/users/me', 'headers': context.user}
+
+
+@scenario('users.logout', 204)
+def logout(context, number):
+    from app.authentication import create_access_token
+    # every request revokes a different made-up user, the seeded tokens stay valid
+    token = create_access_token({'sub': f'logout{number}@benchmark.example.com', 'uid': 10 ** 9 + number, 'adm': False})
+    return {'method': 'POST', 'url': '/users/logout', 'headers': {'Authorization': f'Bearer {token}'}}
+
+
+@scenario('ingredients.category.list')
+def ingredient_category_list(context, number):
+    return {'method': 'GET', 'url': '/ingredients/category/list', 'headers': context.user}
+
+
+@scenario('ingredients.category.get')
+def ingredient_category_get(context, number):
+    return {'method': 'GET', 'url': f'/ingredients/category/{context.pick("ingredient_categories")}',
+            'headers': context.user}
+
+
+@scenario('ingredients.category.create', 201)
+def ingredient_category_create(context, number):
+    return {'method': 'POST', 'url': '/ingredients/category/create', 'headers': context.admin,
+            'json': {'title': f'Benchmark category {number}-{context.rng.random()}'}}
+
+
+@scenario('ingredients.category.bulk')
+def ingredient_category_bulk(context, number):
+    return {'method': 'POST', 'url': '/ingredients/category/bulk', 'headers': context.admin,
+            'json': [{'title': f'Bulk category {number}-{index}', 'description': context.word()}
+                     for index in range(50)]}
+
+
+@scenario('ingredients.category.update')
+def ingredient_category_update(context, number):
+    category_id = context.created['ingredients.category'][number % len(context.created['ingredients.category'])]
+    return {'method': 'PUT', 'url': f'/ingredients/category/update/{category_id}', 'headers': context.admin,
+            'json': {'title': f'Updated category {category_id}', 'description': context.word()}}
+
+
+@scenario('ingredients.list')
+def ingredient_list(context, number):
+    return {'method': 'GET', 'url': '/ingredients/list', 'headers': context.user}
+
+
+@scenario('ingredients.list.fields')
+def ingredient_list_fields(context, number):
+    return {'method': 'GET', 'url': '/ingredients/list', 'params': {'fields': 'id,title', 'limit': 1000},
+            'headers': context.user}
+
+
+@scenario('ingredients.get')
+def ingredient_get(context, number):
+    return {'method': 'GET', 'url': f'/ingredients/{context.pick("ingredients")}', 'headers': context.user}
+
+
+@scenario('ingredients.batch')
+def ingredient_batch(context, number):
+    return {'method': 'GET', 'url': '/ingredients/batch', 'headers': context.user,
+            'params': {'ids': ','.join(map(str, context.rng.sample(context.ids['ingredients'], 30)))}}
+
+
+@scenario('ingredients.search')
+def ingredient_search(context, number):
+    return {'method': 'GET', 'url': '/ingredients/search', 'params': {'q': context.word()[:-1]},
+            'headers': context.user}
+
+
+@scenario('ingredients.autocomplete')
+def ingredient_autocomplete(context, number):
+    return {'method': 'GET', 'url': '/ingredients/autocomplete', 'params': {'q': context.word()[:3]},
+            'headers': context.user}
+
+
+@scenario('ingredients.create', 201)
+def ingredient_create(context, number):
+    return {'method': 'POST', 'url': '/ingredients/create', 'headers': context.admin,
+            'json': {'title': f'Benchmark ingredient {number}-{context.rng.random()}',
+                     'category_id': context.pick('ingredient_categories')}}
+
+
+@scenario('ingredients.bulk')
+def ingredient_bulk(context, number):
+    return {'method': 'POST', 'url': '/ingredients/bulk', 'headers': context.admin,
+            'json': [{'title': f'Bulk ingredient {number}-{index}', 'category_id': context.pick('ingredient_categories')}
+                     for index in range(50)]}
+
+
+@scenario('ingredients.update')
+def ingredient_update(context, number):
+    ingredient_id = context.created['ingredients'][number % len(context.created['ingredients'])]
+    return {'method': 'PUT', 'url': f'/ingredients/update/{ingredient_id}', 'headers': context.admin,
+            'json': {'title': f'Updated ingredient {ingredient_id}', 'category_id': context.pick('ingredient_categories')}}
+
+
+@scenario('ingredients.delete', 204)
+def ingredient_delete(context, number):
+    return {'method': 'DELETE', 'url': f'/ingredients/delete/{context.take("ingredients")}', 'headers': context.admin}
+
+
+@scenario('ingredients.category.delete', 204)
+def ingredient_category_delete(context, number):
+    return {'method': 'DELETE', 'url': f'/ingredients/category/delete/{context.take("ingredients.category")}',
+            'headers': context.admin}
+
+
+@scenario('recipes.category.list')
+def recipe_category_list(context, number):
+    return {'method': 'GET', 'url': '/recipes/category/list', 'headers': context.user}
+
+
+@scenario('recipes.category.get')
+def recipe_category_get(context, number):
+    return {'method': 'GET', 'url': f'/recipes/category/{context.pick("recipe_categories")}', 'headers': context.user}
+
+
+@scenario('recipes.category.create', 201)
+def recipe_category_create(context, number):
+    return {'method': 'POST', 'url': '/recipes/category/create', 'headers': context.admin,
+            'json': {'title': f'Benchmark recipe category {number}-{context.rng.random()}'}}
+
+
+@scenario('recipes.category.update')
+def recipe_category_update(context, number):
+    category_id = context.created['recipes.category'][number % len(context.created['recipes.category'])]
+    return {'method': 'PUT', 'url': f'/recipes/category/update/{category_id}', 'headers': context.admin,
+            'json': {'title': f'Updated recipe category {category_id}'}}
+
+
+@scenario('recipes.list')
+def recipe_list(context, number):
+    return {'method': 'GET', 'url': '/recipes/list', 'headers': context.user}
+
+
+@scenario('recipes.get')
+def recipe_get(context, number):
+    return {'method': 'GET', 'url': f'/recipes/{context.pick("recipes")}', 'headers': context.user}
+
+
+@scenario('recipes.batch')
+def recipe_batch(context, number):
+    return {'method': 'GET', 'url': '/recipes/batch', 'headers': context.user,
+            'params': {'ids': ','.join(map(str, context.rng.sample(context.ids['recipes'], 20)))}}
+
+
+@scenario('recipes.search.text')
+def recipe_search_text(context, number):
+    return {'method': 'GET', 'url': '/recipes/search', 'params': {'q': f'{context.word()} soup'},
+            'headers': context.user}
+
+
+@scenario('recipes.search.ingredients')
+def recipe_search_ingredients(context, number):
+    return {'method': 'GET', 'url': '/recipes/search', 'headers': context.user,
+            'params': {'ingredients': context.rng.sample(context.ids['ingredients'][:200], 15), 'max_missing': 2}}
+
+
+@scenario('recipes.autocomplete')
+def recipe_autocomplete(context, number):
+    return {'method': 'GET', 'url': '/recipes/autocomplete', 'params': {'q': 'cre'}, 'headers': context.user}
+
+
+@scenario('recipes.shopping_list')
+def recipe_shopping_list(context, number):
+    return {'method': 'GET', 'url': '/recipes/shopping-list', 'headers': context.user,
+            'params': {'recipe_ids': context.rng.sample(context.ids['recipes'], 21)}}
+
+
+@scenario('recipes.create', 201)
+def recipe_create(context, number):
+    return {'method': 'POST', 'url': '/recipes/create', 'headers': context.admin,
+            'json': recipe_body(context, f'Benchmark recipe {number}-{context.rng.random()}')}
+
+
+@scenario('recipes.bulk')
+def recipe_bulk(context, number):
+    return {'method': 'POST', 'url': '/recipes/bulk', 'headers': context.admin,
+            'json': [recipe_body(context, f'Bulk recipe {number}-{index}') for index in range(50)]}
+
+
+@scenario('recipes.delete', 204)
+def recipe_delete(context, number):
+    return {'method': 'DELETE', 'url': f'/recipes/delete/{context.take("recipes")}', 'headers': context.admin}
+
+
+@scenario('recipes.category.delete', 204)
+def recipe_category_delete(context, number):
+    return {'method': 'DELETE', 'url': f'/recipes/category/delete/{context.take("recipes.category")}',
+            'headers': context.admin}
+
+
+@scenario('stats.recipes.categories')
+def stats_recipe_categories(context, number):
+    return {'method': 'GET', 'url': '/stats/recipes/categories', 'headers': context.user}
+
+
+@scenario('stats.ingredients.popular')
+def stats_popular_ingredients(context, number):
+    return {'method': 'GET', 'url': '/stats/ingredients/popular', 'headers': context.user, 'params': {'limit': 20}}
+
+
+@scenario('stats.recipes.difficulty')
+def stats_difficulty(context, number):
+    return {'method': 'GET', 'url': '/stats/recipes/difficulty', 'headers': context.user}
+
+
+@scenario('monitoring.hashing')
+def monitoring_hashing(context, number):
+    return {'method': 'GET', 'url': '/monitoring/hashing', 'headers': context.admin}
+
+
+@scenario('monitoring.cache')
+def monitoring_cache(context, number):
+    return {'method': 'GET', 'url': '/monitoring/cache', 'headers': context.admin}
+
+
+@scenario('monitoring.pool')
+def monitoring_pool(context, number):
+    return {'method': 'GET', 'url': '/monitoring/pool', 'headers': context.admin}
+
+
+# scenarios whose created rows are used by later ones: name -> kind. The create endpoints
+# of ingredients and their categories do not return the id, the bulk ones do.
+CREATES = {
+    'ingredients.category.bulk': 'ingredients.category',
+    'ingredients.bulk': 'ingredients',
+    'recipes.category.create': 'recipes.category',
+    'recipes.create': 'recipes',
+}
+
+
+def created_ids(response):
+    body = response.json()
+    if 'results' in body:
+        return [result['id'] for result in body['results'] if result['status'] == 'created']
+    return [body['id']]
@@ -0,0 +1,95 @@
+"""Initial schema, as created by the former startup create_all()
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 19:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'category_ingredients',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('description', sa.TEXT(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('title'),
+    )
+    op.create_index('ix_category_ingredients_id', 'category_ingredients', ['id'])
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('password', sa.String(), nullable=False),
+        sa.Column('is_admin', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+    op.create_table(
+        'category_recipes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('title'),
+    )
+    op.create_index('ix_category_recipes_id', 'category_recipes', ['id'])
+    op.create_table(
+        'ingredients',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['category_ingredients.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('title'),
+    )
+    op.create_index('ix_ingredients_id', 'ingredients', ['id'])
+    op.create_table(
+        'recipes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('description', sa.TEXT(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('difficulty', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['category_id'], ['category_recipes.id']),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_recipes_id', 'recipes', ['id'])
+    op.create_table(
+        'recipes_ingredient',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recipe_id', sa.Integer(), nullable=False),
+        sa.Column('ingredient_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ingredient_id'], ['ingredients.id']),
+        sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_recipes_ingredient_id', 'recipes_ingredient', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recipes_ingredient_id', table_name='recipes_ingredient')
+    op.drop_table('recipes_ingredient')
+    op.drop_index('ix_recipes_id', table_name='recipes')
+    op.drop_table('recipes')
+    op.drop_index('ix_ingredients_id', table_name='ingredients')
+    op.drop_table('ingredients')
+    op.drop_index('ix_category_recipes_id', table_name='category_recipes')
+    op.drop_table('category_recipes')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_table('users')
+    op.drop_index('ix_category_ingredients_id', table_name='category_ingredients')
+    op.drop_table('category_ingredients')
@@ -0,0 +1,38 @@
+"""Indexes on the foreign keys and one link per recipe and ingredient
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 19:25:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # the same ingredient could be linked to a recipe more than once, keep the first link
+    op.execute(
+        'DELETE FROM recipes_ingredient WHERE id NOT IN '
+        '(SELECT min(id) FROM recipes_ingredient GROUP BY recipe_id, ingredient_id)'
+    )
+    op.create_index('uq_recipes_ingredient_recipe_id_ingredient_id', 'recipes_ingredient',
+                    ['recipe_id', 'ingredient_id'], unique=True)
+    op.create_index('ix_recipes_ingredient_ingredient_id_recipe_id', 'recipes_ingredient',
+                    ['ingredient_id', 'recipe_id'])
+    op.create_index('ix_recipes_category_id', 'recipes', ['category_id'])
+    op.create_index('ix_recipes_owner_id', 'recipes', ['owner_id'])
+    op.create_index('ix_ingredients_category_id', 'ingredients', ['category_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ingredients_category_id', table_name='ingredients')
+    op.drop_index('ix_recipes_owner_id', table_name='recipes')
+    op.drop_index('ix_recipes_category_id', table_name='recipes')
+    op.drop_index('ix_recipes_ingredient_ingredient_id_recipe_id', table_name='recipes_ingredient')
+    op.drop_index('uq_recipes_ingredient_recipe_id_ingredient_id', table_name='recipes_ingredient')
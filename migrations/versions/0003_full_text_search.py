@@ -0,0 +1,46 @@
+"""Full-text search columns and trigram indexes, PostgreSQL only
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 19:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # other databases search with the in-process index of app/text_search.py
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(
+        "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED"
+    )
+    op.execute('CREATE INDEX IF NOT EXISTS ix_recipes_search_vector ON recipes USING gin (search_vector)')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_recipes_title_trgm ON recipes USING gin (title gin_trgm_ops)')
+    op.execute(
+        "ALTER TABLE ingredients ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "to_tsvector('simple', title)) STORED"
+    )
+    op.execute('CREATE INDEX IF NOT EXISTS ix_ingredients_search_vector ON ingredients USING gin (search_vector)')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_ingredients_title_trgm ON ingredients USING gin (title gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.execute('DROP INDEX IF EXISTS ix_ingredients_title_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_ingredients_search_vector')
+    op.execute('ALTER TABLE ingredients DROP COLUMN IF EXISTS search_vector')
+    op.execute('DROP INDEX IF EXISTS ix_recipes_title_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_recipes_search_vector')
+    op.execute('ALTER TABLE recipes DROP COLUMN IF EXISTS search_vector')
@@ -0,0 +1,45 @@
+"""updated_at columns and the change log of the catalogue
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+TABLES = ('category_ingredients', 'ingredients', 'users', 'category_recipes', 'recipes')
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        # SQLite can not add a column with a non-constant default, batch mode copies the table
+        with op.batch_alter_table(table, recreate='auto') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+        op.execute(f'UPDATE {table} SET updated_at = ' +
+                   ('coalesce(created_at, CURRENT_TIMESTAMP)' if table == 'recipes' else 'CURRENT_TIMESTAMP'))
+        with op.batch_alter_table(table, recreate='auto') as batch_op:
+            batch_op.alter_column('updated_at', server_default=sa.func.now())
+    op.create_table(
+        'changes',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('entity', sa.String(), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.String(length=6), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('changes')
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
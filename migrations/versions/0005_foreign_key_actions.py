@@ -0,0 +1,53 @@
+"""ON DELETE actions on the foreign keys of the catalogue
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 23:10:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# the foreign keys of 0001 have no name, SQLite gets these while its tables are copied
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+# (table, column, referred table, ON DELETE)
+FOREIGN_KEYS = (
+    ('recipes_ingredient', 'recipe_id', 'recipes', 'CASCADE'),
+    ('recipes_ingredient', 'ingredient_id', 'ingredients', 'CASCADE'),
+    ('ingredients', 'category_id', 'category_ingredients', 'SET NULL'),
+    ('recipes', 'category_id', 'category_recipes', 'RESTRICT'),
+)
+
+
+def foreign_key_name(table, column, referred):
+    if op.get_bind().dialect.name == 'postgresql':
+        # the name PostgreSQL gave the unnamed constraints
+        return f'{table}_{column}_fkey'
+    return NAMING_CONVENTION['fk'] % {'table_name': table, 'column_0_name': column, 'referred_table_name': referred}
+
+
+def replace_foreign_keys(ondelete):
+    tables = {}
+    for table, column, referred, action in FOREIGN_KEYS:
+        tables.setdefault(table, []).append((column, referred, action))
+    for table, foreign_keys in tables.items():
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred, action in foreign_keys:
+                name = foreign_key_name(table, column, referred)
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete(action))
+
+
+def upgrade() -> None:
+    replace_foreign_keys(lambda action: action)
+
+
+def downgrade() -> None:
+    replace_foreign_keys(lambda action: None)
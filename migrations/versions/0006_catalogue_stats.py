@@ -0,0 +1,51 @@
+"""Aggregate tables of the catalogue for /stats
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+# table, key column, table the key refers to (if any), query counting the existing recipes
+STATS = (
+    ('stats_recipe_categories', 'category_id', 'category_recipes',
+     'SELECT category_id, count(*) FROM recipes GROUP BY category_id'),
+    ('stats_ingredients', 'ingredient_id', 'ingredients',
+     'SELECT ingredient_id, count(*) FROM recipes_ingredient GROUP BY ingredient_id'),
+    ('stats_difficulty', 'difficulty', None,
+     'SELECT difficulty, count(*) FROM recipes GROUP BY difficulty'),
+    ('stats_owners', 'owner_id', 'users',
+     'SELECT owner_id, count(*) FROM recipes GROUP BY owner_id'),
+)
+
+
+def upgrade() -> None:
+    for table, key, referred, counts in STATS:
+        constraints = [sa.PrimaryKeyConstraint(key)]
+        if referred is not None:
+            constraints.append(sa.ForeignKeyConstraint([key], [f'{referred}.id'], ondelete='CASCADE'))
+        op.create_table(
+            table,
+            sa.Column(key, sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('recipe_count', sa.Integer(), nullable=False),
+            *constraints,
+        )
+        if referred is not None:
+            op.create_index(f'ix_{table}_top', table, [sa.text('recipe_count DESC'), key])
+        op.execute(f'INSERT INTO {table} ({key}, recipe_count) {counts}')
+
+
+def downgrade() -> None:
+    for table, key, referred, _ in reversed(STATS):
+        if referred is not None:
+            op.drop_index(f'ix_{table}_top', table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+DATABASE_DIR = tempfile.mkdtemp(prefix='recipes-tests-')
+
+# the app reads its settings on import, so they are set before anything of it is imported
+os.environ['SQLALCHEMY_DATABASE_URL'] = f'sqlite:///{DATABASE_DIR}/test.db'
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('ALGORITHM', 'HS256')
+os.environ.setdefault('ACCESS_TOKEN_EXPIRE_MINUTES', '30')
+os.environ['ADMIN_EMAIL'] = 'admin@example.com'
+os.environ['ADMIN_PASSWORD'] = 'admin-password'
+os.environ['BCRYPT_ROUNDS'] = '4'
+os.environ['ADMISSION_BACKEND'] = 'none'
+os.environ['RESPONSE_CACHE_BACKEND'] = 'none'
+os.environ['CHANGES_SETTLE_SECONDS'] = '0'
+os.environ['SIMILAR_RECIPES_DIR'] = f'{DATABASE_DIR}/similarity'
+
+
+@pytest.fixture(scope='session')
+def client():
+    subprocess.run([sys.executable, '-m', 'alembic', 'upgrade', 'head'], cwd=ROOT, check=True, capture_output=True)
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def login(client, email, password):
+    response = client.post('/users/token', data={'username': email, 'password': password})
+    assert response.status_code == 200, response.text
+    return {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+
+@pytest.fixture(scope='session')
+def admin(client):
+    client.post('/users/register', json={'email': 'admin@example.com', 'password': 'admin-password'})
+    return login(client, 'admin@example.com', 'admin-password')
+
+
+@pytest.fixture(scope='session')
+def user(client):
+    client.post('/users/register', json={'email': 'user@example.com', 'password': 'user-password'})
+    return login(client, 'user@example.com', 'user-password')
@@ -0,0 +1,84 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.admission import AdmissionController, AdmissionMiddleware, LatencyShedder, LocalLimiterBackend
+
+
+def shedder(**kwargs):
+    return LatencyShedder(**{'target': 0.1, 'window': 0, 'min_samples': 10, 'max_limit': 200, 'min_limit': 4,
+                             **kwargs})
+
+
+def serve(value, count, seconds):
+    for _ in range(count):
+        assert value.admit()
+    for _ in range(count):
+        value.done(seconds)
+
+
+def test_slow_windows_shrink_the_limit_to_the_requests_in_flight():
+    value = shedder()
+    serve(value, 10, 1.0)
+    assert value.limit == 8
+    serve(value, 8, 1.0)
+    assert value.limit == 8
+    serve(value, 8, 1.0)
+    assert value.limit == 6.4
+
+
+def test_a_window_needs_enough_requests_to_move_the_limit():
+    value = shedder()
+    serve(value, 9, 1.0)
+    assert value.limit == 200 and value.last_p99 is None
+    serve(value, 1, 1.0)
+    assert value.limit < 200
+
+
+def test_one_slow_window_after_fast_ones_does_not_cut_the_limit():
+    value = shedder()
+    value.limit = 50.0
+    serve(value, 10, 0.05)
+    assert value.limit == 55
+    serve(value, 10, 0.2)
+    assert value.last_p99 < value.target and value.limit > 55
+
+
+def test_fast_windows_grow_the_limit_back_to_the_maximum():
+    value = shedder()
+    value.limit = 10.0
+    for _ in range(40):
+        serve(value, 10, 0.01)
+    assert value.limit == 200
+
+
+def client_of(controller):
+    app = FastAPI()
+
+    @app.get('/recipes/list')
+    def recipes():
+        return []
+
+    @app.post('/users/token')
+    def token():
+        return {}
+
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    return TestClient(app)
+
+
+def test_overloaded_worker_answers_503_but_not_on_exempt_routes():
+    controller = AdmissionController(LocalLimiterBackend(), rate_limit='1000:1000', route_rate_limits='',
+                                     route_concurrency_limits='', shedder=shedder())
+    client = client_of(controller)
+    assert client.get('/recipes/list').status_code == 200
+    controller.shedder.limit = 0
+    response = client.get('/recipes/list')
+    assert (response.status_code, response.headers['retry-after']) == (503, '1')
+    assert client.post('/users/token').status_code == 200
+    assert controller.stats.shed == 1 and controller.shedder.in_flight == 0
+
+
+def test_empty_bucket_answers_429():
+    controller = AdmissionController(LocalLimiterBackend(), rate_limit='1:2', route_rate_limits='',
+                                     route_concurrency_limits='', shedder=shedder())
+    client = client_of(controller)
+    assert [client.get('/recipes/list').status_code for _ in range(3)] == [200, 200, 429]
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import pytest
+from .conftest import ROOT
+
+# a dialect without INSERT ... ON CONFLICT, registered in a fresh interpreter before the app is imported
+NO_UPSERT_DIALECT = '''
+from sqlalchemy.dialects import registry
+from sqlalchemy.dialects.sqlite.pysqlite import SQLiteDialect_pysqlite
+
+
+class NoUpsertDialect(SQLiteDialect_pysqlite):
+    name = 'noupsert'
+
+
+registry.register('noupsert', '__main__', 'NoUpsertDialect')
+import app.bulk
+'''
+
+
+@pytest.fixture(scope='module')
+def category_id(client, admin):
+    client.post('/ingredients/category/create', json={'title': 'Spices'}, headers=admin)
+    return next(item['id'] for item in client.get('/ingredients/category/list', params={'limit': 1000},
+                                                  headers=admin).json() if item['title'] == 'Spices')
+
+
+def statuses(response):
+    assert response.status_code == 200, response.text
+    return [(result['status'], result['detail']) for result in response.json()['results']]
+
+
+def test_ingredients_are_created_updated_or_left_unchanged(client, admin, category_id):
+    items = [{'title': 'Pepper', 'category_id': category_id}, {'title': 'Salt'}]
+    response = client.post('/ingredients/bulk', json=items, headers=admin)
+    assert statuses(response) == [('created', None), ('created', None)]
+    assert (response.json()['created'], response.json()['updated'], response.json()['failed']) == (2, 0, 0)
+    ids = [result['id'] for result in response.json()['results']]
+
+    response = client.post('/ingredients/bulk', json=[{'title': 'Salt', 'category_id': category_id},
+                                                      {'title': 'Pepper', 'category_id': category_id}], headers=admin)
+    assert statuses(response) == [('updated', None), ('unchanged', None)]
+    assert [result['id'] for result in response.json()['results']] == ids[::-1]
+    listed = {item['id']: item for item in client.get('/ingredients/batch', params={'ids': ','.join(map(str, ids))},
+                                                      headers=admin).json()}
+    assert [listed[ingredient_id]['category_id'] for ingredient_id in ids] == [category_id, category_id]
+
+
+def test_invalid_items_are_reported_without_failing_the_others(client, admin, category_id):
+    response = client.post('/ingredients/bulk', headers=admin, json=[
+        {'title': 'Nutmeg'}, {'title': 'Nutmeg'}, {'title': 'Clove', 'category_id': 999999}, {'category_id': 1}])
+    assert statuses(response) == [('created', None), ('error', 'Duplicate title in the request'),
+                                  ('error', 'Category was not found'), ('error', 'title: field required')]
+
+    body = b'{"title": "Ginger"}\nnot json\n\n{"title": "Cumin"}'
+    response = client.post('/ingredients/bulk', content=body, headers={**admin, 'Content-Type': 'application/x-ndjson'})
+    assert statuses(response) == [('created', None), ('error', 'Line is not valid JSON'), ('created', None)]
+
+    assert client.post('/ingredients/bulk', json={'title': 'Mace'}, headers=admin).status_code == 400
+    assert client.post('/ingredients/bulk', content=b'[', headers=admin).status_code == 400
+
+
+def test_categories_upsert_their_description(client, admin, user):
+    response = client.post('/ingredients/category/bulk', json=[{'title': 'Herbs'}], headers=admin)
+    assert statuses(response) == [('created', None)]
+    response = client.post('/ingredients/category/bulk', json=[{'title': 'Herbs', 'description': 'Fresh'}],
+                           headers=admin)
+    assert statuses(response) == [('updated', None)]
+    category_id = response.json()['results'][0]['id']
+    assert client.get(f'/ingredients/category/{category_id}', headers=admin).json()['description'] == 'Fresh'
+    assert client.post('/ingredients/category/bulk', json=[{'title': 'Herbs'}], headers=user).status_code == 403
+
+
+def test_databases_without_upserts_are_refused_at_startup(tmp_path):
+    env = {**os.environ, 'SQLALCHEMY_DATABASE_URL': f'noupsert:///{tmp_path}/test.db', 'DATABASE_ASYNC': 'false'}
+    result = subprocess.run([sys.executable, '-c', NO_UPSERT_DIALECT], cwd=ROOT, env=env, capture_output=True,
+                            text=True)
+    assert result.returncode != 0
+    assert 'RuntimeError: SQLALCHEMY_DATABASE_URL must be a PostgreSQL or SQLite database, ' \
+           '"noupsert" has no INSERT ... ON CONFLICT' in result.stderr
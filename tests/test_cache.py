@@ -0,0 +1,73 @@
+import asyncio
+from typing import List
+import pytest
+from fastapi import Request, Response
+from app import cache
+from app.cache import LocalCacheBackend, ResponseCache, create_cache_backend
+
+
+def request(path, **headers):
+    return Request({'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+                    'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()]})
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return [self.calls]
+
+
+def test_invalidating_a_namespace_drops_its_entries_only():
+    response_cache = ResponseCache(LocalCacheBackend())
+    ingredients, categories = Loader(), Loader()
+
+    def get(path, namespaces, load):
+        return asyncio.run(response_cache.respond(request(path), Response(), namespaces, List[int], load)).body
+
+    assert get('/ingredients', ['ingredients', 'categories'], ingredients) == b'[1]'
+    assert get('/categories', ['categories'], categories) == b'[1]'
+    assert get('/ingredients', ['ingredients', 'categories'], ingredients) == b'[1]'
+    assert (ingredients.calls, categories.calls) == (1, 1)
+
+    asyncio.run(response_cache.invalidate('ingredients'))
+    assert get('/ingredients', ['ingredients', 'categories'], ingredients) == b'[2]'
+    assert get('/categories', ['categories'], categories) == b'[1]'
+    # an entry of several namespaces goes with any of them
+    asyncio.run(response_cache.invalidate('categories'))
+    assert get('/ingredients', ['ingredients', 'categories'], ingredients) == b'[3]'
+    assert get('/categories', ['categories'], categories) == b'[2]'
+
+
+def test_etag_and_last_modified_answer_not_modified():
+    response_cache = ResponseCache(LocalCacheBackend())
+    load = Loader()
+
+    def get(**headers):
+        return asyncio.run(response_cache.respond(request('/ingredients', **headers), Response(), ['ingredients'],
+                                                  List[int], load))
+
+    first = get()
+    etag, last_modified = first.headers['etag'], first.headers['last-modified']
+    assert first.status_code == 200
+    assert get(if_none_match=etag).status_code == 304
+    assert get(if_none_match=f'"other", {etag}').status_code == 304
+    assert get(if_none_match='"other"').status_code == 200
+    assert get(if_modified_since=last_modified).status_code == 304
+    assert get(if_modified_since='not a date').status_code == 200
+    assert response_cache.not_modified == 3
+
+    asyncio.run(response_cache.invalidate('ingredients'))
+    changed = get(if_none_match=etag)
+    assert changed.status_code == 200 and changed.headers['etag'] != etag
+
+
+def test_local_backend_is_refused_with_several_workers(monkeypatch):
+    monkeypatch.setattr(cache, 'RESPONSE_CACHE_BACKEND', 'local')
+    monkeypatch.setattr(cache, 'WEB_CONCURRENCY', 4)
+    with pytest.raises(ValueError):
+        create_cache_backend()
+    monkeypatch.setattr(cache, 'WEB_CONCURRENCY', 1)
+    assert isinstance(create_cache_backend(), LocalCacheBackend)
@@ -0,0 +1,58 @@
+import time
+from datetime import timezone
+from sqlalchemy import select
+from app.databases import SessionLocal
+from app.models import CategoryRecipesModel, ChangeModel
+
+
+def last_change(db, entity_id):
+    return db.scalar(select(ChangeModel).where(ChangeModel.entity == 'category_recipes',
+                                               ChangeModel.entity_id == entity_id).order_by(ChangeModel.id.desc()))
+
+
+def test_changes_are_written_when_a_slow_transaction_commits(client):
+    db = SessionLocal()
+    try:
+        category = CategoryRecipesModel(title='Slow to commit')
+        db.add(category)
+        db.flush()
+        assert last_change(db, category.id) is None
+        before = db.scalar(select(ChangeModel.id).order_by(ChangeModel.id.desc()).limit(1)) or 0
+        time.sleep(0.6)
+        committed_at = time.time()
+        db.commit()
+        change = last_change(db, category.id)
+        assert (change.operation, change.id > before) == ('upsert', True)
+        # stamped at the commit, not at the flush
+        changed_at = change.changed_at
+        if changed_at.tzinfo is None:
+            changed_at = changed_at.replace(tzinfo=timezone.utc)
+        assert abs(changed_at.timestamp() - committed_at) < 0.3
+    finally:
+        db.close()
+
+
+def test_rolled_back_changes_are_not_written(client):
+    db = SessionLocal()
+    try:
+        category = CategoryRecipesModel(title='Rolled back')
+        db.add(category)
+        db.flush()
+        category_id = category.id
+        db.rollback()
+        db.commit()
+        assert last_change(db, category_id) is None
+    finally:
+        db.close()
+
+
+def test_feed_lists_upserts_and_tombstones_in_order(client, admin):
+    since = client.get('/changes', headers=admin).json()['next_cursor']
+    client.post('/recipes/category/create', json={'title': 'Short lived'}, headers=admin)
+    category_id = next(item['id'] for item in client.get('/recipes/category/list', headers=admin).json()
+                       if item['title'] == 'Short lived')
+    assert client.delete(f'/recipes/category/delete/{category_id}', headers=admin).status_code == 204
+    changes = client.get('/changes', params={'since': since, 'entity': 'category_recipes'}, headers=admin).json()
+    assert [(change['entity_id'], change['operation']) for change in changes['changes']] == \
+        [(category_id, 'upsert'), (category_id, 'delete')]
+    assert changes['changes'][0]['data'] is None
@@ -0,0 +1,62 @@
+import asyncio
+import time
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from app.databases import SyncSessionAdapter, get_async_url
+
+
+def test_async_url_of_a_sync_url():
+    assert str(get_async_url('postgresql://user:secret@db/recipes')) == \
+        'postgresql+asyncpg://user:secret@db/recipes'
+    assert str(get_async_url('sqlite:///recipes.db')) == 'sqlite+aiosqlite:///recipes.db'
+    with pytest.raises(ValueError):
+        get_async_url('mysql://db/recipes')
+
+
+@pytest.fixture()
+def adapter(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/slow.db', connect_args={'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def add_sleep(dbapi_connection, connection_record):
+        dbapi_connection.create_function('sleep', 1, lambda seconds: time.sleep(seconds))
+
+    session = SyncSessionAdapter(sessionmaker(bind=engine)())
+    yield session
+    asyncio.run(session.close())
+    engine.dispose()
+
+
+def test_sync_sessions_do_not_block_the_event_loop(adapter):
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0)
+        started_at = time.perf_counter()
+        await adapter.execute(text('SELECT sleep(0.2)'))
+        ticker.cancel()
+        return started_at
+
+    started_at = asyncio.run(main())
+    assert len([at for at in ticks if at > started_at]) >= 5
+
+
+def test_sync_session_results_are_fetched_off_the_event_loop(adapter):
+    async def main():
+        await adapter.execute(text('CREATE TABLE numbers (value INTEGER)'))
+        await adapter.execute(text('INSERT INTO numbers VALUES (:value)'), [{'value': value} for value in range(5)])
+        await adapter.commit()
+        values = (await adapter.scalars(text('SELECT value FROM numbers ORDER BY value'))).all()
+        result = await adapter.stream(text('SELECT value FROM numbers ORDER BY value'))
+        partitions = [[row.value for row in rows] async for rows in result.partitions(2)]
+        await result.close()
+        return values, partitions
+
+    assert asyncio.run(main()) == ([0, 1, 2, 3, 4], [[0, 1], [2, 3], [4]])
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import pytest
+from starlette.requests import Request
+from app import export
+from app.export import accepts_gzip
+
+PLAIN = {'Accept-Encoding': 'identity'}
+
+
+@pytest.fixture(scope='module')
+def catalogue(client, admin):
+    client.post('/ingredients/bulk', json=[{'title': 'Basil'}, {'title': 'Garlic'}, {'title': 'Pine nuts'}],
+                headers=admin)
+    ingredients = {item['title']: item['id'] for item in client.get('/ingredients/list', params={'limit': 1000},
+                                                                    headers=admin).json()}
+    client.post('/recipes/category/create', json={'title': 'Sauces'}, headers=admin)
+    category_id = next(item['id'] for item in client.get('/recipes/category/list', params={'limit': 1000},
+                                                         headers=admin).json() if item['title'] == 'Sauces')
+    client.post('/recipes/bulk', headers=admin, json=[
+        {'title': title, 'category_id': category_id, 'description': 'Blend', 'difficulty': 1,
+         'ingredients': [{'ingredient_id': ingredients[name]} for name in names]}
+        for title, names in (('Pesto', ['Basil', 'Garlic', 'Pine nuts']), ('Garlic oil', ['Garlic']),
+                             ('Water', []))])
+    return ingredients
+
+
+def ndjson(response):
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_ingredients_export_incrementally(client, admin, catalogue):
+    response = client.get('/export/ingredients', headers={**admin, **PLAIN})
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert 'content-encoding' not in response.headers
+    exported = ndjson(response)
+    listed = client.get('/ingredients/list', params={'limit': 1000, 'fields': 'id,title,category_id,updated_at'},
+                        headers=admin).json()
+    assert exported == listed
+    until_id = response.headers['x-export-until-id']
+    assert until_id == str(listed[-1]['id'])
+
+    response = client.get('/export/ingredients', params={'since_id': until_id}, headers={**admin, **PLAIN})
+    assert response.text == '' and response.headers['x-export-until-id'] == until_id
+    client.post('/ingredients/create', json={'title': 'Parmesan'}, headers=admin)
+    response = client.get('/export/ingredients', params={'since_id': until_id}, headers={**admin, **PLAIN})
+    assert [item['title'] for item in ndjson(response)] == ['Parmesan']
+
+
+def test_recipes_export_as_csv_across_partitions(client, admin, catalogue, monkeypatch):
+    response = client.get('/export/recipes', params={'format': 'csv'}, headers={**admin, **PLAIN})
+    assert response.headers['content-type'].startswith('text/csv')
+    assert response.headers['content-disposition'] == 'attachment; filename="recipes.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0]) == list(export.RECIPE_COLUMNS) + ['ingredient_ids']
+    by_title = {row['title']: row for row in rows}
+    assert by_title['Pesto']['ingredient_ids'] == ' '.join(str(catalogue[name])
+                                                           for name in ('Basil', 'Garlic', 'Pine nuts'))
+    assert by_title['Water']['ingredient_ids'] == ''
+    listed = client.get('/recipes/list', params={'limit': 1000}, headers=admin).json()
+    assert [int(row['id']) for row in rows] == [recipe['id'] for recipe in listed]
+
+    # the rows of a recipe continue in the next partition
+    expected = ndjson(client.get('/export/recipes', headers={**admin, **PLAIN}))
+    monkeypatch.setattr(export, 'EXPORT_BATCH_SIZE', 1)
+    assert ndjson(client.get('/export/recipes', headers={**admin, **PLAIN})) == expected
+    assert [recipe['ingredient_ids'] for recipe in expected] == [recipe['ingredient_ids'] for recipe in listed]
+
+
+def test_export_is_gzipped_when_accepted(client, admin, user, catalogue):
+    plain = client.get('/export/recipes', headers={**admin, **PLAIN})
+    compressed = client.get('/export/recipes', headers={**admin, 'Accept-Encoding': 'gzip'})
+    assert compressed.headers['content-encoding'] == 'gzip'
+    # decoded by the client
+    assert compressed.text == plain.text
+    assert client.get('/export/recipes', headers=user).status_code == 403
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip', True), ('br, gzip;q=0.5', True), ('gzip;q=0', False), ('gzip; q=0.0', False), ('br', False), ('', False),
+])
+def test_accepts_gzip(accept_encoding, expected):
+    request = Request({'type': 'http', 'headers': [(b'accept-encoding', accept_encoding.encode())]})
+    assert accepts_gzip(request) == expected
@@ -0,0 +1,46 @@
+import json
+from datetime import date, datetime, timezone
+from sqlalchemy import select
+from app import fast_json
+from app.databases import SessionLocal
+from app.fast_json import dumps, row_plan
+from app.models import IngredientModel, RecipesModel
+from app.schemas.ingredients import IngredientResponseScheme
+from app.schemas.recipes import RecipeResponseScheme
+
+
+def test_rows_have_the_shape_the_schemes_validate_to(client, admin):
+    client.post('/ingredients/category/create', json={'title': 'Oils'}, headers=admin)
+    category_id = next(item['id'] for item in client.get('/ingredients/category/list', params={'limit': 1000},
+                                                         headers=admin).json() if item['title'] == 'Oils')
+    client.post('/ingredients/bulk', json=[{'title': 'Olive oil', 'category_id': category_id},
+                                           {'title': 'Vinegar'}], headers=admin)
+    listed = client.get('/ingredients/list', params={'limit': 1000}, headers=admin).json()
+    with SessionLocal() as db:
+        expected = [json.loads(IngredientResponseScheme.from_orm(ingredient).json())
+                    for ingredient in db.scalars(select(IngredientModel).order_by(IngredientModel.id))]
+    assert listed == expected
+    by_title = {item['title']: item for item in listed}
+    assert by_title['Olive oil']['category']['title'] == 'Oils'
+    assert by_title['Vinegar']['category'] is None
+
+
+def test_fields_that_are_not_columns_are_left_to_the_endpoint():
+    assert row_plan(RecipesModel, RecipeResponseScheme).missing == ['ingredient_ids']
+    assert row_plan(IngredientModel, IngredientResponseScheme).missing == []
+
+
+def test_orjson_encodes_like_the_standard_library(monkeypatch):
+    data = [{'id': 1, 'title': 'Crème brûlée', 'updated_at': datetime(2026, 1, 2, 3, 4, 5, 600),
+             'created_at': datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc), 'day': date(2026, 1, 2),
+             'category': None, 'ingredient_ids': [3, 1]}]
+    encoded = dumps(data)
+    monkeypatch.setattr(fast_json, 'orjson', None)
+    assert json.loads(encoded) == json.loads(dumps(data))
+    assert json.loads(encoded)[0]['updated_at'] == '2026-01-02T03:04:05.000600'
+
+
+def test_openapi_keeps_the_response_schemes(client):
+    paths = client.get('/openapi.json').json()['paths']
+    schema = paths['/ingredients/list']['get']['responses']['200']['content']['application/json']['schema']
+    assert schema['items']['$ref'] == '#/components/schemas/IngredientResponseScheme'
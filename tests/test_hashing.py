@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+import pytest
+from passlib.hash import bcrypt
+from sqlalchemy import create_engine, text
+from app.hashing import PasswordHasher, get_password_hash
+from .conftest import login
+
+
+def test_calls_past_the_concurrency_limit_wait_in_the_queue():
+    hasher = PasswordHasher(executor='thread', workers=4, concurrency=2)
+    running = []
+
+    def work(value):
+        running.append(hasher.running)
+        time.sleep(0.05)
+        return value * 2
+
+    async def main():
+        return await asyncio.gather(*(hasher.run(work, value) for value in range(5)))
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8]
+    hasher.shutdown()
+    assert max(running) == 2
+    stats = hasher.stats()
+    assert (stats['completed'], stats['queued'], stats['running'], stats['max_queued']) == (5, 0, 0, 3)
+    assert stats['wait_seconds_total'] > 0
+
+    with pytest.raises(ValueError):
+        PasswordHasher(executor='fiber')
+
+
+def test_hashes_of_another_cost_factor_are_replaced():
+    hasher = PasswordHasher(executor='thread', workers=1, concurrency=1)
+    old_hash = bcrypt.using(rounds=5).hash('secret-password')
+
+    async def main():
+        return (await hasher.verify_and_update('secret-password', old_hash),
+                await hasher.verify_and_update('wrong-password', old_hash),
+                await hasher.verify_and_update('secret-password', get_password_hash('secret-password')))
+
+    (verified, new_hash), wrong, current = asyncio.run(main())
+    hasher.shutdown()
+    assert verified and new_hash.startswith('$2b$04$') and bcrypt.verify('secret-password', new_hash)
+    assert wrong == (False, None)
+    assert current == (True, None)
+
+
+def test_login_rehashes_a_password_of_an_old_cost_factor(client):
+    client.post('/users/register', json={'email': 'rehash@example.com', 'password': 'rehash-password'})
+    engine = create_engine(os.environ['SQLALCHEMY_DATABASE_URL'])
+
+    def stored_hash():
+        with engine.connect() as connection:
+            return connection.scalar(text("SELECT password FROM users WHERE email = 'rehash@example.com'"))
+
+    assert stored_hash().startswith('$2b$04$')
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE users SET password = :password WHERE email = 'rehash@example.com'"),
+                           {'password': bcrypt.using(rounds=5).hash('rehash-password')})
+    login(client, 'rehash@example.com', 'rehash-password')
+    assert stored_hash().startswith('$2b$04$')
+    engine.dispose()
+    assert client.post('/users/token', data={'username': 'rehash@example.com',
+                                             'password': 'wrong-password'}).status_code == 401
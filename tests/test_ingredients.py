@@ -0,0 +1,30 @@
+def test_deleting_a_category_keeps_its_ingredients_without_one(client, admin):
+    category = client.post('/ingredients/category/create', json={'title': 'Nightshades'}, headers=admin)
+    assert category.status_code == 201, category.text
+    category_id = client.get('/ingredients/category/list', headers=admin).json()[-1]['id']
+    ingredient = client.post('/ingredients/create', json={'title': 'Tomato', 'category_id': category_id},
+                             headers=admin)
+    assert ingredient.status_code == 201, ingredient.text
+    ingredient_id = next(item['id'] for item in client.get('/ingredients/list', headers=admin).json()
+                         if item['title'] == 'Tomato')
+
+    assert client.delete(f'/ingredients/category/delete/{category_id}', headers=admin).status_code == 204
+
+    found = client.get('/ingredients/search', params={'q': 'tomat'}, headers=admin)
+    assert found.status_code == 200, found.text
+    assert [(item['ingredient']['id'], item['ingredient']['category_id'], item['ingredient']['category'])
+            for item in found.json()] == [(ingredient_id, None, None)]
+    fetched = client.get(f'/ingredients/{ingredient_id}', headers=admin)
+    assert fetched.status_code == 200, fetched.text
+    assert fetched.json()['category_id'] is None
+    batch = client.get('/ingredients/batch', params={'ids': str(ingredient_id)}, headers=admin)
+    assert batch.status_code == 200, batch.text
+    assert batch.json()[0]['category'] is None
+
+
+def test_an_ingredient_can_be_created_without_a_category(client, admin):
+    response = client.post('/ingredients/create', json={'title': 'Water'}, headers=admin)
+    assert response.status_code == 201, response.text
+    assert response.json()['category_id'] is None
+    assert client.post('/ingredients/create', json={'title': 'Air', 'category_id': 999999},
+                       headers=admin).status_code == 404
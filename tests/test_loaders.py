@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from app.loaders import DataLoader
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_loads_of_one_step_are_batched():
+    calls = []
+
+    async def batch_load(keys):
+        calls.append(keys)
+        return {key: key * 10 for key in keys if key != 3}
+
+    async def main():
+        loader = DataLoader(batch_load, asyncio.Lock())
+        values = await asyncio.gather(loader.load(1), loader.load(2), loader.load(3), loader.load(1))
+        assert not loader.tasks
+        return values
+
+    assert run(main()) == [10, 20, None, 10]
+    assert calls == [[1, 2, 3]]
+
+
+def test_a_broken_dispatch_fails_the_pending_loads():
+    async def batch_load(keys):
+        return list(keys)
+
+    async def main():
+        loader = DataLoader(batch_load, asyncio.Lock())
+        with pytest.raises(AttributeError):
+            await asyncio.wait_for(loader.load(1), timeout=1)
+        assert not loader.futures and not loader.tasks
+
+    run(main())
+
+
+def test_a_cancelled_dispatch_cancels_the_pending_loads():
+    async def main():
+        loaded = asyncio.Event()
+
+        async def batch_load(keys):
+            loaded.set()
+            await asyncio.sleep(10)
+
+        loader = DataLoader(batch_load, asyncio.Lock())
+        future = loader.load(1)
+        await loaded.wait()
+        for task in loader.tasks:
+            task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(future, timeout=1)
+        assert not loader.futures
+
+    run(main())
+
+
+def test_recipe_reads_resolve_ingredients_through_the_loaders(client, admin):
+    client.post('/recipes/category/create', json={'title': 'Breads'}, headers=admin)
+    category_id = next(item['id'] for item in client.get('/recipes/category/list', headers=admin).json()
+                       if item['title'] == 'Breads')
+    for title in ('Flour', 'Yeast'):
+        client.post('/ingredients/create', json={'title': title}, headers=admin)
+    ingredients = {item['title']: item['id'] for item in client.get('/ingredients/list', headers=admin).json()}
+    response = client.post('/recipes/bulk', headers=admin, json=[
+        {'title': title, 'category_id': category_id, 'description': 'Bake', 'difficulty': 2,
+         'ingredients': [{'ingredient_id': ingredients[name]} for name in names]}
+        for title, names in (('Bread', ['Flour', 'Yeast']), ('Flatbread', ['Flour']), ('Air', []))])
+    recipe_ids = [result['id'] for result in sorted(response.json()['results'], key=lambda result: result['index'])]
+
+    listed = {item['id']: item for item in client.get('/recipes/list', params={'limit': 100}, headers=admin).json()}
+    for recipe_id in recipe_ids:
+        recipe = client.get(f'/recipes/{recipe_id}', headers=admin).json()
+        assert recipe == listed[recipe_id]
+    assert [listed[recipe_id]['ingredient_ids'] for recipe_id in recipe_ids] == \
+        [[ingredients['Flour'], ingredients['Yeast']], [ingredients['Flour']], []]
+    assert client.get('/recipes/999999', headers=admin).status_code == 404
+    assert client.get('/recipes/999999/similar', headers=admin).status_code == 404
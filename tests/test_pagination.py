@@ -0,0 +1,55 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def categories(client, admin):
+    client.post('/ingredients/category/bulk', json=[{'title': f'Aisle {number}'} for number in range(5)],
+                headers=admin)
+    return [item['id'] for item in client.get('/ingredients/category/list', params={'limit': 1000},
+                                              headers=admin).json()]
+
+
+def test_pages_follow_the_cursor_to_the_end(client, admin, categories):
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {'limit': 2} if cursor is None else {'limit': 2, 'cursor': cursor}
+        response = client.get('/ingredients/category/list', params=params, headers=admin)
+        assert response.status_code == 200
+        ids += [item['id'] for item in response.json()]
+        pages += 1
+        cursor = response.headers.get('x-next-cursor')
+        if cursor is None:
+            assert 'link' not in response.headers
+            break
+        assert response.headers['link'] == \
+            f'<http://testserver/ingredients/category/list?limit=2&cursor={cursor}>; rel="next"'
+        assert int(cursor) == ids[-1]
+    assert ids == categories == sorted(categories)
+    assert pages == (len(categories) + 1) // 2
+
+
+def test_page_boundaries(client, admin, categories):
+    # exactly the remaining items: no next page
+    response = client.get('/ingredients/category/list', params={'limit': 2, 'cursor': categories[-3]}, headers=admin)
+    assert [item['id'] for item in response.json()] == categories[-2:]
+    assert 'x-next-cursor' not in response.headers
+    # past the last item
+    response = client.get('/ingredients/category/list', params={'cursor': categories[-1]}, headers=admin)
+    assert response.json() == []
+    # the page starts after the cursor
+    response = client.get('/ingredients/category/list', params={'limit': 1, 'cursor': categories[0]}, headers=admin)
+    assert [item['id'] for item in response.json()] == categories[1:2]
+    for params in ({'limit': 0}, {'limit': 1001}, {'cursor': -1}):
+        assert client.get('/ingredients/category/list', params=params, headers=admin).status_code == 422
+
+
+def test_fields_select_the_returned_columns(client, admin, categories):
+    response = client.get('/ingredients/category/list', params={'fields': 'title', 'limit': 2}, headers=admin)
+    assert [set(item) for item in response.json()] == [{'title'}, {'title'}]
+    assert response.headers['x-next-cursor'] == str(categories[1])
+    response = client.get('/ingredients/category/list', params={'fields': ' id , title', 'limit': 1}, headers=admin)
+    assert list(response.json()[0]) == ['id', 'title']
+    response = client.get('/recipes/list', params={'fields': 'id,title'}, headers=admin)
+    assert all(set(item) == {'id', 'title'} for item in response.json())
+    response = client.get('/ingredients/list', params={'fields': 'title,password'}, headers=admin)
+    assert (response.status_code, response.json()['detail']) == (400, 'Unknown fields: password')
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app import databases
+from app.databases import LazySession, TimedQueuePool, async_engine, engine, engine_options, pool_status
+
+
+class Checkouts:
+    """
+    Counts the connections checked out of the application engines while the block runs
+    """
+
+    def __init__(self):
+        self.engines = [engine] if async_engine is None else [engine, async_engine.sync_engine]
+        self.count = 0
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.count += 1
+
+    def __enter__(self):
+        for value in self.engines:
+            event.listen(value, 'checkout', self._checkout)
+        return self
+
+    def __exit__(self, *exc_info):
+        for value in self.engines:
+            event.remove(value, 'checkout', self._checkout)
+
+
+def test_requests_refused_by_authentication_open_no_session(client, admin):
+    with Checkouts() as checkouts:
+        assert client.get('/ingredients/list').status_code == 401
+        assert client.get('/ingredients/list', headers={'Authorization': 'Bearer broken'}).status_code == 401
+    assert checkouts.count == 0
+    with Checkouts() as checkouts:
+        assert client.get('/ingredients/list', headers=admin).status_code == 200
+    assert checkouts.count == 1
+
+
+def test_lazy_session_is_created_on_first_use():
+    created = []
+
+    class Session:
+        closed = False
+
+        async def close(self):
+            self.closed = True
+
+    def factory():
+        created.append(Session())
+        return created[-1]
+
+    unused = LazySession(factory)
+    asyncio.run(unused.close())
+    assert not unused.started and created == []
+
+    used = LazySession(factory)
+    assert used.closed is False and used.started
+    asyncio.run(used.close())
+    assert len(created) == 1 and created[0].closed and not used.started
+
+
+def test_engine_options(monkeypatch):
+    assert 'pool_size' not in engine_options('sqlite:///recipes.db', TimedQueuePool)
+    monkeypatch.setattr(databases, 'DB_STATEMENT_TIMEOUT', 5000)
+    options = engine_options('postgresql://db/recipes', TimedQueuePool)
+    assert (options['poolclass'], options['pool_size'], options['max_overflow'], options['pool_pre_ping']) == \
+        (TimedQueuePool, databases.DB_POOL_SIZE, databases.DB_MAX_OVERFLOW, databases.DB_POOL_PRE_PING)
+    assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+    assert engine_options('postgresql+asyncpg://db/recipes', TimedQueuePool)['connect_args'] == \
+        {'server_settings': {'statement_timeout': '5000'}}
+
+
+def test_pool_status_counts_checkouts_and_timeouts(tmp_path):
+    pool_engine = create_engine(f'sqlite:///{tmp_path}/pool.db', poolclass=TimedQueuePool, pool_size=1,
+                                max_overflow=0, pool_timeout=0.05)
+    connection = pool_engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        pool_engine.connect()
+    status = pool_status(pool_engine)
+    assert (status['pool'], status['size'], status['checked_out'], status['checkouts'], status['timeouts']) == \
+        ('TimedQueuePool', 1, 1, 2, 1)
+    assert status['max_wait_seconds'] >= 0.05
+    connection.close()
+    pool_engine.dispose()
+    # the counters outlive dispose(), which replaces the pool
+    assert pool_status(pool_engine)['checkouts'] == 2
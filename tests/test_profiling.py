@@ -0,0 +1,40 @@
+import asyncio
+from app import profiling
+from app.profiling import Profiler, ProfilingMiddleware
+
+
+def test_concurrent_sampled_requests_share_one_capture(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', tmp_path)
+    both_started = asyncio.Event()
+    started = []
+
+    async def app(scope, receive, send):
+        started.append(scope['path'])
+        if len(started) == 2:
+            both_started.set()
+        await both_started.wait()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'{}'})
+
+    async def request(middleware, path):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'headers': []}
+        await middleware(scope, None, send)
+        return dict(messages[0]['headers'])
+
+    async def main():
+        middleware = ProfilingMiddleware(app, sample_rate=1)
+        return await asyncio.gather(request(middleware, '/a'), request(middleware, '/b'))
+
+    responses = asyncio.run(main())
+    assert [b'x-profile-id' in headers for headers in responses] == [True, False]
+    assert [path.stem for path in tmp_path.iterdir()] == [responses[0][b'x-profile-id'].decode()]
+    assert not Profiler.running
+
+    # the next sampled request is profiled again
+    responses = asyncio.run(main())
+    assert b'x-profile-id' in responses[0]
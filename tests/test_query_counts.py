@@ -0,0 +1,66 @@
+import pytest
+from app.instrumentation import QueryCounter
+
+
+@pytest.fixture(scope='module')
+def catalogue(client, admin):
+    """
+    A few rows of everything, so an N+1 query shows up as a wrong count
+    """
+    client.post('/ingredients/category/bulk', json=[{'title': 'Dairy'}, {'title': 'Grains'}], headers=admin)
+    categories = {item['title']: item['id'] for item in client.get('/ingredients/category/list', headers=admin).json()}
+    client.post('/ingredients/bulk', json=[{'title': title, 'category_id': categories[category]} for title, category in
+                                           [('Milk', 'Dairy'), ('Butter', 'Dairy'), ('Rice', 'Grains')]],
+                headers=admin)
+    ingredients = {item['title']: item['id'] for item in client.get('/ingredients/list', headers=admin).json()}
+    for title in ('Desserts', 'Porridges'):
+        client.post('/recipes/category/create', json={'title': title}, headers=admin)
+    recipe_categories = {item['title']: item['id'] for item in client.get('/recipes/category/list',
+                                                                         headers=admin).json()}
+    client.post('/recipes/bulk', json=[
+        {'title': title, 'category_id': recipe_categories[category], 'description': 'Cook slowly', 'difficulty': 3,
+         'ingredients': [{'ingredient_id': ingredients[name]} for name in names]}
+        for title, category, names in [('Rice pudding', 'Desserts', ['Milk', 'Rice', 'Butter']),
+                                       ('Milk porridge', 'Porridges', ['Milk', 'Rice']),
+                                       ('Buttered rice', 'Porridges', ['Rice', 'Butter'])]], headers=admin)
+    recipes = {item['title']: item['id'] for item in client.get('/recipes/list', headers=admin).json()}
+    return {'category': categories['Dairy'], 'ingredient': ingredients['Milk'],
+            'ingredients': ','.join(str(value) for value in ingredients.values()),
+            'recipe_category': recipe_categories['Desserts'],
+            'recipe': recipes['Rice pudding'], 'other_recipe': recipes['Milk porridge'],
+            'recipes': ','.join(str(value) for value in recipes.values())}
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('/users/me', 1),
+    ('/ingredients/category/list', 1),
+    ('/ingredients/category/batch?ids={category}', 1),
+    ('/ingredients/category/{category}', 1),
+    ('/ingredients/list', 1),
+    ('/ingredients/batch?ids={ingredients}', 2),
+    ('/ingredients/search?q=milk', 1),
+    ('/ingredients/autocomplete?q=mi', 1),
+    ('/ingredients/{ingredient}', 1),
+    ('/recipes/category/list', 1),
+    ('/recipes/category/batch?ids={recipe_category}', 1),
+    ('/recipes/category/{recipe_category}', 1),
+    ('/recipes/list', 2),
+    ('/recipes/batch?ids={recipes}', 2),
+    ('/recipes/search?q=rice', 2),
+    ('/recipes/autocomplete?q=ri', 1),
+    ('/recipes/shopping-list?recipe_ids={recipe}&recipe_ids={other_recipe}', 1),
+    ('/recipes/{recipe}/similar', 3),
+    ('/recipes/{recipe}', 2),
+    ('/stats/recipes/categories', 1),
+    ('/stats/ingredients/popular', 1),
+    ('/stats/recipes/difficulty', 1),
+    ('/stats/recipes/owners', 1),
+])
+def test_query_count(client, admin, catalogue, path, expected):
+    path = path.format(**catalogue)
+    # the first request loads the in-memory indexes and the token version of the user
+    assert client.get(path, headers=admin).status_code == 200
+    with QueryCounter() as queries:
+        response = client.get(path, headers=admin)
+    assert response.status_code == 200, response.text
+    queries.assert_count(expected)
@@ -0,0 +1,81 @@
+import asyncio
+import time
+import numpy
+from app.recipe_index import RecipeIngredientIndex
+from app.similar_recipes import SimilarRecipes, Snapshot
+
+# recipe id -> ingredient ids
+CATALOGUE = {1: [1, 2], 2: [1], 3: [2, 3, 4]}
+
+
+def snapshot_of(catalogue, built_at=None):
+    pairs = [(recipe_id, ingredient_id) for recipe_id, ingredient_ids in catalogue.items()
+             for ingredient_id in ingredient_ids]
+    recipe_ids, ingredient_ids = (numpy.array(values, dtype=numpy.int64) for values in zip(*pairs))
+    return Snapshot.build(recipe_ids, ingredient_ids, time.time() if built_at is None else built_at)
+
+
+def index_of(tmp_path, catalogue=CATALOGUE):
+    similar = SimilarRecipes(directory=tmp_path)
+    similar.snapshot = snapshot_of(catalogue)
+    return RecipeIngredientIndex(similar)
+
+
+def test_complete_recipes_come_first_then_by_missing_ingredients(tmp_path):
+    index = index_of(tmp_path)
+    assert index.search([1, 2]) == [(1, 2, []), (2, 1, [])]
+    assert index.search([1, 2], max_missing=2) == [(1, 2, []), (2, 1, []), (3, 1, [3, 4])]
+    assert index.search([2], max_missing=1) == [(1, 1, [1])]
+    assert index.search([1, 2], max_missing=2, limit=1, offset=2) == [(3, 1, [3, 4])]
+    assert index.search([99, -1]) == []
+    assert index.search([]) == []
+
+
+def test_recipes_changed_since_the_snapshot_override_it(tmp_path):
+    index = index_of(tmp_path)
+    index.similar.add_recipe(4, [1, 2])
+    index.similar.add_recipe(2, [5])
+    index.similar.remove_recipe(1)
+    assert index.search([1, 2]) == [(4, 2, [])]
+    index.similar.remove_ingredients([3], [3, 4])
+    assert index.search([2]) == [(3, 1, [])]
+
+
+class Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class Database:
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        return Rows([(recipe_id, ingredient_id) for recipe_id, ingredient_ids in self.catalogue.items()
+                     for ingredient_id in ingredient_ids])
+
+
+def test_snapshot_is_rebuilt_when_stale_or_older_than_a_write(tmp_path):
+    db = Database(CATALOGUE)
+    index = RecipeIngredientIndex(SimilarRecipes(directory=tmp_path, ttl=60))
+    asyncio.run(index.ensure_loaded(db))
+    assert db.queries == 1 and index.search([1]) == [(2, 1, [])]
+    asyncio.run(index.ensure_loaded(db))
+    assert db.queries == 1
+
+    # another worker, which wrote before loading the snapshot the first one saved
+    other = RecipeIngredientIndex(SimilarRecipes(directory=tmp_path, ttl=60))
+    other.similar.add_recipe(5, [1])
+    db.catalogue = {**CATALOGUE, 5: [1]}
+    asyncio.run(other.ensure_loaded(db))
+    assert db.queries == 2 and other.search([1]) == [(2, 1, []), (5, 1, [])]
+
+    # expired
+    index.similar.snapshot.built_at -= 61
+    asyncio.run(index.ensure_loaded(db))
+    assert index.search([1]) == [(2, 1, []), (5, 1, [])]
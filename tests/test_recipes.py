@@ -0,0 +1,116 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def catalogue(client, admin):
+    client.post('/recipes/category/create', json={'title': 'Soups'}, headers=admin)
+    category_id = next(item['id'] for item in client.get('/recipes/category/list', headers=admin).json()
+                       if item['title'] == 'Soups')
+    client.post('/ingredients/create', json={'title': 'Onion'}, headers=admin)
+    ingredient_id = next(item['id'] for item in client.get('/ingredients/list', headers=admin).json()
+                         if item['title'] == 'Onion')
+    return category_id, ingredient_id
+
+
+def recipe(title, category_id, *ingredient_ids):
+    return {'title': title, 'category_id': category_id, 'description': 'Simmer', 'difficulty': 2,
+            'ingredients': [{'ingredient_id': ingredient_id} for ingredient_id in ingredient_ids]}
+
+
+def test_create_recipe_refuses_unknown_category_and_ingredients(client, admin, catalogue):
+    category_id, ingredient_id = catalogue
+    response = client.post('/recipes/create', json=recipe('Broth', 999999, ingredient_id), headers=admin)
+    assert (response.status_code, response.json()['detail']) == (404, 'Category was not found')
+    response = client.post('/recipes/create', json=recipe('Broth', category_id, ingredient_id, 999999),
+                           headers=admin)
+    assert (response.status_code, response.json()['detail']) == (404, 'Ingredient was not found')
+    response = client.post('/recipes/create', json=recipe('Broth', category_id, ingredient_id, ingredient_id),
+                           headers=admin)
+    assert response.status_code == 201, response.text
+    assert response.json()['ingredient_ids'] == [ingredient_id]
+
+
+def test_bulk_import_links_repeated_ingredients_once(client, admin, catalogue):
+    category_id, ingredient_id = catalogue
+    response = client.post('/recipes/bulk', json=[recipe('Onion soup', category_id, ingredient_id, ingredient_id)],
+                           headers=admin)
+    assert response.status_code == 200, response.text
+    recipe_id = response.json()['results'][0]['id']
+    assert client.get(f'/recipes/{recipe_id}', headers=admin).json()['ingredient_ids'] == [ingredient_id]
+
+
+
+def test_bulk_import_of_duplicate_titles_links_each_recipe_its_own_ingredients(client, admin, catalogue):
+    category_id, ingredient_id = catalogue
+    client.post('/ingredients/create', json={'title': 'Leek'}, headers=admin)
+    leek_id = next(item['id'] for item in client.get('/ingredients/list', headers=admin).json()
+                   if item['title'] == 'Leek')
+    since = client.get('/changes', headers=admin).json()['next_cursor']
+    response = client.post('/recipes/bulk', json=[recipe('Leek soup', category_id, leek_id),
+                                                  recipe('Leek soup', category_id, ingredient_id),
+                                                  recipe('Leek and onion soup', category_id, leek_id, ingredient_id)],
+                           headers=admin)
+    assert response.status_code == 200, response.text
+    results = sorted(response.json()['results'], key=lambda result: result['index'])
+    assert [(result['status'], result['detail']) for result in results] == \
+        [('created', None), ('error', 'Duplicate title in the request'), ('created', None)]
+    assert client.get(f'/recipes/{results[0]["id"]}', headers=admin).json()['ingredient_ids'] == [leek_id]
+    assert sorted(client.get(f'/recipes/{results[2]["id"]}', headers=admin).json()['ingredient_ids']) == \
+        sorted([leek_id, ingredient_id])
+    changes = client.get('/changes', params={'since': since, 'entity': 'recipes'}, headers=admin).json()['changes']
+    assert {change['entity_id'] for change in changes} == {results[0]['id'], results[2]['id']}
+
+    response = client.post('/recipes/bulk', json=[recipe('Leek soup', category_id, ingredient_id)], headers=admin)
+    assert response.json()['results'][0]['detail'] == 'Recipe already exists'
+    assert client.get(f'/recipes/{results[0]["id"]}', headers=admin).json()['ingredient_ids'] == [leek_id]
+
+def test_search_by_ingredients_follows_creates_and_deletes(client, admin, catalogue):
+    category_id, ingredient_id = catalogue
+    params = {'ingredients': [ingredient_id]}
+    before = {item['recipe']['id'] for item in client.get('/recipes/search', params=params, headers=admin).json()}
+    created = client.post('/recipes/create', json=recipe('Fried onion', category_id, ingredient_id), headers=admin)
+    recipe_id = created.json()['id']
+    found = client.get('/recipes/search', params=params, headers=admin).json()
+    assert {item['recipe']['id'] for item in found} == before | {recipe_id}
+    assert all(item['matched'] == 1 and item['missing_ingredient_ids'] == [] for item in found)
+    assert client.delete(f'/recipes/delete/{recipe_id}', headers=admin).status_code == 204
+    assert {item['recipe']['id'] for item in client.get('/recipes/search', params=params, headers=admin).json()} == \
+        before
+
+
+def test_shopping_list_counts_every_ingredient_once_by_category(client, admin, catalogue):
+    category_id, _ = catalogue
+    client.post('/ingredients/category/bulk', json=[{'title': 'Produce'}, {'title': 'Bakery'}], headers=admin)
+    categories = {item['title']: item['id'] for item in client.get('/ingredients/category/list',
+                                                                   params={'limit': 1000}, headers=admin).json()}
+    client.post('/ingredients/bulk', headers=admin, json=[
+        {'title': 'Carrot', 'category_id': categories['Produce']},
+        {'title': 'Celery', 'category_id': categories['Produce']},
+        {'title': 'Baguette', 'category_id': categories['Bakery']},
+        {'title': 'Sea salt'}])
+    ingredients = {item['title']: item['id'] for item in client.get('/ingredients/list', params={'limit': 1000},
+                                                                    headers=admin).json()}
+    response = client.post('/recipes/bulk', headers=admin, json=[
+        recipe(title, category_id, *[ingredients[name] for name in names])
+        for title, names in (('Mirepoix', ['Carrot', 'Celery', 'Sea salt']), ('Carrot toast', ['Carrot', 'Baguette']),
+                             ('Celery sticks', ['Celery']))])
+    planned, other, unplanned = [result['id'] for result in sorted(response.json()['results'],
+                                                                   key=lambda result: result['index'])]
+
+    response = client.get('/recipes/shopping-list', params={'recipe_ids': [planned, other, planned, 999999]},
+                          headers=admin)
+    assert response.status_code == 200, response.text
+    assert response.json()['recipe_ids'] == [planned, other, 999999]
+    shopping = {category['title']: [(item['title'], item['recipe_count']) for item in category['ingredients']]
+                for category in response.json()['categories']}
+    assert shopping == {'Produce': [('Carrot', 2), ('Celery', 1)], 'Bakery': [('Baguette', 1)],
+                        None: [('Sea salt', 1)]}
+    uncategorised = next(category for category in response.json()['categories'] if category['title'] is None)
+    assert uncategorised['id'] is None
+
+    assert client.get('/recipes/shopping-list', params={'recipe_ids': [unplanned]},
+                      headers=admin).json()['categories'] == [
+        {'id': categories['Produce'], 'title': 'Produce', 'ingredients': [
+            {'id': ingredients['Celery'], 'title': 'Celery', 'recipe_count': 1}]}]
+    response = client.get('/recipes/shopping-list', params={'recipe_ids': list(range(1, 102))}, headers=admin)
+    assert (response.status_code, response.json()['detail']) == (400, 'At most 100 recipes are allowed')
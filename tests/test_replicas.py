@@ -0,0 +1,44 @@
+import asyncio
+import time
+from app.replicas import ReplicaRouter, ReplicaSession, primary_session
+
+
+def test_reads_follow_the_writes_of_this_worker_or_of_the_cookie():
+    router = ReplicaRouter([], sticky_seconds=5)
+    assert not router.wrote_lately('user:1')
+    router.stick('user:1')
+    assert router.wrote_lately('user:1')
+    assert not router.wrote_lately('user:2')
+    # written through another worker
+    assert router.wrote_lately('user:2', str(time.time() - 1))
+    assert not router.wrote_lately('user:2', str(time.time() - 10))
+    assert not router.wrote_lately('user:2', 'yesterday')
+
+
+class Session:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class Replica:
+    active = 0
+
+    def session_factory(self):
+        return Session('replica')
+
+
+def test_primary_session_of_a_replica_read():
+    router = ReplicaRouter([], sticky_seconds=5)
+    replica_session = ReplicaSession(router, Replica(), lambda: Session('primary'))
+    primary = asyncio.run(primary_session(replica_session))
+    assert primary.name == 'primary'
+    assert asyncio.run(primary_session(replica_session)) is primary
+    asyncio.run(replica_session.close())
+    assert primary.closed and replica_session.session.closed
+    # already on the primary
+    session = Session('primary')
+    assert asyncio.run(primary_session(session)) is session
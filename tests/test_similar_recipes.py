@@ -0,0 +1,105 @@
+import asyncio
+import random
+from app import similar_recipes as module
+from app.similar_recipes import SimilarRecipes
+from .test_recipe_index import Database, snapshot_of
+
+# recipe id -> ingredient ids, recipe 6 has none
+CATALOGUE = {1: [1, 2, 3], 2: [1, 2, 3], 3: [1, 2], 4: [1, 2, 3, 4, 5, 6], 5: [7]}
+
+
+def similar_of(tmp_path, catalogue=CATALOGUE):
+    similar = SimilarRecipes(directory=tmp_path)
+    similar.snapshot = snapshot_of(catalogue)
+    return similar
+
+
+def test_recipes_are_ranked_by_similarity_then_id(tmp_path):
+    similar = similar_of(tmp_path)
+    assert similar.similar(1) == [(2, 1.0, 3), (3, 0.666667, 2), (4, 0.5, 3)]
+    assert similar.similar(1, metric='cosine') == [(2, 1.0, 3), (3, 0.816497, 2), (4, 0.707107, 3)]
+    assert similar.similar(1, limit=1) == [(2, 1.0, 3)]
+    assert similar.similar(5) == []
+    # no ingredients, or not in the snapshot at all
+    assert similar.similar(6) is None
+    assert similar.similar(99) is None
+
+
+def test_recipes_changed_since_the_snapshot_are_scored_with_it(tmp_path):
+    similar = similar_of(tmp_path)
+    similar.add_recipe(7, [1, 2, 3])
+    similar.remove_recipe(2)
+    similar.remove_ingredients([4], [4, 5, 6])
+    assert similar.similar(1) == [(4, 1.0, 3), (7, 1.0, 3), (3, 0.666667, 2)]
+    similar.add_recipe(6, [7])
+    assert similar.similar(6) == [(5, 1.0, 1)]
+    similar.remove_ingredients([5], [7])
+    assert similar.similar(5) is None
+
+
+def test_top_recipes_match_scoring_every_recipe():
+    generator = random.Random(7)
+    catalogue = {recipe_id: generator.sample(range(1, 30), generator.randint(1, 8)) for recipe_id in range(1, 300)}
+    similar = SimilarRecipes()
+    similar.snapshot = snapshot_of(catalogue)
+    for metric in ('jaccard', 'cosine'):
+        for recipe_id in (1, 50, 150):
+            ingredients = set(catalogue[recipe_id])
+            scores = []
+            for other_id, other in catalogue.items():
+                shared = len(ingredients & set(other))
+                if other_id == recipe_id or not shared:
+                    continue
+                value = shared / (len(other) * len(ingredients)) ** 0.5 if metric == 'cosine' else \
+                    shared / (len(other) + len(ingredients) - shared)
+                scores.append((-value, other_id))
+            expected = [(other_id, round(-value, 6)) for value, other_id in sorted(scores)[:10]]
+            assert [(other_id, value) for other_id, value, _ in similar.similar(recipe_id, metric=metric)] == \
+                expected
+
+
+def test_snapshot_is_shared_and_rebuilt_after_too_many_changes(tmp_path, monkeypatch):
+    db = Database(CATALOGUE)
+    similar = SimilarRecipes(directory=tmp_path, ttl=60)
+    asyncio.run(similar.ensure_loaded(db))
+    assert db.queries == 1
+
+    # another worker maps the saved snapshot instead of querying
+    other = SimilarRecipes(directory=tmp_path, ttl=60)
+    asyncio.run(other.ensure_loaded(db))
+    assert db.queries == 1 and other.similar(1) == similar.similar(1)
+
+    monkeypatch.setattr(module, 'SIMILAR_RECIPES_MAX_CHANGES', 1)
+    similar.add_recipe(8, [1, 2, 3])
+    asyncio.run(similar.ensure_loaded(db))
+    assert db.queries == 1
+    similar.add_recipe(9, [1, 2, 3])
+    db.catalogue = {**CATALOGUE, 8: [1, 2, 3], 9: [1, 2, 3]}
+    asyncio.run(similar.ensure_loaded(db))
+    # the changes made it into the new snapshot and are dropped
+    assert db.queries == 2 and similar.changes == {}
+    assert [recipe_id for recipe_id, _, _ in similar.similar(1)] == [2, 8, 9, 3, 4]
+
+
+def test_similar_endpoint(client, admin):
+    client.post('/recipes/category/create', json={'title': 'Salads'}, headers=admin)
+    category_id = next(item['id'] for item in client.get('/recipes/category/list', headers=admin).json()
+                       if item['title'] == 'Salads')
+    titles = ('Lettuce', 'Radish', 'Cucumber')
+    for title in titles:
+        client.post('/ingredients/create', json={'title': title}, headers=admin)
+    ingredients = {item['title']: item['id'] for item in client.get('/ingredients/list', headers=admin).json()}
+    ingredient_ids = [ingredients[title] for title in titles]
+    recipe_ids = []
+    for title, ids in (('Green salad', ingredient_ids), ('Radish salad', ingredient_ids[1:2]), ('Plain', [])):
+        response = client.post('/recipes/create', headers=admin, json={
+            'title': title, 'category_id': category_id, 'description': 'Toss', 'difficulty': 1,
+            'ingredients': [{'ingredient_id': ingredient_id} for ingredient_id in ids]})
+        recipe_ids.append(response.json()['id'])
+
+    response = client.get(f'/recipes/{recipe_ids[1]}/similar', headers=admin)
+    assert response.status_code == 200, response.text
+    assert [(item['recipe']['id'], item['score'], item['matched']) for item in response.json()] == \
+        [(recipe_ids[0], 0.333333, 1)]
+    assert client.get(f'/recipes/{recipe_ids[2]}/similar', headers=admin).json() == []
+    assert client.get('/recipes/999999/similar', headers=admin).status_code == 404
@@ -0,0 +1,69 @@
+from sqlalchemy import func, select
+from app.databases import SessionLocal
+from app.models import DifficultyStatsModel, IngredientStatsModel, OwnerStatsModel, RecipeCategoryStatsModel, \
+    RecipesIngredientsModel, RecipesModel
+
+
+def recomputed():
+    """
+    The aggregates counted from scratch
+    """
+    with SessionLocal() as db:
+        return {name: dict(db.execute(select(column, func.count()).group_by(column)).all()) for name, column in (
+            ('categories', RecipesModel.category_id), ('difficulty', RecipesModel.difficulty),
+            ('owners', RecipesModel.owner_id), ('ingredients', RecipesIngredientsModel.ingredient_id))}
+
+
+def stored():
+    with SessionLocal() as db:
+        return {name: dict(db.execute(select(key, model.recipe_count).where(model.recipe_count > 0)).all())
+                for name, model, key in (
+                    ('categories', RecipeCategoryStatsModel, RecipeCategoryStatsModel.category_id),
+                    ('difficulty', DifficultyStatsModel, DifficultyStatsModel.difficulty),
+                    ('owners', OwnerStatsModel, OwnerStatsModel.owner_id),
+                    ('ingredients', IngredientStatsModel, IngredientStatsModel.ingredient_id))}
+
+
+def test_aggregates_follow_the_writes(client, admin, user):
+    client.post('/recipes/category/create', json={'title': 'Grills'}, headers=admin)
+    category_id = next(item['id'] for item in client.get('/recipes/category/list', params={'limit': 1000},
+                                                         headers=admin).json() if item['title'] == 'Grills')
+    client.post('/ingredients/bulk', json=[{'title': 'Charcoal'}, {'title': 'Skewer'}], headers=admin)
+    ingredients = {item['title']: item['id'] for item in client.get('/ingredients/list', params={'limit': 1000},
+                                                                    headers=admin).json()}
+    charcoal, skewer = ingredients['Charcoal'], ingredients['Skewer']
+
+    def recipe(title, difficulty, *ingredient_ids):
+        return {'title': title, 'category_id': category_id, 'description': 'Grill', 'difficulty': difficulty,
+                'ingredients': [{'ingredient_id': ingredient_id} for ingredient_id in ingredient_ids]}
+
+    kebab = client.post('/recipes/create', json=recipe('Kebab', 4, charcoal, skewer), headers=admin).json()['id']
+    # ON CONFLICT adds to the counts already stored
+    response = client.post('/recipes/bulk', headers=admin,
+                           json=[recipe('Corn', 4, charcoal), recipe('Halloumi', 1, charcoal, skewer)])
+    assert response.json()['created'] == 2
+    assert stored() == recomputed()
+    assert stored()['categories'][category_id] == 3
+    assert stored()['ingredients'][charcoal] == 3
+
+    categories = client.get('/stats/recipes/categories', params={'limit': 1000}, headers=user).json()
+    assert {'id': category_id, 'title': 'Grills', 'recipe_count': 3} in categories
+    counts = [item['recipe_count'] for item in categories]
+    assert counts == sorted(counts, reverse=True)
+    popular = client.get('/stats/ingredients/popular', params={'limit': 1000}, headers=user).json()
+    assert {'id': skewer, 'title': 'Skewer', 'recipe_count': 2} in popular
+    histogram = client.get('/stats/recipes/difficulty', headers=user).json()
+    assert [item['difficulty'] for item in histogram] == sorted(item['difficulty'] for item in histogram)
+    assert client.get('/stats/recipes/owners', headers=user).status_code == 403
+    assert client.get('/stats/recipes/owners', params={'limit': 1000}, headers=admin).json() == \
+        sorted(({'owner_id': owner_id, 'recipe_count': count} for owner_id, count in stored()['owners'].items()),
+               key=lambda item: (-item['recipe_count'], item['owner_id']))
+
+    assert client.delete(f'/recipes/delete/{kebab}', headers=admin).status_code == 204
+    assert stored() == recomputed()
+    assert client.delete(f'/ingredients/delete/{skewer}', headers=admin).status_code == 204
+    assert stored() == recomputed() and skewer not in stored()['ingredients']
+    response = client.delete('/recipes/delete', params={'category_id': category_id}, headers=admin)
+    assert response.status_code == 200, response.text
+    assert stored() == recomputed() and category_id not in stored()['categories']
+    assert charcoal not in stored()['ingredients']
@@ -0,0 +1,84 @@
+import time
+from app.models import RecipesModel
+from app.text_search import TextIndex, tsquery
+
+DOCUMENTS = {
+    1: {'title': 'Tomato soup', 'description': 'Simmer the tomatoes'},
+    2: {'title': 'Onion soup', 'description': 'Caramelised onions'},
+    3: {'title': 'Tomato salad', 'description': 'Fresh'},
+    4: {'title': 'Stew', 'description': 'Beef with an onion'},
+}
+
+
+def index_of(documents=DOCUMENTS):
+    index = TextIndex(RecipesModel, {'title': 2, 'description': 1})
+    index.loaded_at = time.monotonic()
+    for doc_id, values in documents.items():
+        index.add(doc_id, values)
+    return index
+
+
+def ids(results):
+    return [doc_id for doc_id, _ in results]
+
+
+def test_terms_match_exactly_by_prefix_or_by_trigrams():
+    index = index_of()
+    assert ids(index.search('tomato')) == [1, 3]
+    assert ids(index.search('TOM')) == [1, 3]
+    assert ids(index.search('tomatto')) == [1, 3]
+    assert index.search('tomatto', fuzzy=False) == []
+    # every term has to match
+    assert ids(index.search('tomato soup')) == [1]
+    assert index.search('tomato beef') == []
+    assert index.search('!!') == []
+
+
+def test_results_are_ranked_and_paginated():
+    index = index_of()
+    # a title weighs more than a description
+    assert ids(index.search('onion')) == [2, 4]
+    # an exact match beats a prefix of a longer word
+    exact, prefix = index.search('onion')[0][1], dict(index.search('onio'))[2]
+    assert exact > prefix
+    assert ids(index.search('soup', limit=1)) == [1]
+    assert ids(index.search('soup', limit=1, offset=1)) == [2]
+
+
+def test_documents_are_updated_and_removed():
+    index = index_of()
+    index.add(3, {'title': 'Cucumber salad', 'description': 'Fresh'})
+    assert ids(index.search('tomato')) == [1]
+    index.remove(1)
+    assert index.search('tomato') == []
+    assert 'tomato' not in index.tokens and index.prefixed('tom') == []
+    # changes before the first load are left to it
+    unloaded = TextIndex(RecipesModel, {'title': 1})
+    unloaded.add(1, {'title': 'Tomato soup'})
+    assert unloaded.documents == {}
+
+
+def test_postgres_prefix_query():
+    assert tsquery('Tom  soup!') == 'tom:* & soup:*'
+
+
+def test_search_endpoints(client, admin):
+    client.post('/recipes/category/create', json={'title': 'Curries'}, headers=admin)
+    category_id = next(item['id'] for item in client.get('/recipes/category/list', params={'limit': 1000},
+                                                         headers=admin).json() if item['title'] == 'Curries')
+    client.post('/ingredients/create', json={'title': 'Turmeric'}, headers=admin)
+    recipe_id = client.post('/recipes/create', headers=admin, json={
+        'title': 'Chickpea curry', 'category_id': category_id, 'description': 'Slow cooked with turmeric',
+        'difficulty': 2, 'ingredients': []}).json()['id']
+
+    response = client.get('/recipes/search', params={'q': 'chikpea'}, headers=admin)
+    assert [item['recipe']['id'] for item in response.json()] == [recipe_id]
+    response = client.get('/recipes/search', params={'q': 'turmeric curry'}, headers=admin)
+    assert [item['recipe']['title'] for item in response.json()] == ['Chickpea curry']
+    assert client.get('/recipes/autocomplete', params={'q': 'chick'}, headers=admin).json() == \
+        [{'id': recipe_id, 'title': 'Chickpea curry'}]
+    response = client.get('/ingredients/search', params={'q': 'turmerik'}, headers=admin)
+    assert [item['ingredient']['title'] for item in response.json()] == ['Turmeric']
+    assert [item['title'] for item in client.get('/ingredients/autocomplete', params={'q': 'turm'},
+                                                 headers=admin).json()] == ['Turmeric']
+    assert client.get('/recipes/search', params={'q': 'curry', 'ingredients': [1]}, headers=admin).status_code == 400
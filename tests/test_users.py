@@ -0,0 +1,33 @@
+import os
+from sqlalchemy import create_engine, text
+from app.authentication import token_versions
+from .conftest import login
+
+
+def test_logout_revokes_older_tokens_but_not_a_new_login(client):
+    client.post('/users/register', json={'email': 'logout@example.com', 'password': 'logout-password'})
+    user = login(client, 'logout@example.com', 'logout-password')
+    assert client.get('/users/me', headers=user).status_code == 200
+    assert client.post('/users/logout', headers=user).status_code == 204
+    assert client.get('/ingredients/list', headers=user).status_code == 401
+    assert client.get('/users/me', headers=user).status_code == 401
+
+    # logged in again within the same second
+    fresh = login(client, 'logout@example.com', 'logout-password')
+    assert client.get('/ingredients/list', headers=fresh).status_code == 200
+    # another worker, which has not cached the version yet, reads it from the database
+    token_versions.clear()
+    assert client.get('/ingredients/list', headers=user).status_code == 401
+    assert client.get('/ingredients/list', headers=fresh).status_code == 200
+
+
+def test_token_of_a_deleted_user_is_refused(client):
+    client.post('/users/register', json={'email': 'deleted@example.com', 'password': 'deleted-password'})
+    user = login(client, 'deleted@example.com', 'deleted-password')
+    engine = create_engine(os.environ['SQLALCHEMY_DATABASE_URL'])
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM users WHERE email = 'deleted@example.com'"))
+    engine.dispose()
+    token_versions.clear()
+    assert client.get('/ingredients/list', headers=user).status_code == 401
+    assert client.get('/users/me', headers=user).status_code == 401